@@ -0,0 +1,56 @@
+"""Compare the analytic and bisection radial split engines.
+
+Run from the repository root:
+
+	python -m benchmarks.bench_radial --parts 2 5 10 --vertices 50 500 5000
+"""
+import argparse
+import time
+
+import numpy as np
+from shapely.geometry import Polygon
+
+from benchmarks.fixtures import concave
+from geom_manipulation import radial_split_polygon
+
+
+def _time_engine(ring, n_parts, engine, repeat):
+	timings = []
+	parts = []
+	for _ in range(repeat):
+		t0 = time.perf_counter()
+		parts = radial_split_polygon(ring, n_parts, engine=engine)
+		timings.append(time.perf_counter() - t0)
+	target = Polygon(ring).buffer(0).area / float(n_parts)
+	dev = max(abs(p.area - target) / target for p in parts) if parts else float("nan")
+	return float(np.median(timings)), dev, len(parts)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--parts", type=int, nargs="+", default=[2, 5, 10, 20])
+	parser.add_argument("--vertices", type=int, nargs="+", default=[50, 500, 5000])
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args(argv)
+
+	rng = np.random.default_rng(args.seed)
+	print(f"{'vertices':>8} {'parts':>5} {'engine':>10} {'median ms':>10} {'max dev':>9} {'speedup':>8}")
+	for n_vertices in args.vertices:
+		ring = list(concave(n_vertices, rng).exterior.coords)
+		for n_parts in args.parts:
+			results = {
+				engine: _time_engine(ring, n_parts, engine, args.repeat)
+				for engine in ("bisection", "analytic")
+			}
+			base = results["bisection"][0]
+			for engine, (secs, dev, count) in results.items():
+				speedup = base / secs if secs > 0 else float("inf")
+				print(
+					f"{n_vertices:>8} {n_parts:>5} {engine:>10} {secs * 1000:>10.2f} "
+					f"{dev:>9.2e} {speedup:>7.1f}x"
+				)
+
+
+if __name__ == "__main__":
+	main()
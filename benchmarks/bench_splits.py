@@ -0,0 +1,221 @@
+"""Time every split mode across fixtures, vertex counts and part counts.
+
+Run from the repository root:
+
+	python -m benchmarks.bench_splits --quick
+	python -m benchmarks.bench_splits --output before.json
+	python -m benchmarks.bench_splits --output after.json --compare before.json
+
+Each configuration records latency percentiles, peak memory and how far the
+parts are from equal area, and results are written as JSON so runs from
+different commits can be compared with --compare. Peak memory is what
+tracemalloc sees (Python and NumPy allocations); GEOS's own heap is not counted.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import shapely
+
+from benchmarks.fixtures import FIXTURES, make_fixture, vertex_count
+from geom_manipulation import (
+	equal_area_kmeans_split_polygon,
+	horizontal_split_polygon,
+	kmeans_split_polygon,
+	radial_split_polygon,
+	recursive_split_polygon,
+	vertical_split_polygon,
+)
+
+MODES = {
+	"vertical": lambda poly, n: vertical_split_polygon(poly, n),
+	"horizontal": lambda poly, n: horizontal_split_polygon(poly, n),
+	"radial": lambda poly, n: radial_split_polygon(poly, n),
+	"recursive": lambda poly, n: recursive_split_polygon(poly, n),
+	"kmeans": lambda poly, n: kmeans_split_polygon(poly, n, seed=0),
+	"equal_area_kmeans": lambda poly, n: equal_area_kmeans_split_polygon(poly, n, seed=0),
+}
+
+DEFAULT_PARTS = [2, 5, 10, 20, 50]
+DEFAULT_VERTICES = [10, 100, 1000, 10000]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _git_commit():
+	try:
+		out = subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"],
+			capture_output=True, text=True, check=True,
+			cwd=os.path.dirname(os.path.abspath(__file__)),
+		)
+		return out.stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def _quality(poly, parts, n_parts):
+	"""Area balance of parts relative to an exact equal split of poly."""
+	target = poly.area / float(n_parts)
+	devs = [abs(p.area - target) / target for p in parts] if target > 0 else []
+	return {
+		"n_returned": len(parts),
+		"max_area_dev": max(devs) if devs else None,
+		"mean_area_dev": float(np.mean(devs)) if devs else None,
+		"coverage": sum(p.area for p in parts) / poly.area if poly.area > 0 else None,
+	}
+
+
+def run_case(fn, poly, n_parts, repeat):
+	"""Time fn(poly, n_parts) repeat times, then once more under tracemalloc."""
+	timings = []
+	parts = []
+	for _ in range(repeat):
+		t0 = time.perf_counter()
+		parts = fn(poly, n_parts)
+		timings.append(time.perf_counter() - t0)
+
+	tracemalloc.start()
+	try:
+		fn(poly, n_parts)
+		_, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+
+	ms = np.asarray(timings) * 1000.0
+	return {
+		"p50_ms": float(np.percentile(ms, 50)),
+		"p90_ms": float(np.percentile(ms, 90)),
+		"p99_ms": float(np.percentile(ms, 99)),
+		"min_ms": float(ms.min()),
+		"mean_ms": float(ms.mean()),
+		"peak_mem_kb": peak / 1024.0,
+		**_quality(poly, parts, n_parts),
+	}
+
+
+def run(fixtures, vertices, parts, modes, repeat, seed, log=print):
+	results = []
+	for name in fixtures:
+		for n_vertices in vertices:
+			poly = make_fixture(name, n_vertices, seed=seed)
+			for mode in modes:
+				for n_parts in parts:
+					case = {
+						"fixture": name,
+						"vertices": vertex_count(poly),
+						"target_vertices": n_vertices,
+						"parts": n_parts,
+						"mode": mode,
+					}
+					try:
+						case.update(run_case(MODES[mode], poly, n_parts, repeat))
+					except Exception as e:
+						case["error"] = f"{type(e).__name__}: {e}"
+					results.append(case)
+					log(_format_row(case))
+	return results
+
+
+def _format_row(case):
+	if "error" in case:
+		return f"{case['fixture']:>8} {case['vertices']:>6} {case['mode']:>17} {case['parts']:>3}  ERROR {case['error']}"
+	dev = case["max_area_dev"]
+	return (
+		f"{case['fixture']:>8} {case['vertices']:>6} {case['mode']:>17} {case['parts']:>3} "
+		f"p50 {case['p50_ms']:>9.2f}ms p90 {case['p90_ms']:>9.2f}ms "
+		f"mem {case['peak_mem_kb']:>9.0f}KB dev {dev if dev is not None else float('nan'):.2e} "
+		f"n={case['n_returned']}"
+	)
+
+
+def _case_key(case):
+	return (case["fixture"], case["target_vertices"], case["parts"], case["mode"])
+
+
+def compare(current, baseline, threshold):
+	"""Print p50 ratios against a baseline run; returns the number of regressions."""
+	base = {_case_key(c): c for c in baseline["results"] if "p50_ms" in c}
+	regressions = 0
+	print(f"\nComparing with {baseline['meta'].get('commit')} (threshold {threshold:.2f}x)")
+	for case in current:
+		old = base.get(_case_key(case))
+		if old is None or "p50_ms" not in case:
+			continue
+		ratio = case["p50_ms"] / old["p50_ms"] if old["p50_ms"] > 0 else float("inf")
+		flag = ""
+		if ratio > threshold:
+			flag = "  REGRESSION"
+			regressions += 1
+		elif ratio < 1.0 / threshold:
+			flag = "  faster"
+		if flag:
+			print(
+				f"{case['fixture']:>8} {case['target_vertices']:>6} {case['mode']:>17} {case['parts']:>3} "
+				f"{old['p50_ms']:>9.2f}ms -> {case['p50_ms']:>9.2f}ms ({ratio:.2f}x){flag}"
+			)
+	print(f"{regressions} regression(s)")
+	return regressions
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--fixtures", nargs="+", choices=sorted(FIXTURES), default=sorted(FIXTURES))
+	parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=list(MODES))
+	parser.add_argument("--parts", type=int, nargs="+", default=DEFAULT_PARTS)
+	parser.add_argument("--vertices", type=int, nargs="+", default=DEFAULT_VERTICES)
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--seed", type=int, default=0, help="fixture seed")
+	parser.add_argument("--quick", action="store_true", help="small grid for a fast smoke run")
+	parser.add_argument("--output", help="JSON results path (default: benchmarks/results/<time>-<commit>.json)")
+	parser.add_argument("--compare", help="baseline JSON results to compare p50 latency against")
+	parser.add_argument("--threshold", type=float, default=1.25, help="p50 ratio counted as a regression")
+	args = parser.parse_args(argv)
+
+	if args.quick:
+		args.parts = [2, 10]
+		args.vertices = [100, 1000]
+		args.repeat = min(args.repeat, 3)
+
+	commit = _git_commit()
+	started = datetime.datetime.now(datetime.timezone.utc)
+	results = run(args.fixtures, args.vertices, args.parts, args.modes, args.repeat, args.seed)
+
+	payload = {
+		"meta": {
+			"commit": commit,
+			"started": started.isoformat(),
+			"python": platform.python_version(),
+			"numpy": np.__version__,
+			"shapely": shapely.__version__,
+			"machine": platform.machine(),
+			"cpu_count": os.cpu_count(),
+			"repeat": args.repeat,
+			"seed": args.seed,
+		},
+		"results": results,
+	}
+	output = args.output
+	if not output:
+		os.makedirs(RESULTS_DIR, exist_ok=True)
+		stamp = started.strftime("%Y%m%dT%H%M%S")
+		output = os.path.join(RESULTS_DIR, f"{stamp}-{commit or 'nogit'}.json")
+	with open(output, "w") as f:
+		json.dump(payload, f, indent=1)
+	print(f"\nWrote {len(results)} results to {output}")
+
+	if args.compare:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+		if compare(results, baseline, args.threshold):
+			sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
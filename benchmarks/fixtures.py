@@ -0,0 +1,94 @@
+"""Synthetic and real-shaped cutblock fixtures for the split benchmarks.
+
+Every fixture takes a target vertex count and a NumPy generator and returns a
+shapely Polygon in lng/lat around the app's default map location, sized like a
+typical cutblock (roughly 1-2 km across).
+"""
+import numpy as np
+import shapely
+from shapely.geometry import Point, Polygon
+
+CENTER = (-118.1957, 50.9981)
+RADIUS = 0.01
+
+# Hand-traced block outline (lng, lat): irregular, with a notch and a long lobe
+REAL_BLOCK = [
+	(-118.2061, 50.9932), (-118.2003, 50.9921), (-118.1952, 50.9929),
+	(-118.1917, 50.9911), (-118.1866, 50.9917), (-118.1839, 50.9946),
+	(-118.1851, 50.9978), (-118.1829, 51.0006), (-118.1857, 51.0041),
+	(-118.1902, 51.0036), (-118.1931, 51.0007), (-118.1958, 51.0013),
+	(-118.1969, 51.0049), (-118.2012, 51.0062), (-118.2048, 51.0038),
+	(-118.2039, 51.0003), (-118.2072, 50.9978), (-118.2081, 50.9951),
+]
+
+
+def _radial_ring(n_vertices, radius_fn):
+	t = np.linspace(0.0, 2.0 * np.pi, max(int(n_vertices), 3), endpoint=False)
+	r = RADIUS * radius_fn(t)
+	return Polygon(np.column_stack([CENTER[0] + r * np.cos(t), CENTER[1] + r * np.sin(t)]))
+
+
+def convex(n_vertices, rng):
+	"""Ellipse."""
+	t = np.linspace(0.0, 2.0 * np.pi, max(int(n_vertices), 3), endpoint=False)
+	return Polygon(np.column_stack([
+		CENTER[0] + 1.4 * RADIUS * np.cos(t),
+		CENTER[1] + 0.8 * RADIUS * np.sin(t),
+	]))
+
+
+def concave(n_vertices, rng):
+	"""Five-lobed star-shaped block with a little boundary noise."""
+	def radius(t):
+		return 1.0 + 0.35 * np.sin(5 * t) + 0.05 * rng.random(t.shape[0])
+	return _radial_ring(n_vertices, radius)
+
+
+def rough(n_vertices, rng):
+	"""Many-vertex block whose boundary follows a smoothed random walk."""
+	def radius(t):
+		walk = np.cumsum(rng.normal(0.0, 1.0, t.shape[0]))
+		walk -= np.linspace(0.0, walk[-1], t.shape[0])  # close the loop
+		walk /= max(np.abs(walk).max(), 1e-9)
+		return 1.0 + 0.25 * walk
+	return _radial_ring(n_vertices, radius)
+
+
+def holes(n_vertices, rng):
+	"""Concave block with three circular reserves cut out of it."""
+	outer = concave(max(int(n_vertices) * 3 // 4, 3), rng)
+	hole_vertices = max((int(n_vertices) - len(outer.exterior.coords)) // 3, 8)
+	reserves = [
+		Point(CENTER[0] + dx * RADIUS, CENTER[1] + dy * RADIUS).buffer(
+			0.12 * RADIUS, quad_segs=max(hole_vertices // 4, 2)
+		)
+		for dx, dy in ((0.3, 0.2), (-0.4, 0.1), (0.0, -0.45))
+	]
+	return outer.difference(shapely.union_all(reserves))
+
+
+def real(n_vertices, rng):
+	"""REAL_BLOCK densified (or thinned) to roughly n_vertices."""
+	poly = Polygon(REAL_BLOCK)
+	n = int(n_vertices)
+	if n < len(REAL_BLOCK):
+		return Polygon(REAL_BLOCK[:: int(np.ceil(len(REAL_BLOCK) / max(n, 3)))])
+	return shapely.segmentize(poly, poly.exterior.length / n)
+
+
+FIXTURES = {
+	"convex": convex,
+	"concave": concave,
+	"rough": rough,
+	"holes": holes,
+	"real": real,
+}
+
+
+def make_fixture(name, n_vertices, seed=0):
+	"""Build fixture name with about n_vertices vertices, reproducibly."""
+	return FIXTURES[name](n_vertices, np.random.default_rng(seed))
+
+
+def vertex_count(poly):
+	return len(poly.exterior.coords) - 1 + sum(len(r.coords) - 1 for r in poly.interiors)
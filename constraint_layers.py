@@ -0,0 +1,156 @@
+"""Server-side exclusion layers (riparian reserves, roads, wildlife-tree patches).
+
+A layer is uploaded once as GeoJSON (lng/lat), reduced to its polygonal
+features and stored by content hash as CONSTRAINT_DIR/<id>.npz in Shapely's
+ragged-array form, so loading tens of thousands of features is a few array
+reads. Each process loads a layer on first use, builds an STRtree over it and
+keeps the most recently used layers in memory, which lets split workers look
+layers up by id without the geometries ever crossing a process boundary.
+
+Configured from the environment:
+
+- CUTBLOCK_CONSTRAINT_DIR: directory for stored layers (default data/constraint_layers)
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+from shapely import GeometryType, STRtree
+
+CONSTRAINT_DIR = "data/constraint_layers"
+POLYGONAL_TYPES = (GeometryType.POLYGON, GeometryType.MULTIPOLYGON)
+
+
+class ConstraintLayer:
+	"""Polygonal exclusion features with a spatial index."""
+
+	def __init__(self, layer_id, geoms):
+		self.id = layer_id
+		self.geoms = np.asarray(geoms, dtype=object)
+		self.tree = STRtree(self.geoms)
+
+	def intersecting(self, geom):
+		"""Features that intersect geom, clipped to a little beyond geom's bounding box.
+
+		The STRtree narrows candidates by envelope and GEOS evaluates the predicate
+		against a prepared copy of geom, so only true hits are returned. Clipping
+		keeps huge features (a long river reserve) from adding distant vertices; the
+		margin keeps clipped edges outside geom once both are reprojected.
+		"""
+		hits = self.geoms[self.tree.query(geom, predicate="intersects")]
+		minx, miny, maxx, maxy = geom.bounds
+		pad = max(maxx - minx, maxy - miny) * 0.01
+		return shapely.clip_by_rect(hits, minx - pad, miny - pad, maxx + pad, maxy + pad)
+
+	def summary(self):
+		bounds = shapely.total_bounds(self.geoms) if len(self.geoms) else [None] * 4
+		return {
+			"id": self.id,
+			"feature_count": len(self.geoms),
+			"bounds": [float(b) if b is not None else None for b in bounds],
+		}
+
+
+def parse_geojson(data):
+	"""(polygonal geometries, number of skipped non-polygonal features) from GeoJSON text.
+
+	Accepts a FeatureCollection, a Feature or a bare geometry. Invalid polygons are
+	repaired with buffer(0). Raises ValueError for text GEOS cannot read.
+	"""
+	try:
+		geom = shapely.from_geojson(data)
+	except shapely.errors.GEOSException as e:
+		raise ValueError(f"Invalid GeoJSON: {e}")
+	if geom is None or geom.is_empty:
+		return np.empty(0, dtype=object), 0
+	geoms = shapely.get_parts(geom) if geom.geom_type == "GeometryCollection" else np.array([geom], dtype=object)
+	keep = np.isin(shapely.get_type_id(geoms), POLYGONAL_TYPES) & ~shapely.is_empty(geoms)
+	polys = geoms[keep]
+	invalid = ~shapely.is_valid(polys)
+	if invalid.any():
+		polys[invalid] = shapely.buffer(polys[invalid], 0)
+	return polys, int((~keep).sum())
+
+
+class ConstraintStore:
+	"""Content-addressed layer files plus an LRU of loaded, indexed layers."""
+
+	def __init__(self, root=CONSTRAINT_DIR, max_loaded=8):
+		self.root = root
+		self.max_loaded = max(1, int(max_loaded))
+		self._loaded = OrderedDict()
+		self._lock = threading.Lock()
+		os.makedirs(root, exist_ok=True)
+
+	def _path(self, layer_id):
+		return os.path.join(self.root, layer_id + ".npz")
+
+	def exists(self, layer_id):
+		return bool(re.fullmatch(r"[0-9a-f]{32}", layer_id or "")) and os.path.exists(self._path(layer_id))
+
+	def save(self, geoms):
+		"""Store polygonal geometries and return the ConstraintLayer; identical layers share an id."""
+		geoms = np.asarray(geoms, dtype=object)
+		if len(geoms) == 0:
+			raise ValueError("No Polygon or MultiPolygon features to store")
+		geom_type, coords, offsets = shapely.to_ragged_array(geoms)
+		h = hashlib.sha256(coords.tobytes())
+		for o in offsets:
+			h.update(o.tobytes())
+		layer_id = h.hexdigest()[:32]
+		path = self._path(layer_id)
+		if not os.path.exists(path):
+			fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+			with os.fdopen(fd, "wb") as f:
+				np.savez(f, *offsets, geom_type=int(geom_type), coords=coords)
+			os.replace(tmp, path)
+		layer = ConstraintLayer(layer_id, shapely.from_ragged_array(geom_type, coords, offsets))
+		self._remember(layer)
+		return layer
+
+	def get(self, layer_id):
+		"""The indexed layer for layer_id, loading it from disk on first use, or None."""
+		with self._lock:
+			layer = self._loaded.get(layer_id)
+			if layer is not None:
+				self._loaded.move_to_end(layer_id)
+				return layer
+		if not self.exists(layer_id):
+			return None
+		with np.load(self._path(layer_id)) as data:
+			offsets = [data[f"arr_{i}"] for i in range(len(data.files) - 2)]
+			geoms = shapely.from_ragged_array(GeometryType(int(data["geom_type"])), data["coords"], offsets)
+		layer = ConstraintLayer(layer_id, geoms)
+		self._remember(layer)
+		return layer
+
+	def delete(self, layer_id):
+		"""Remove a stored layer; returns False if it did not exist."""
+		if not self.exists(layer_id):
+			return False
+		with self._lock:
+			self._loaded.pop(layer_id, None)
+		os.unlink(self._path(layer_id))
+		return True
+
+	def _remember(self, layer):
+		with self._lock:
+			self._loaded[layer.id] = layer
+			self._loaded.move_to_end(layer.id)
+			while len(self._loaded) > self.max_loaded:
+				self._loaded.popitem(last=False)
+
+
+_constraint_store = None
+
+
+def get_constraint_store():
+	global _constraint_store
+	if _constraint_store is None:
+		_constraint_store = ConstraintStore(os.environ.get("CUTBLOCK_CONSTRAINT_DIR") or CONSTRAINT_DIR)
+	return _constraint_store
@@ -0,0 +1,59 @@
+"""Local metric projection for splitting lng/lat polygons.
+
+Shapely works in whatever units it is given, so splitting raw lng/lat balances
+square degrees, which shrink east-west with latitude (by about 40% at 54N). Rings
+are projected into their WGS84 UTM zone, split in metres and projected back.
+Transformers are built once per zone and reused.
+"""
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from pyproj import Geod, Transformer
+
+_GEOD = Geod(ellps="WGS84")
+
+
+def utm_epsg(lng, lat):
+	"""EPSG code of the WGS84 UTM zone containing (lng, lat)."""
+	zone = int((float(lng) + 180.0) // 6.0) % 60 + 1
+	return (32600 if lat >= 0 else 32700) + zone
+
+
+@lru_cache(maxsize=None)
+def _transformers(epsg):
+	return (
+		Transformer.from_crs(4326, epsg, always_xy=True),
+		Transformer.from_crs(epsg, 4326, always_xy=True),
+	)
+
+
+def _apply(transformer, coords):
+	x, y = transformer.transform(coords[:, 0], coords[:, 1])
+	return np.column_stack([x, y])
+
+
+def ring_to_local(polygon_coords):
+	"""(ring in metres as an (n, 2) array, EPSG code) for a [lng, lat] ring."""
+	ring = np.asarray(polygon_coords, dtype=float)[:, :2]
+	lng, lat = ring.mean(axis=0)
+	epsg = utm_epsg(lng, lat)
+	forward, _ = _transformers(epsg)
+	return _apply(forward, ring), epsg
+
+
+def geometries_to_local(geoms, epsg):
+	"""Project lng/lat Shapely geometries into the given UTM zone."""
+	forward, _ = _transformers(epsg)
+	return shapely.transform(np.asarray(geoms, dtype=object), lambda c: _apply(forward, c))
+
+
+def polygons_to_lnglat(polys, epsg):
+	"""Project Shapely geometries in the given UTM zone back to lng/lat."""
+	_, inverse = _transformers(epsg)
+	return list(shapely.transform(np.asarray(polys, dtype=object), lambda c: _apply(inverse, c)))
+
+
+def area_hectares(polys_lnglat):
+	"""Geodesic area of each lng/lat polygon on the WGS84 ellipsoid, in hectares."""
+	return [abs(_GEOD.geometry_area_perimeter(p)[0]) / 10_000.0 for p in polys_lnglat]
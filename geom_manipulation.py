@@ -1,14 +1,120 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import numpy as np
+import shapely
+from shapely import affinity
 from shapely.geometry import Polygon, Point, MultiPoint, box
+from shapely.geometry.base import BaseGeometry
+from shapely.geometry.polygon import orient
 from shapely.ops import voronoi_diagram, unary_union
-from sklearn.cluster import KMeans
+
+from perf_metrics import observe, observe_seconds, propagate, stage, timed
+
+
+def _as_polygon(polygon_coords):
+	"""Repaired geometry for a ring of (x, y) tuples or an existing (Multi)Polygon.
+
+	Splitters accept either, so a net area with holes or several pieces (e.g. a
+	block with exclusions removed) can be split directly.
+	"""
+	if isinstance(polygon_coords, PreparedPolygon):
+		return polygon_coords.poly
+	geom = polygon_coords if isinstance(polygon_coords, BaseGeometry) else Polygon(polygon_coords)
+	observe("repair", "vertices", shapely.get_num_coordinates(geom))
+	with stage("repair"):
+		return geom.buffer(0)
+
+
+def _as_prepared(polygon_coords):
+	if isinstance(polygon_coords, PreparedPolygon):
+		return polygon_coords
+	return PreparedPolygon(polygon_coords)
+
+
+class PreparedPolygon:
+	"""A repaired, prepared polygon that caches the per-shape work of each splitter.
+
+	Every splitter accepts one in place of polygon_coords. k-means sample sets (per
+	seed, sampling method and count), axis area profiles, the radial center and
+	profile and the recursive root's rotated profiles depend only on the shape, so
+	they are computed once and reused by later splits at any part count. Results
+	are identical to splitting the raw polygon.
+	"""
+
+	def __init__(self, polygon_coords):
+		self.poly = _as_polygon(polygon_coords)
+		shapely.prepare(self.poly)
+		self._cache = {}
+		self._pieces = None
+
+	def cached(self, key, compute):
+		value = self._cache.get(key)
+		if value is None:
+			value = self._cache[key] = compute()
+		return value
+
+	def pieces(self):
+		"""One PreparedPolygon per part of a MultiPolygon, or [self] for a Polygon."""
+		if self._pieces is None:
+			geoms = getattr(self.poly, "geoms", None)
+			self._pieces = [PreparedPolygon(g) for g in geoms] if geoms is not None else [self]
+		return self._pieces
+
+	def kmeans_samples(self, n_points, seed, method="random"):
+		"""Interior points equal_area_kmeans_split_polygon clusters for seed.
+
+		They come from child 0 of np.random.SeedSequence(seed), whatever the number
+		of restarts; only explicit seeds are cached.
+		"""
+		def draw():
+			sample_seq = np.random.SeedSequence(seed).spawn(1)[0]
+			return _sample_points_in_polygon(
+				self.poly, n_points, np.random.default_rng(sample_seq), method=method
+			)
+
+		if seed is None:
+			return draw()
+		return self.cached(("samples", int(seed), method, int(n_points)), draw)
+
+	def axis_profile(self, axis):
+		return self.cached(("axis", axis), lambda: _axis_area_profile(self.poly, axis))
+
+	def radial_center(self):
+		"""(center, cover radius) used by radial_split_polygon."""
+		def compute():
+			center = self.poly.representative_point()
+			return center, _polygon_cover_radius(self.poly, center)
+
+		return self.cached(("radial_center",), compute)
+
+	def radial_profile(self):
+		return self.cached(("radial",), lambda: _radial_profile(self.poly, self.radial_center()[0]))
+
+	def rotated_profiles(self, n_directions):
+		return self.cached(("rotations", int(n_directions)), lambda: _rotated_profiles(self.poly, n_directions))
+
+	def precompute(self, seed=None, sampling="random", n_points=2000, n_directions=8):
+		"""Fill every cache up front (samples only for an explicit seed); returns self."""
+		for piece in self.pieces():
+			if piece.poly.is_empty:
+				continue
+			piece.axis_profile("x")
+			piece.axis_profile("y")
+			piece.radial_profile()
+			piece.rotated_profiles(n_directions)
+			if seed is not None:
+				piece.kmeans_samples(n_points, seed, sampling)
+		return self
 
 
 def _sector_polygon(cx, cy, r, start_angle, end_angle, max_segment_angle=np.pi / 48):
 	"""Create a (finite) circular sector polygon centered at (cx, cy).
 
 	The sector includes the arc from start_angle to end_angle. Use r large enough to
-	fully cover the polygon being clipped.
+	fully cover the polygon being clipped; see _arc_segment_angle for how coarse
+	the arc can then be.
 	"""
 	start = float(start_angle)
 	end = float(end_angle)
@@ -20,52 +126,171 @@ def _sector_polygon(cx, cy, r, start_angle, end_angle, max_segment_angle=np.pi /
 		return Polygon([(cx, cy), (cx + r, cy), (cx + r, cy), (cx, cy)])
 	steps = max(2, int(np.ceil(delta / float(max_segment_angle))))
 	angles = np.linspace(start, end, steps + 1)
-	arc_pts = [(cx + r * np.cos(a), cy + r * np.sin(a)) for a in angles]
-	return Polygon([(cx, cy)] + arc_pts + [(cx, cy)])
+	ring = np.empty((steps + 3, 2))
+	ring[0] = ring[-1] = (cx, cy)
+	ring[1:-1, 0] = cx + r * np.cos(angles)
+	ring[1:-1, 1] = cy + r * np.sin(angles)
+	return Polygon(ring)
 
 
-def _polygon_cover_radius(poly, center_pt):
+def _polygon_reach(poly, center_pt):
+	"""Distance from center_pt to the farthest corner of the polygon's bounds."""
 	minx, miny, maxx, maxy = poly.bounds
 	cx, cy = center_pt.x, center_pt.y
 	corners = [(minx, miny), (minx, maxy), (maxx, miny), (maxx, maxy)]
 	d = 0.0
 	for x, y in corners:
 		d = max(d, float(np.hypot(x - cx, y - cy)))
+	return d
+
+
+def _polygon_cover_radius(poly, center_pt):
 	# Multiply to be safe so the sector fully covers the polygon
-	return d * 2.5 + 1e-6
+	return _polygon_reach(poly, center_pt) * 2.5 + 1e-6
+
+
+def _arc_segment_angle(r, reach):
+	"""Largest arc step whose chords stay outside radius reach.
+
+	A chord spanning angle t sits r*cos(t/2) from the center, so with the cover
+	radius far outside the polygon a sector needs only a handful of arc vertices
+	(about 2.3 rad per step at r = 2.5 * reach).
+	"""
+	if reach <= 0 or reach >= r:
+		return np.pi / 48
+	return 2.0 * np.arccos(reach / r) * 0.9
 
 
-def _slice_area(poly, center_pt, start_angle, end_angle, r):
-	sector = _sector_polygon(center_pt.x, center_pt.y, r, start_angle, end_angle)
+def _slice_area(poly, center_pt, start_angle, end_angle, r, max_segment_angle=np.pi / 48):
+	sector = _sector_polygon(center_pt.x, center_pt.y, r, start_angle, end_angle, max_segment_angle)
 	clipped = poly.intersection(sector)
 	return clipped.area
 
 
-def radial_split_polygon(polygon_coords, n_parts, area_tolerance=0.05):
-	"""Split a polygon into n_parts radial 'pizza slices' of (near) equal area.
+def _radial_edge_pieces(poly, center):
+	"""Describe poly's boundary as angular pieces around center.
 
-	This chooses a center point inside the polygon and finds slice boundary angles
-	so each slice has approximately total_area / n_parts.
+	Each boundary edge is seen from center under a range of polar angles. Returns
+	arrays (a, b, k, psi): piece i covers angles [a_i, b_i] within [0, 2*pi] and adds
+	k_i * (tan(theta - psi_i) - tan(a_i - psi_i)) to the area of poly inside the
+	sector [0, theta] for a_i <= theta <= b_i. This is the signed area of the
+	triangle fanned from center to the visible part of the edge, so holes and
+	non-star-shaped polygons are handled by cancellation.
 	"""
-	poly = Polygon(polygon_coords).buffer(0)
-	if poly.is_empty:
-		return []
-	if n_parts <= 1:
-		return [poly]
+	cx, cy = center.x, center.y
+	segs = []
+	for piece in getattr(poly, "geoms", [poly]):
+		piece = orient(piece, sign=1.0)
+		for ring in [piece.exterior, *piece.interiors]:
+			xy = np.asarray(ring.coords)[:, :2] - (cx, cy)
+			segs.append(np.hstack([xy[:-1], xy[1:]]))
+	seg = np.vstack(segs)
+	p, q = seg[:, :2], seg[:, 2:]
+	dq = q - p
+	len2 = (dq ** 2).sum(axis=1)
+	cross = p[:, 0] * q[:, 1] - p[:, 1] * q[:, 0]
+	# Edges pointing at the center sweep no area
+	keep = (len2 > 0) & (np.abs(cross) > 1e-12 * (p ** 2).sum(axis=1).max())
+	p, dq, len2, cross = p[keep], dq[keep], len2[keep], cross[keep]
+
+	two_pi = 2.0 * np.pi
+	ap = np.mod(np.arctan2(p[:, 1], p[:, 0]), two_pi)
+	dphi = np.arctan2(cross, (p * (p + dq)).sum(axis=1))
+	lo = np.where(dphi > 0, ap, np.mod(ap + dphi, two_pi))
+	hi = lo + np.abs(dphi)
+
+	# Foot of the perpendicular from center onto the edge's line: distance d, angle psi
+	foot = p - ((p * dq).sum(axis=1) / len2)[:, None] * dq
+	psi = np.arctan2(foot[:, 1], foot[:, 0])
+	k = np.sign(cross) * 0.5 * cross ** 2 / len2
+
+	# Split pieces that wrap past 2*pi
+	wrap = hi > two_pi
+	a = np.concatenate([lo, np.zeros(int(wrap.sum()))])
+	b = np.concatenate([np.minimum(hi, two_pi), hi[wrap] - two_pi])
+	return a, b, np.concatenate([k, k[wrap]]), np.concatenate([psi, psi[wrap]])
+
+
+@timed("radial_profile")
+def _radial_profile(poly, center):
+	"""(a, b, k, psi, bp, F, total): edge pieces plus the cumulative slice area F
+	at every breakpoint angle bp, independent of the number of slices."""
+	a, b, k, psi = _radial_edge_pieces(poly, center)
+	full = k * (np.tan(b - psi) - np.tan(a - psi))
+
+	bp = np.unique(np.concatenate([[0.0, 2.0 * np.pi], a, b]))
+	order = np.argsort(b)
+	done = np.concatenate([[0.0], np.cumsum(full[order])])
+	F = done[np.searchsorted(b[order], bp, side="right")]
+	# Add the partial contribution of pieces that straddle each breakpoint
+	start = np.searchsorted(bp, a, side="right")
+	counts = np.maximum(np.searchsorted(bp, b, side="left") - start, 0)
+	piece = np.repeat(np.arange(a.shape[0]), counts)
+	offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+	at = np.repeat(start, counts) + offsets
+	np.add.at(F, at, k[piece] * (np.tan(bp[at] - psi[piece]) - np.tan(a[piece] - psi[piece])))
+	F = np.maximum.accumulate(F)
+	return a, b, k, psi, bp, F, full.sum()
+
+
+def _radial_angles_analytic(poly, center, n_parts, profile=None):
+	"""Boundary angles (excluding 0 and 2*pi) of n_parts equal-area slices.
+
+	The cumulative slice area F(theta) is a sum of tan terms that only changes form
+	at edge endpoints. We evaluate F at those breakpoints, locate each target area
+	by searchsorted and solve inside the bracketing interval in closed form (one
+	visible edge) or with a safeguarded Newton step (several edges). profile is
+	_radial_profile(poly, center), if already known.
+	"""
+	a, b, k, psi, bp, F, total = profile if profile is not None else _radial_profile(poly, center)
+	targets = total * np.arange(1, int(n_parts)) / float(n_parts)
+
+	angles = []
+	for target in targets:
+		j = int(np.clip(np.searchsorted(F, target, side="right") - 1, 0, bp.shape[0] - 2))
+		lo, hi = bp[j], bp[j + 1]
+		active = (a <= lo) & (b >= hi)
+		ka, pa = k[active], psi[active]
+		rem = target - F[j]
+		if ka.shape[0] == 0 or rem <= 0:
+			angles.append(float(lo))
+			continue
+		t0 = np.tan(lo - pa)
+		if ka.shape[0] == 1:
+			theta = lo + np.arctan(t0[0] + rem / ka[0]) - np.arctan(t0[0])
+		else:
+			theta = _solve_radial_interval(ka, pa, t0, lo, hi, rem)
+		angles.append(float(np.clip(theta, lo, hi)))
+	return angles
 
-	# Ensure center is inside polygon
-	center = poly.representative_point()
-	r = _polygon_cover_radius(poly, center)
 
-	total_area = poly.area
-	if total_area <= 0:
-		return [poly]
+def _solve_radial_interval(k, psi, t0, lo, hi, rem, max_iter=50):
+	"""Newton/bisection solve of sum(k * (tan(theta - psi) - t0)) == rem on [lo, hi]."""
+	theta = (lo + hi) / 2.0
+	for _ in range(max_iter):
+		f = (k * (np.tan(theta - psi) - t0)).sum() - rem
+		if abs(f) <= 1e-12 * abs(rem) or hi - lo < 1e-12:
+			break
+		if f < 0:
+			lo = theta
+		else:
+			hi = theta
+		slope = (k / np.cos(theta - psi) ** 2).sum()
+		step = theta - f / slope if slope > 0 else None
+		theta = step if step is not None and lo < step < hi else (lo + hi) / 2.0
+	return theta
 
+
+def _radial_angles_bisection(poly, center, r, n_parts, area_tolerance):
+	"""Boundary angles found by bisecting on clipped sector areas (reference engine)."""
+	segment_angle = _arc_segment_angle(r, _polygon_reach(poly, center))
+	total_area = poly.area
 	target = total_area / float(n_parts)
-	angles = [0.0]
+	angles = []
 
 	# Find angles incrementally so each slice hits the target area
 	start = 0.0
+	iterations = 0
 	for i in range(1, int(n_parts)):
 		# Remaining slices
 		remaining_slices = int(n_parts) - (i - 1)
@@ -79,8 +304,9 @@ def radial_split_polygon(polygon_coords, n_parts, area_tolerance=0.05):
 		best = None
 		best_err = float("inf")
 		for _ in range(50):
+			iterations += 1
 			mid = (lo + hi) / 2.0
-			a = _slice_area(poly, center, start, mid, r)
+			a = _slice_area(poly, center, start, mid, r, segment_angle)
 			err = abs(a - this_target)
 			if err < best_err:
 				best_err = err
@@ -99,25 +325,58 @@ def radial_split_polygon(polygon_coords, n_parts, area_tolerance=0.05):
 			break
 		start = best
 		angles.append(start)
+	observe("radial_bisection", "iterations", iterations)
+	return angles
 
-	angles.append(2.0 * np.pi)
+
+def radial_split_polygon(polygon_coords, n_parts, area_tolerance=0.05, engine="analytic"):
+	"""Split a polygon into n_parts radial 'pizza slices' of (near) equal area.
+
+	This chooses a center point inside the polygon and finds slice boundary angles
+	so each slice has approximately total_area / n_parts. engine="analytic" solves
+	the angles exactly from the polygon's edges and clips only the final slices;
+	engine="bisection" searches each angle with repeated sector intersections and
+	is kept as a reference (area_tolerance only applies to it).
+	"""
+	prepared = _as_prepared(polygon_coords)
+	poly = prepared.poly
+	if poly.is_empty:
+		return []
+	if n_parts <= 1:
+		return [poly]
+
+	# Ensure center is inside polygon
+	center, r = prepared.radial_center()
+
+	total_area = poly.area
+	if total_area <= 0:
+		return [poly]
+
+	if engine == "bisection":
+		with stage("radial_bisection"):
+			inner = _radial_angles_bisection(poly, center, r, n_parts, area_tolerance)
+	elif engine == "analytic":
+		profile = prepared.radial_profile()
+		with stage("radial_angles"):
+			inner = _radial_angles_analytic(poly, center, n_parts, profile)
+	else:
+		raise ValueError(f"Unknown radial engine: {engine!r}")
+	angles = [0.0] + inner + [2.0 * np.pi]
 
 	# Build slice polygons
+	segment_angle = _arc_segment_angle(r, _polygon_reach(poly, center))
 	parts = []
-	for a0, a1 in zip(angles[:-1], angles[1:]):
-		sector = _sector_polygon(center.x, center.y, r, a0, a1)
-		clipped = poly.intersection(sector).buffer(0)
-		if clipped.is_empty:
-			continue
-		if clipped.geom_type == "Polygon":
-			parts.append(clipped)
-		elif clipped.geom_type == "MultiPolygon":
-			largest = _largest_polygon(clipped)
-			if largest is not None and not largest.is_empty:
-				parts.append(largest)
+	fragments = []
+	with stage("radial_clip"):
+		for a0, a1 in zip(angles[:-1], angles[1:]):
+			sector = _sector_polygon(center.x, center.y, r, a0, a1, segment_angle)
+			piece, extras = _largest_and_fragments(poly.intersection(sector).buffer(0))
+			if piece is not None:
+				parts.append(piece)
+				fragments.extend(extras)
 
-	# Best effort to return exactly n_parts
-	return parts[: int(n_parts)]
+	# Slices of a non-star-shaped polygon fall apart; keep their area in neighbouring parts
+	return _merge_fragments(parts, fragments)[: int(n_parts)]
 
 
 def _largest_polygon(geom):
@@ -136,15 +395,116 @@ def _largest_polygon(geom):
 
 
 
-def _sample_points_in_polygon(poly, n_points, rng):
+def _largest_and_fragments(geom):
+	"""(largest polygon of geom, list of its other polygons); (None, []) if it has no area."""
+	pieces = shapely.get_parts(geom)
+	pieces = pieces[shapely.area(pieces) > 0]
+	if pieces.size == 0:
+		return None, []
+	k = int(np.argmax(shapely.area(pieces)))
+	return pieces[k], list(np.delete(pieces, k))
+
+
+def _merge_fragments(parts, fragments):
+	"""Union each fragment into the part it shares the longest edge with.
+
+	Cuts computed separately for neighbouring pieces agree only to rounding, so a
+	fragment is snapped onto a part (within a tolerance far below any real
+	feature) before measuring the shared edge and merging. A fragment may only
+	touch other fragments at first, so passes repeat until nothing more can be
+	placed; anything still isolated is dropped.
+	"""
+	parts = list(parts)
+	pending = [f for f in fragments if not f.is_empty]
+	if not pending or not parts:
+		return parts
+	minx, miny, maxx, maxy = shapely.total_bounds(parts + pending)
+	tolerance = max(maxx - minx, maxy - miny) * 1e-9
+	while pending:
+		left = []
+		for frag in pending:
+			best, best_shared = None, 0.0
+			for i in np.flatnonzero(shapely.dwithin(frag, parts, tolerance)):
+				snapped = shapely.snap(frag, parts[i], tolerance)
+				shared = shapely.intersection(snapped.boundary, parts[i].boundary).length
+				if shared > best_shared:
+					best, best_shared = (i, snapped), shared
+			merged = unary_union([parts[best[0]], best[1]]) if best is not None else None
+			if merged is not None and merged.geom_type == "Polygon":
+				parts[best[0]] = merged
+			else:
+				left.append(frag)
+		if len(left) == len(pending):
+			break
+		pending = left
+	return parts
+
+
+def _low_discrepancy_sampler(method, rng):
+	"""Return a scrambled 2-D Sobol/Halton sampler seeded from rng."""
+	from scipy.stats import qmc
+
+	seed = int(rng.integers(0, 2**32 - 1))
+	if method == "sobol":
+		return qmc.Sobol(d=2, scramble=True, seed=seed)
+	if method == "halton":
+		return qmc.Halton(d=2, scramble=True, seed=seed)
+	raise ValueError(f"Unknown sampling method: {method!r}")
+
+
+@timed("sample")
+def _sample_points_in_polygon(poly, n_points, rng, method="random", max_batch=1_000_000):
+	"""Sample n_points interior points of poly by batched rejection sampling.
+
+	Candidates are drawn in the bounding box as NumPy arrays and tested in one
+	vectorized call against the prepared polygon. The batch size follows
+	the observed acceptance ratio, so concave shapes with a low fill ratio need only
+	a handful of rounds. method="sobol" or "halton" draws candidates from a
+	scrambled low-discrepancy sequence instead of uniform noise, which covers the
+	polygon more evenly for the same number of points.
+	"""
+	n_points = int(n_points)
+	if n_points <= 0 or poly.is_empty or poly.area <= 0:
+		return np.empty((0, 2))
+
 	minx, miny, maxx, maxy = poly.bounds
-	points = []
-	# Sample random points inside the polygon
-	while len(points) < n_points:
-		x, y = rng.uniform(minx, maxx), rng.uniform(miny, maxy)
-		if poly.contains(Point(x, y)):
-			points.append([x, y])
-	return np.array(points)
+	lo = np.array([minx, miny])
+	span = np.array([maxx - minx, maxy - miny])
+
+	sampler = None
+	if method and method != "random":
+		sampler = _low_discrepancy_sampler(method, rng)
+
+	# Preparing only caches GEOS indexes on the geometry; it does not change it.
+	shapely.prepare(poly)
+
+	# Start from the exact fill ratio; refine it from what we actually accept.
+	accept_ratio = max(poly.area / float(span[0] * span[1]), 1e-4)
+	drawn = 0
+	accepted = 0
+	chunks = []
+	while accepted < n_points:
+		needed = n_points - accepted
+		batch = int(np.ceil(needed / accept_ratio * 1.1)) + 16
+		batch = min(batch, int(max_batch))
+		if sampler is not None:
+			# Sobol balance properties need power-of-two draws
+			batch = 1 << int(np.ceil(np.log2(batch)))
+			unit = sampler.random(batch)
+		else:
+			unit = rng.random((batch, 2))
+		cand = lo + unit * span
+		inside = cand[shapely.contains_xy(poly, cand[:, 0], cand[:, 1])]
+		chunks.append(inside)
+		drawn += batch
+		accepted += inside.shape[0]
+		if accepted:
+			accept_ratio = max(accepted / float(drawn), 1e-4)
+
+	observe("sample", "samples", n_points)
+	observe("sample", "candidates", drawn)
+	observe("sample", "iterations", len(chunks))
+	return np.concatenate(chunks)[:n_points]
 
 
 def _capacities_equal(total_points, n_clusters):
@@ -153,13 +513,32 @@ def _capacities_equal(total_points, n_clusters):
 	return [base + (1 if i < extra else 0) for i in range(n_clusters)]
 
 
-def _assign_with_capacities(points, centroids, capacities):
-	"""Assign each point to a centroid while respecting per-centroid capacities."""
-	points = np.asarray(points)
-	centroids = np.asarray(centroids)
+def _centroid_distances(points, centroids):
+	"""(n, k) Euclidean distances via one matrix product, without an (n, k, 2) temporary."""
+	# Centre first so |p|^2 - 2 p.c + |c|^2 doesn't cancel on lat/lng-sized values
+	origin = points.mean(axis=0)
+	p = points - origin
+	c = centroids - origin
+	sq = (p * p).sum(axis=1)[:, None] - 2.0 * (p @ c.T) + (c * c).sum(axis=1)[None, :]
+	return np.sqrt(np.maximum(sq, 0.0))
+
+
+@timed("capacity_assign")
+def _assign_with_capacities(points, centroids, capacities, engine="rounds"):
+	"""Assign each point to a centroid while respecting per-centroid capacities.
+
+	engine="rounds" is the vectorized assignment in _assign_in_rounds; engine="greedy"
+	is the original regret-ordered per-point loop, kept as a reference.
+	"""
+	points = np.asarray(points, dtype=float)
+	centroids = np.asarray(centroids, dtype=float)
+	if engine == "rounds":
+		return _assign_in_rounds(_centroid_distances(points, centroids), capacities)
+	if engine != "greedy":
+		raise ValueError(f"Unknown assignment engine: {engine!r}")
 	n, k = points.shape[0], centroids.shape[0]
 	# Distances: (n, k)
-	dists = np.linalg.norm(points[:, None, :] - centroids[None, :, :], axis=2)
+	dists = _centroid_distances(points, centroids)
 	prefs = np.argsort(dists, axis=1)
 	# Regret: how much worse 2nd best is than best; assign high-regret points first
 	best = dists[np.arange(n), prefs[:, 0]]
@@ -182,38 +561,112 @@ def _assign_with_capacities(points, centroids, capacities):
 	return assignments
 
 
-def _balanced_kmeans(points, n_clusters, n_iter=8, rng=None):
-	"""Heuristic balanced k-means: iteratively enforce equal point counts per cluster."""
+def _assign_in_rounds(dists, capacities):
+	"""Regret-based capacitated assignment in at most k + 1 whole-array rounds.
+
+	Each round, every unassigned point proposes to its nearest cluster that still has
+	room, and each cluster accepts its proposers in order of regret (distance to the
+	second-best open cluster minus distance to the best) up to its remaining
+	capacity. Any cluster that turns someone away is full afterwards, so the loop
+	ends within k + 1 rounds, with no per-point Python work.
+	"""
+	n, k = dists.shape
+	remaining = np.array(capacities, dtype=int)
+	labels = np.full(n, -1, dtype=int)
+	todo = np.arange(n)
+	rounds = 0
+	while todo.shape[0]:
+		rounds += 1
+		is_open = remaining > 0
+		n_open = int(is_open.sum())
+		if n_open == 0:
+			# Capacities don't cover n; fall back to the nearest cluster
+			labels[todo] = np.argmin(dists[todo], axis=1)
+			break
+		if n_open == 1:
+			labels[todo] = np.flatnonzero(is_open)[0]
+			break
+		d = dists[todo] + np.where(is_open, 0.0, np.inf)
+		rows = np.arange(todo.shape[0])
+		choice = np.argmin(d, axis=1)
+		best = d[rows, choice]
+		d[rows, choice] = np.inf
+		regret = d.min(axis=1) - best
+
+		# Group proposals by cluster, highest regret first, and rank within each group
+		order = np.lexsort((-regret, choice))
+		grouped = choice[order]
+		rank = np.arange(order.shape[0]) - np.searchsorted(grouped, grouped, side="left")
+		accept = rank < remaining[grouped]
+		labels[todo[order[accept]]] = grouped[accept]
+		remaining -= np.bincount(grouped[accept], minlength=k)
+		todo = todo[order[~accept]]
+	observe("capacity_assign", "iterations", rounds)
+	return labels
+
+
+def _random_state(rng):
+	"""Integer seed for sklearn drawn from a NumPy generator."""
+	return int(rng.integers(0, 2**31 - 1))
+
+
+def _balanced_kmeans(points, n_clusters, n_iter=8, rng=None, cancel=None):
+	"""Heuristic balanced k-means: iteratively enforce equal point counts per cluster.
+
+	Returns None if the optional cancel event is set between iterations.
+	"""
+	from sklearn.cluster import KMeans
+
 	if rng is None:
 		rng = np.random.default_rng()
 
 	# Start from regular kmeans centroids
-	kmeans = KMeans(n_clusters=n_clusters, n_init=5, random_state=int(rng.integers(0, 1_000_000)))
-	labels = kmeans.fit_predict(points)
+	kmeans = KMeans(n_clusters=n_clusters, n_init=5, random_state=_random_state(rng))
+	with stage("kmeans_fit"):
+		labels = kmeans.fit_predict(points)
+	observe("kmeans_fit", "samples", points.shape[0])
+	observe("kmeans_fit", "iterations", kmeans.n_iter_)
 	centroids = kmeans.cluster_centers_
 
 	capacities = _capacities_equal(points.shape[0], n_clusters)
 
+	with stage("balance"):
+		centroids = _balance_centroids(points, n_clusters, labels, centroids, capacities, n_iter, cancel)
+	return centroids
+
+
+def _balance_centroids(points, n_clusters, labels, centroids, capacities, n_iter, cancel):
+	"""Move centroids to the means of capacity-constrained assignments until they settle."""
+	iterations = 0
 	for _ in range(n_iter):
+		if cancel is not None and cancel.is_set():
+			return None
+		iterations += 1
 		labels = _assign_with_capacities(points, centroids, capacities)
-		new_centroids = []
-		for c in range(n_clusters):
-			cluster_pts = points[labels == c]
-			if len(cluster_pts) == 0:
-				new_centroids.append(centroids[c])
-			else:
-				new_centroids.append(cluster_pts.mean(axis=0))
-		new_centroids = np.array(new_centroids)
+		counts = np.bincount(labels, minlength=n_clusters)
+		sums = np.stack(
+			[np.bincount(labels, weights=points[:, d], minlength=n_clusters) for d in range(2)],
+			axis=1,
+		)
+		# Empty clusters keep their previous centroid
+		new_centroids = np.where(
+			counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centroids
+		)
 		if np.allclose(new_centroids, centroids):
 			break
 		centroids = new_centroids
 
+	observe("balance", "iterations", iterations)
 	return centroids
 
 
+@timed("voronoi")
 def _voronoi_split_from_centroids(poly, centroids, keep_largest_piece=True):
+	"""Voronoi cells of centroids clipped to poly. keep_largest_piece=True gives one
+	polygon per cell, folding the smaller pieces of split cells into neighbours."""
 	vor = voronoi_diagram(MultiPoint([Point(c) for c in centroids]), envelope=poly)
 	result_polys = []
+	fragments = []
 	for region in vor.geoms:
 		clipped = region.intersection(poly)
 		if clipped.is_empty:
@@ -222,12 +675,77 @@ def _voronoi_split_from_centroids(poly, centroids, keep_largest_piece=True):
 			result_polys.append(clipped)
 		elif clipped.geom_type == "MultiPolygon":
 			if keep_largest_piece:
-				largest = _largest_polygon(clipped)
+				largest, extras = _largest_and_fragments(clipped)
 				if largest is not None:
 					result_polys.append(largest)
+					fragments.extend(extras)
 			else:
 				result_polys.extend(list(clipped.geoms))
-	return result_polys
+	return _merge_fragments(result_polys, fragments)
+
+
+def _kmeans_restart(poly, points, n_clusters, seed_seq, target, cancel=None):
+	"""Run one balanced k-means restart; returns (polys or None, report dict)."""
+	t0 = time.perf_counter()
+	report = {"status": "ok", "deviation": None}
+	polys = None
+	if cancel is not None and cancel.is_set():
+		report["status"] = "cancelled"
+	else:
+		rng = np.random.default_rng(seed_seq)
+		centroids = _balanced_kmeans(points, n_clusters, n_iter=8, rng=rng, cancel=cancel)
+		if centroids is None:
+			report["status"] = "cancelled"
+		else:
+			polys = _voronoi_split_from_centroids(poly, centroids, keep_largest_piece=True)
+			# Ensure we got the requested number of pieces
+			if len(polys) != n_clusters:
+				report["status"] = "wrong_count"
+				polys = None
+			elif target:
+				report["deviation"] = max(abs(p.area - target) / target for p in polys)
+			else:
+				report["deviation"] = 0.0
+	report["seconds"] = time.perf_counter() - t0
+	return polys, report
+
+
+def _parallel_kmeans_restarts(poly, points, n_clusters, seed_seqs, target, area_tolerance, workers):
+	"""Evaluate restarts concurrently; returns per-restart (polys, report) in index order.
+
+	Once restart i meets area_tolerance, restarts after i are cancelled (queued ones
+	never start, running ones stop at their next balancing iteration) while earlier
+	ones still finish, so the winner is the same restart the serial loop would pick.
+	"""
+	n = len(seed_seqs)
+	cancels = [threading.Event() for _ in range(n)]
+	results = [(None, {"status": "cancelled", "deviation": None, "seconds": 0.0})] * n
+	pool = ThreadPoolExecutor(max_workers=int(workers), thread_name_prefix="kmeans-restart")
+	try:
+		futures = [
+			pool.submit(propagate(_kmeans_restart), poly, points, n_clusters, seq, target, cancels[i])
+			for i, seq in enumerate(seed_seqs)
+		]
+		index_of = {f: i for i, f in enumerate(futures)}
+		winner = None
+		pending = set(range(n))
+		for future in as_completed(futures):
+			i = index_of[future]
+			pending.discard(i)
+			if future.cancelled():
+				continue
+			results[i] = future.result()
+			dev = results[i][1]["deviation"]
+			if dev is not None and dev <= area_tolerance and (winner is None or i < winner):
+				winner = i
+				for j in range(i + 1, n):
+					cancels[j].set()
+					futures[j].cancel()
+			if winner is not None and not any(j < winner for j in pending):
+				break
+	finally:
+		pool.shutdown(wait=False, cancel_futures=True)
+	return results
 
 
 def equal_area_kmeans_split_polygon(
@@ -236,40 +754,65 @@ def equal_area_kmeans_split_polygon(
 	n_points=2000,
 	area_tolerance=0.05,
 	restarts=6,
+	sampling="random",
+	seed=None,
+	restart_workers=1,
 ):
 	"""Attempt near-equal-area split using balanced k-means + Voronoi.
 
 	We enforce (approximately) equal *point counts* per cluster on uniformly-sampled
 	interior points, which usually produces near-equal areas without axis-aligned cuts.
+	sampling="sobol"/"halton" uses low-discrepancy points, which reach the same area
+	balance with fewer samples. A given seed always produces the same split: sampling
+	and each restart draw from their own child of np.random.SeedSequence(seed).
+
+	restart_workers > 1 evaluates restarts concurrently in threads and cancels the
+	remaining ones once a restart is within area_tolerance; the result is identical
+	to the serial run. Each evaluated restart is timed as stage "kmeans_restart", and
+	the 1-based number of the restart that met the tolerance is observed as
+	kmeans "winner" (kmeans "missed" when none did and the closest one is used).
 	"""
-	poly = Polygon(polygon_coords).buffer(0)
+	prepared = _as_prepared(polygon_coords)
+	poly = prepared.poly
 	if poly.is_empty:
 		return []
 	if n_clusters <= 1:
 		return [poly]
 
-	rng = np.random.default_rng()
-	points = _sample_points_in_polygon(poly, n_points, rng)
+	# Child 0 is the sampling stream (see PreparedPolygon.kmeans_samples)
+	_, *restart_seqs = np.random.SeedSequence(seed).spawn(1 + int(restarts))
+	points = prepared.kmeans_samples(n_points, seed, sampling)
+	target = poly.area / float(n_clusters) if poly.area > 0 else None
+
+	if restart_workers and int(restart_workers) > 1 and len(restart_seqs) > 1:
+		results = _parallel_kmeans_restarts(
+			poly, points, n_clusters, restart_seqs, target, area_tolerance, restart_workers
+		)
+	else:
+		results = []
+		for restart_seq in restart_seqs:
+			results.append(_kmeans_restart(poly, points, n_clusters, restart_seq, target))
+			dev = results[-1][1]["deviation"]
+			if dev is not None and dev <= area_tolerance:
+				break
 
+	evaluated = [report for _, report in results if report["status"] != "cancelled"]
+	observe("kmeans", "restarts", len(evaluated))
+	for report in evaluated:
+		observe_seconds("kmeans_restart", report["seconds"])
 	best_polys = None
 	best_dev = float("inf")
-	target = poly.area / float(n_clusters) if poly.area > 0 else None
-
-	for _ in range(restarts):
-		centroids = _balanced_kmeans(points, n_clusters, n_iter=8, rng=rng)
-		polys = _voronoi_split_from_centroids(poly, centroids, keep_largest_piece=True)
-		# Ensure we got the requested number of pieces
-		if len(polys) != n_clusters:
+	for i, (polys, report) in enumerate(results):
+		if polys is None:
 			continue
-		if target is None or target <= 0:
+		if report["deviation"] <= area_tolerance:
+			observe("kmeans", "winner", i + 1)
 			return polys
-		dev = max(abs(p.area - target) / target for p in polys)
-		if dev < best_dev:
-			best_dev = dev
+		if report["deviation"] < best_dev:
+			best_dev = report["deviation"]
 			best_polys = polys
-		if dev <= area_tolerance:
-			return polys
 
+	observe("kmeans", "missed", 1)
 	return best_polys if best_polys is not None else []
 
 
@@ -279,6 +822,9 @@ def kmeans_split_polygon(
 	n_points=1000,
 	ensure_equal_area=True,
 	area_tolerance=0.05,
+	sampling="random",
+	seed=None,
+	restart_workers=1,
 ):
 	"""
 	Split a polygon into n_clusters smaller polygons using k-means clustering.
@@ -286,27 +832,39 @@ def kmeans_split_polygon(
 		polygon_coords: List of (x, y) tuples representing the polygon.
 		n_clusters: Number of clusters (sub-polygons) to create.
 		n_points: Number of random points to sample inside the polygon for clustering.
+		sampling: "random" (uniform), "sobol" or "halton" point sampling.
+		seed: Seed for point sampling, k-means initialisation and restarts; the same
+			seed always reproduces the same split.
+		restart_workers: Threads used to evaluate equal-area restarts concurrently.
 	Returns:
 		List of shapely Polygon objects representing the split polygons.
 	"""
-	poly = Polygon(polygon_coords).buffer(0)
+	prepared = _as_prepared(polygon_coords)
+	poly = prepared.poly
 	if ensure_equal_area:
 		parts = equal_area_kmeans_split_polygon(
-			polygon_coords,
+			prepared,
 			int(n_clusters),
 			n_points=max(int(n_points), 2000),
 			area_tolerance=area_tolerance,
 			restarts=6,
+			sampling=sampling,
+			seed=seed,
+			restart_workers=restart_workers,
 		)
 		if parts and len(parts) == int(n_clusters):
 			return parts
 		# If we couldn't reach tolerance, fall back to classic kmeans/voronoi.
 
-	points = _sample_points_in_polygon(poly, n_points, np.random.default_rng())
+	rng = np.random.default_rng(seed)
+	points = _sample_points_in_polygon(poly, n_points, rng, method=sampling)
 
 	# K-means clustering
-	kmeans = KMeans(n_clusters=n_clusters, n_init=10)
-	labels = kmeans.fit_predict(points)
+	from sklearn.cluster import KMeans
+
+	kmeans = KMeans(n_clusters=n_clusters, n_init=10, random_state=_random_state(rng))
+	with stage("kmeans_fit"):
+		kmeans.fit(points)
 	centroids = kmeans.cluster_centers_
 
 	# Create Voronoi diagram from centroids
@@ -356,17 +914,128 @@ def _find_axis_cut_for_target_area(geom, axis, target_area, max_iter=60):
 	return best if best is not None else (lo + hi) / 2.0
 
 
-def _axis_equal_area_split(polygon_coords, n_parts, axis):
+@timed("axis_profile")
+def _axis_area_profile(poly, axis):
+	"""Cumulative area of poly along axis as a piecewise-quadratic function.
+
+	The cross-section length of a polygon is linear between consecutive vertex
+	coordinates, so the area on the low side of a cut is quadratic there. Returns
+	(xs, areas, c0, c1): breakpoints xs (relative to the low bound), the cumulative
+	area at each breakpoint, and per-interval coefficients with length(x) = c0 + c1 * x.
+	"""
+	minx, miny, _, _ = poly.bounds
+	segs = []
+	for piece in getattr(poly, "geoms", [poly]):
+		piece = orient(piece, sign=1.0)
+		for ring in [piece.exterior, *piece.interiors]:
+			xy = np.asarray(ring.coords)[:, :2] - (minx, miny)
+			if axis == "y":
+				xy = xy[:, ::-1]
+			segs.append(np.hstack([xy[:-1], xy[1:]]))
+	seg = np.vstack(segs)
+	x0, y0, x1, y1 = seg.T
+	dx = x1 - x0
+	# Edges all but parallel to the cut (e.g. from clipping noise) add no area but
+	# would make a near-zero interval with a huge slope and wreck the quadratic
+	keep = np.abs(dx) > 1e-12 * max(np.ptp(x0), np.ptp(x1), 1e-300)
+	x0, y0, x1, y1, dx = x0[keep], y0[keep], x1[keep], y1[keep], dx[keep]
+
+	# Edges running towards -x bound the top of a CCW ring; swapping axes mirrors it
+	w = -np.sign(dx) if axis == "x" else np.sign(dx)
+	m = (y1 - y0) / dx
+	e0 = w * (y0 - m * x0)
+	e1 = w * m
+
+	xs = np.unique(np.concatenate([x0, x1]))
+	start = np.searchsorted(xs, np.minimum(x0, x1))
+	stop = np.searchsorted(xs, np.maximum(x0, x1))
+	d0 = np.zeros(xs.shape[0])
+	d1 = np.zeros(xs.shape[0])
+	np.add.at(d0, start, e0)
+	np.add.at(d0, stop, -e0)
+	np.add.at(d1, start, e1)
+	np.add.at(d1, stop, -e1)
+	c0 = np.cumsum(d0)[:-1]
+	c1 = np.cumsum(d1)[:-1]
+
+	strip = c0 * np.diff(xs) + 0.5 * c1 * np.diff(xs ** 2)
+	areas = np.concatenate([[0.0], np.cumsum(strip)])
+	return xs, areas, c0, c1
+
+
+def _axis_cuts_sweep(poly, n_parts, axis, profile=None):
+	"""All n_parts - 1 equal-area cut positions along axis, from one area profile."""
+	cuts, _ = _axis_cuts_at(poly, np.arange(1, int(n_parts)) / float(n_parts), axis, profile)
+	return cuts
+
+
+def _axis_cuts_at(poly, fractions, axis, profile=None):
+	"""(cuts, lengths): positions leaving each area fraction below the cut, and the
+	cross-section length of poly along each cut. profile is _axis_area_profile(poly,
+	axis), if already known."""
+	xs, areas, c0, c1 = profile if profile is not None else _axis_area_profile(poly, axis)
+	targets = areas[-1] * np.asarray(fractions, dtype=float)
+	j = np.clip(np.searchsorted(areas, targets, side="right") - 1, 0, xs.shape[0] - 2)
+	rem = targets - areas[j]
+	length = c0[j] + c1[j] * xs[j]
+	# Stable root of 0.5 * c1 * u**2 + length * u - rem = 0
+	denom = length + np.sqrt(np.maximum(length ** 2 + 2.0 * c1[j] * rem, 0.0))
+	u = np.divide(2.0 * rem, denom, out=np.zeros_like(rem), where=denom > 0)
+	u = np.clip(u, 0.0, xs[j + 1] - xs[j])
+	minx, miny, _, _ = poly.bounds
+	return xs[j] + u + (minx if axis == "x" else miny), length + c1[j] * u
+
+
+def _axis_split_sweep(poly, n_parts, axis, profile=None):
+	"""Clip each strip between consecutive sweep-line cuts exactly once."""
+	minx, miny, maxx, maxy = poly.bounds
+	span = max(maxx - minx, maxy - miny)
+	pad = span * 0.01 + 1e-9
+	lo = minx - pad if axis == "x" else miny - pad
+	hi = maxx + pad if axis == "x" else maxy + pad
+	edges = [lo, *_axis_cuts_sweep(poly, n_parts, axis, profile), hi]
+
+	parts = []
+	fragments = []
+	with stage("axis_clip"):
+		for a, b in zip(edges[:-1], edges[1:]):
+			if axis == "x":
+				strip = box(a, miny - pad, b, maxy + pad)
+			else:
+				strip = box(minx - pad, a, maxx + pad, b)
+			piece, extras = _largest_and_fragments(poly.intersection(strip).buffer(0))
+			if piece is not None:
+				parts.append(piece)
+				fragments.extend(extras)
+	# Preserve total area: fold the strips' smaller fragments into neighbouring parts
+	return _merge_fragments(parts, fragments)
+
+
+def _axis_equal_area_split(polygon_coords, n_parts, axis, engine="sweep"):
 	"""Split polygon into n_parts using axis-aligned cuts (vertical or horizontal).
 
 	This intentionally produces straight cut lines. It targets equal area per piece.
+	engine="sweep" places every cut from a single area profile and clips each strip
+	once; engine="bisection" peels strips off one at a time with a binary search per
+	cut and is kept as a reference.
 	"""
-	poly = Polygon(polygon_coords).buffer(0)
+	prepared = _as_prepared(polygon_coords)
+	poly = prepared.poly
 	if poly.is_empty:
 		return []
 	if n_parts <= 1:
 		return [poly]
 
+	if engine == "sweep":
+		return _axis_split_sweep(poly, n_parts, axis, prepared.axis_profile(axis))[: int(n_parts)]
+	if engine != "bisection":
+		raise ValueError(f"Unknown axis split engine: {engine!r}")
+	with stage("axis_bisection"):
+		return _axis_split_bisection(poly, n_parts, axis)
+
+
+def _axis_split_bisection(poly, n_parts, axis):
+	"""Peel strips off poly one at a time, each cut found by binary search."""
 	remaining = poly
 	parts = []
 
@@ -405,20 +1074,289 @@ def _axis_equal_area_split(polygon_coords, n_parts, axis):
 		parts.append(low_poly)
 		remaining = high_geom
 
-	final_poly = _largest_polygon(remaining)
-	if final_poly is not None and not final_poly.is_empty:
+	final_poly, extras = _largest_and_fragments(remaining)
+	if final_poly is not None:
 		parts.append(final_poly)
 
 	# Best effort to return exactly n_parts
-	return parts[: int(n_parts)]
+	return _merge_fragments(parts, extras)[: int(n_parts)]
 
 
-def vertical_split_polygon(polygon_coords, n_parts):
+def vertical_split_polygon(polygon_coords, n_parts, engine="sweep"):
 	"""Vertical split (cuts along longitude/x)."""
-	return _axis_equal_area_split(polygon_coords, n_parts, axis="x")
+	return _axis_equal_area_split(polygon_coords, n_parts, axis="x", engine=engine)
 
 
-def horizontal_split_polygon(polygon_coords, n_parts):
+def horizontal_split_polygon(polygon_coords, n_parts, engine="sweep"):
 	"""Horizontal split (cuts along latitude/y)."""
-	return _axis_equal_area_split(polygon_coords, n_parts, axis="y")
+	return _axis_equal_area_split(polygon_coords, n_parts, axis="y", engine=engine)
+
+
+@timed("rotated_profiles")
+def _rotated_profiles(geom, n_directions):
+	"""(origin, [(theta, geom rotated by -theta, its x area profile), ...]) over [0, pi)."""
+	origin = geom.centroid
+	rotations = []
+	for k in range(int(n_directions)):
+		theta = np.pi * k / float(n_directions)
+		rotated = affinity.rotate(geom, -theta, origin=origin, use_radians=True)
+		rotations.append((theta, rotated, _axis_area_profile(rotated, "x")))
+	return origin, rotations
+
+
+@timed("bisect")
+def _bisect_polygon(geom, fraction, n_directions=8, rotations=None):
+	"""Cut geom in two straight pieces holding fraction and 1 - fraction of its area.
 
+	Tries n_directions cut angles over [0, pi) and prefers the shortest cut (the
+	most compact pieces) among those leaving both pieces in one part. rotations
+	is _rotated_profiles(geom, n_directions), if already known.
+	"""
+	origin, rotations = rotations if rotations is not None else _rotated_profiles(geom, n_directions)
+	candidates = []
+	for theta, rotated, profile in rotations:
+		cuts, lengths = _axis_cuts_at(rotated, [fraction], "x", profile)
+		candidates.append((float(lengths[0]), theta, float(cuts[0]), rotated))
+	candidates.sort(key=lambda c: c[0])
+
+	best = None
+	tried = 0
+	for length, theta, cut, rotated in candidates:
+		tried += 1
+		minx, miny, maxx, maxy = rotated.bounds
+		pad = max(maxx - minx, maxy - miny) * 0.01 + 1e-9
+		low = rotated.intersection(box(minx - pad, miny - pad, cut, maxy + pad))
+		high = rotated.intersection(box(cut, miny - pad, maxx + pad, maxy + pad))
+		pieces = (low, high)
+		if best is None:
+			best = (theta, pieces)
+		if all(p.geom_type == "Polygon" for p in pieces):
+			best = (theta, pieces)
+			break
+	theta, pieces = best
+	observe("bisect", "candidates", tried)
+	return tuple(affinity.rotate(p, theta, origin=origin, use_radians=True) for p in pieces)
+
+
+def recursive_split_polygon(polygon_coords, n_parts, n_directions=8, workers=1):
+	"""Split a polygon by recursive bisection into n_parts (near) equal-area parts.
+
+	Each step cuts a piece in two with areas in proportion to the part counts on
+	either side (see _bisect_polygon), so the tree is O(log n_parts) deep. Each
+	level's bisections are independent and run on up to workers threads.
+	"""
+	prepared = _as_prepared(polygon_coords)
+	poly = prepared.poly
+	if poly.is_empty:
+		return []
+	n_parts = int(n_parts)
+	if n_parts <= 1:
+		return [poly]
+
+	def expand(item):
+		geom, n = item
+		if n <= 1:
+			return [item]
+		n_low = n // 2
+		# The root's rotated profiles are the costliest and do not depend on n_parts
+		rotations = prepared.rotated_profiles(n_directions) if geom is poly else None
+		low, high = _bisect_polygon(geom, n_low / float(n), n_directions, rotations)
+		return [(low, n_low), (high, n - n_low)]
+
+	frontier = [(poly, n_parts)]
+	pool = ThreadPoolExecutor(max_workers=int(workers), thread_name_prefix="bisect") if workers > 1 else None
+	try:
+		while any(n > 1 for _, n in frontier):
+			level = pool.map(propagate(expand), frontier) if pool is not None else map(expand, frontier)
+			frontier = [item for pair in level for item in pair]
+	finally:
+		if pool is not None:
+			pool.shutdown()
+
+	parts = []
+	fragments = []
+	for geom, _ in frontier:
+		piece, extras = _largest_and_fragments(geom.buffer(0))
+		if piece is not None:
+			parts.append(piece)
+			fragments.extend(extras)
+	return _merge_fragments(parts, fragments)
+
+
+SPLIT_MODES = ("kmeans", "vertical", "horizontal", "radial", "recursive")
+
+
+def _valid_coverage(parts, grid):
+	"""parts as a valid coverage (matching shared edges, no overlaps or slivers), or None.
+
+	Split engines clip each part separately, so neighbours can disagree by a vertex
+	or a sliver even after snapping. Those are repaired with GEOS coverage cleaning
+	where available (shapely 2.2 with GEOS 3.14); None means it could not be.
+	"""
+	if shapely.coverage_is_valid(parts, gap_width=grid):
+		return parts
+	try:
+		cleaned = shapely.coverage_clean(parts, gap_width=grid)
+	except (AttributeError, shapely.errors.UnsupportedGEOSVersionError):
+		return None
+	if len(cleaned) != len(parts) or not shapely.coverage_is_valid(cleaned, gap_width=grid):
+		return None
+	return cleaned
+
+
+def simplify_parts(parts, tolerance):
+	"""Simplify split parts together so boundaries shared by neighbours stay shared.
+
+	Vertices are snapped to a grid far finer than tolerance, so both sides of a
+	shared edge match exactly, then GEOS coverage simplification drops vertices
+	within tolerance (in the parts' units) without opening gaps or overlaps.
+	Coverage simplification needs a valid coverage, so the snapped parts are
+	checked and repaired first (see _valid_coverage); if that fails they are
+	returned snapped but unsimplified rather than with gaps or overlaps.
+	"""
+	if not tolerance or tolerance <= 0 or len(parts) == 0:
+		return list(parts)
+	parts = np.asarray(parts, dtype=object)
+	observe("simplify", "vertices", shapely.get_num_coordinates(parts).sum())
+	with stage("simplify"):
+		grid = tolerance * 1e-3
+		snapped = shapely.set_precision(parts, grid)
+		coverage = _valid_coverage(snapped, grid)
+		if coverage is None:
+			observe("simplify", "skipped", 1)
+			return [p for p in snapped if not p.is_empty]
+		simplified = shapely.coverage_simplify(coverage, tolerance)
+	return [p for p in simplified if not p.is_empty]
+
+
+def _piece_order(pieces):
+	"""Indices of pieces as a nearest-neighbour chain from the westernmost one."""
+	centroids = np.array([[c.x, c.y] for c in (p.poly.centroid for p in pieces)])
+	order = [int(np.argmin(centroids[:, 0]))]
+	left = set(range(len(pieces))) - set(order)
+	while left:
+		last = pieces[order[-1]].poly
+		nearest = min(left, key=lambda i: (last.distance(pieces[i].poly), i))
+		order.append(nearest)
+		left.remove(nearest)
+	return order
+
+
+def _peel(geom, area, toward):
+	"""(chunk, rest): a straight cut across geom leaving area on the side facing toward."""
+	origin = geom.centroid
+	# Rotate so toward lies in the -x direction, then cut at the area's x
+	theta = np.pi - np.arctan2(toward.y - origin.y, toward.x - origin.x)
+	rotated = affinity.rotate(geom, theta, origin=origin, use_radians=True)
+	cuts, _ = _axis_cuts_at(rotated, [min(area / rotated.area, 1.0)], "x")
+	minx, miny, maxx, maxy = rotated.bounds
+	pad = max(maxx - minx, maxy - miny) * 0.01 + 1e-9
+	cut = float(cuts[0])
+	chunk = rotated.intersection(box(minx - pad, miny - pad, cut, maxy + pad))
+	rest = rotated.intersection(box(cut, miny - pad, maxx + pad, maxy + pad))
+	return tuple(affinity.rotate(g, -theta, origin=origin, use_radians=True).buffer(0) for g in (chunk, rest))
+
+
+def _split_pieces(pieces, mode, n_parts, args):
+	"""Split the pieces of a net area into n_parts parts of net_area / n_parts each.
+
+	Pieces are laid end to end (see _piece_order) and the running area total is
+	cut at every multiple of the target. Parts wholly inside a piece are split
+	from it by mode. A piece's share of a part that continues into the next piece
+	is peeled off with a straight cut facing that piece and joined with the
+	neighbour's share into one MultiPolygon part, so no net area is left out.
+	"""
+	areas = [p.poly.area for p in pieces]
+	target = sum(areas) / float(n_parts)
+	eps = target * 1e-9
+	chunks = [[] for _ in range(n_parts)]
+	order = _piece_order(pieces)
+	start = 0.0
+	for pos, i in enumerate(order):
+		piece, end = pieces[i], start + areas[i]
+		first = min(int((start + eps) // target), n_parts - 1)
+		last = min(max(int(np.ceil((end - eps) / target)) - 1, first), n_parts - 1)
+		head = (first + 1) * target - start if start - first * target > eps else 0.0
+		tail = end - last * target if last > first and end - (last + 1) * target < -eps else 0.0
+		rest = piece.poly
+		if first == last:
+			chunks[first].append(rest)
+			start = end
+			continue
+		if head > 0:
+			chunk, rest = _peel(rest, head, pieces[order[pos - 1]].poly.centroid)
+			chunks[first].append(chunk)
+		if tail > 0:
+			chunk, rest = _peel(rest, tail, pieces[order[pos + 1]].poly.centroid)
+			chunks[last].append(chunk)
+		whole = range(first + (head > 0), last + 1 - (tail > 0))
+		if len(whole):
+			# A straight cut can leave the rest in pieces; they border the peeled chunks
+			middle, extras = _largest_and_fragments(rest)
+			if extras:
+				chunks[first if head > 0 else last].extend(extras)
+			source = piece if head == 0 and tail == 0 else middle
+			for j, part in zip(whole, _split_one(source, mode, len(whole), *args)):
+				chunks[j].append(part)
+		start = end
+
+	parts = []
+	for group in chunks:
+		group = [g for g in group if not g.is_empty]
+		if group:
+			parts.append(group[0] if len(group) == 1 else unary_union(group))
+	return parts
+
+
+def _split_one(polygon_coords, mode, n_parts, sampling, area_tolerance, seed, restart_workers, recursive_workers):
+	if mode == "vertical":
+		return vertical_split_polygon(polygon_coords, n_parts=n_parts)
+	if mode == "horizontal":
+		return horizontal_split_polygon(polygon_coords, n_parts=n_parts)
+	if mode == "radial":
+		return radial_split_polygon(polygon_coords, n_parts=n_parts, area_tolerance=area_tolerance)
+	if mode == "recursive":
+		return recursive_split_polygon(polygon_coords, n_parts=n_parts, workers=recursive_workers)
+	return kmeans_split_polygon(
+		polygon_coords,
+		n_clusters=n_parts,
+		area_tolerance=area_tolerance,
+		sampling=sampling,
+		seed=seed,
+		restart_workers=restart_workers,
+	)
+
+
+def split_polygon_by_mode(
+	polygon_coords,
+	mode,
+	n_parts,
+	sampling="random",
+	area_tolerance=0.05,
+	seed=None,
+	restart_workers=1,
+	simplify_tolerance=0.0,
+	recursive_workers=1,
+):
+	"""Dispatch to the splitter for mode; unknown modes fall back to k-means.
+
+	polygon_coords may also be a Shapely (Multi)Polygon or a PreparedPolygon. A MultiPolygon (e.g. a
+	block cut in two by an exclusion) is split piece by piece against a target of
+	its total area / n_parts (see _split_pieces); a part that spans a gap between
+	pieces is returned as a MultiPolygon. A positive simplify_tolerance (in the
+	polygon's units) runs simplify_parts on the result.
+	"""
+	n_parts = int(n_parts)
+	args = (sampling, area_tolerance, seed, restart_workers, recursive_workers)
+	prepared = _as_prepared(polygon_coords)
+	pieces = prepared.pieces()
+	# Unknown modes are labelled as the k-means they fall back to
+	name = "split_" + (mode if mode in SPLIT_MODES else "kmeans")
+	observe(name, "vertices", shapely.get_num_coordinates(prepared.poly))
+	observe(name, "parts", n_parts)
+	with stage(name):
+		if len(pieces) > 1:
+			parts = _split_pieces(pieces, mode, n_parts, args)
+		else:
+			parts = _split_one(prepared, mode, n_parts, *args)
+	return simplify_parts(parts, simplify_tolerance)
@@ -1,19 +1,148 @@
+import time
+
+# Taken before anything else is imported, for the startup report
+_STARTED = time.perf_counter()
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sys
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
 from fastapi import FastAPI, Response, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
-from map_functionality import initialize_map
-from geom_manipulation import (
-    kmeans_split_polygon,
-    vertical_split_polygon,
-    horizontal_split_polygon,
-    radial_split_polygon,
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from split_workers import (
+    SplitPoolSaturated,
+    get_handle_executor,
+    get_split_executor,
+    prepare_block,
+    shutdown_pools,
+    split_block,
+    split_to_latlng,
+)
+from split_handles import get_handle_store
+from split_cache import get_split_cache, split_cache_key
+from split_formats import (
+    SUMMARY_FIELDS,
+    encode,
+    from_cacheable,
+    holes_json,
+    negotiate,
+    polygons_json,
+    to_cacheable,
+)
+from constraint_layers import get_constraint_store, parse_geojson
+from perf_metrics import (
+    REQUEST_SECONDS,
+    gauge,
+    list_profiles,
+    profile_interval,
+    profile_name,
+    profile_path,
+    profile_threshold,
+    render,
+    server_timing_forced,
+    stage,
+    start_recording,
+    stop_recording,
+    write_profile,
 )
 import uvicorn
 
 # Import PDF overlay FastAPI app and mount its routes
 from pdf_map_overlay import app as pdf_app
+from pdf_jobs import shutdown_job_queue
+from pdf_store import max_upload_bytes
+
+SAMPLING_METHODS = ("random", "sobol", "halton")
+# Well under the 1000-2000 interior samples k-means clusters
+MAX_N_CLUSTERS = 500
+SPLIT_OPTION_KEYS = (
+    "mode", "n_clusters", "sampling", "area_tolerance", "seed", "simplify_tolerance",
+    "constraints",
+)
+PDF_UPLOAD_PATHS = ("/upload-pdf-map", "/pdf-jobs", "/inspect-pdf-map")
+# Room for multipart boundaries and form fields around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+DEFAULT_MAP_LOCATION = (50.9981, -118.1957)
+DEFAULT_MAP_ZOOM = 13
+# Imported on first use; the startup report shows which are loaded
+LAZY_MODULES = ("sklearn", "scipy", "fitz", "pdf2image", "PIL", "osgeo", "folium")
+WARMUP_STEPS = ("split", "pdf", "map")
+
+logger = logging.getLogger(__name__)
+
+STARTUP = {
+    "import_ms": round((time.perf_counter() - _STARTED) * 1000, 1),
+    "ready_ms": None,
+    "warmup": {},
+}
+
+
+@lru_cache(maxsize=32)
+def _map_html(lat, lng, zoom):
+    """Rendered Folium page for a map view, built once per location and zoom."""
+    from map_functionality import initialize_map
+
+    return initialize_map(location=[lat, lng], zoom_start=zoom)._repr_html_()
+
+
+def _warm_up_pdf():
+    import fitz  # noqa: F401
+    import pdf2image  # noqa: F401
+
+    try:
+        from osgeo import gdal  # noqa: F401
+    except ImportError:
+        pass
+
+
+async def _warm_up(steps):
+    """Load lazy dependencies ahead of the first request, timing each step."""
+    actions = {
+        "split": lambda: get_split_executor().warm_up(),
+        "pdf": lambda: asyncio.to_thread(_warm_up_pdf),
+        "map": lambda: asyncio.to_thread(_map_html, *DEFAULT_MAP_LOCATION, DEFAULT_MAP_ZOOM),
+    }
+    for step in steps:
+        t = time.perf_counter()
+        try:
+            await actions[step]()
+            STARTUP["warmup"][step] = round((time.perf_counter() - t) * 1000, 1)
+        except Exception as e:
+            STARTUP["warmup"][step] = f"failed: {e}"
+
+
+def _warmup_steps():
+    """Steps named in CUTBLOCK_WARMUP (comma-separated, or "all"); none by default."""
+    names = [s.strip().lower() for s in os.environ.get("CUTBLOCK_WARMUP", "").split(",")]
+    if "all" in names or "1" in names:
+        return list(WARMUP_STEPS)
+    return [s for s in WARMUP_STEPS if s in names]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    STARTUP["ready_ms"] = round((time.perf_counter() - _STARTED) * 1000, 1)
+    logger.info(
+        "Startup: imports %.0f ms, ready %.0f ms", STARTUP["import_ms"], STARTUP["ready_ms"]
+    )
+    steps = _warmup_steps()
+    # In the background, so the worker starts accepting requests right away
+    warm_up = asyncio.ensure_future(_warm_up(steps)) if steps else None
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+    shutdown_pools()
+    shutdown_job_queue()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # Serve static files (index.html)
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -22,41 +151,451 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 for route in pdf_app.routes:
     app.router.routes.append(route)
 
+
+@app.middleware("http")
+async def limit_pdf_upload_size(request: Request, call_next):
+    """Reject oversized PDF uploads from Content-Length, before the body is spooled.
+
+    Uploads without a Content-Length are still capped while they are stored.
+    """
+    limit = max_upload_bytes()
+    length = request.headers.get("content-length", "")
+    if (
+        limit
+        and request.method == "POST"
+        and request.url.path in PDF_UPLOAD_PATHS
+        and length.isdigit()
+        and int(length) > limit + MULTIPART_OVERHEAD
+    ):
+        return JSONResponse(
+            {"error": f"Upload is larger than {limit / (1024 * 1024):g} MB"}, status_code=413
+        )
+    return await call_next(request)
+
+
+async def _after_body(body, on_done):
+    """body_iterator that calls on_done once the response body has been sent (or dropped)."""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        on_done()
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request into perf_metrics; on request, report its stages and profile it.
+
+    "X-Server-Timing: 1" (or CUTBLOCK_SERVER_TIMING=1) adds a Server-Timing header
+    with the stages run so far. "X-Profile: 1" (or a threshold in ms) samples the
+    stacks of the threads that work on the request and, if it takes at least
+    CUTBLOCK_PROFILE_SLOW_MS (or the given threshold), dumps them once the body has
+    been sent. The dump is named in an X-Profile-Dump header when the request is
+    already slow by the time the headers go out; see /profiles.
+    """
+    started = time.perf_counter()
+    timing = server_timing_forced() or request.headers.get("x-server-timing") == "1"
+    slow = profile_threshold(request.headers.get("x-profile"))
+    recording = token = None
+    if timing or slow is not None:
+        recording, token = start_recording(profile_interval() if slow is not None else None)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        if recording is not None:
+            recording.finish()
+        raise
+    finally:
+        if token is not None:
+            stop_recording(token)
+
+    elapsed = time.perf_counter() - started
+    if timing:
+        response.headers["Server-Timing"] = recording.server_timing(elapsed)
+    dump = None
+    if slow is not None and elapsed >= slow:
+        dump = profile_name(f"{request.method}{request.url.path}")
+        response.headers["X-Profile-Dump"] = dump
+
+    def done():
+        elapsed = time.perf_counter() - started
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_SECONDS.observe((request.method, route, str(response.status_code)), elapsed)
+        if recording is None:
+            return
+        stacks = recording.finish()
+        if slow is not None and elapsed >= slow and stacks:
+            name = dump or profile_name(f"{request.method}{request.url.path}")
+            write_profile(stacks, name)
+            logger.info(
+                "Profile of %s %s (%.0f ms): %s",
+                request.method, request.url.path, elapsed * 1000, name,
+            )
+
+    response.body_iterator = _after_body(response.body_iterator, done)
+    return response
+
+
 @app.get("/")
 def root():
     return FileResponse("static/index.html")
 
 @app.get("/map", response_class=Response)
-def show_map():
-    my_map = initialize_map(location=[50.9981, -118.1957], zoom_start=13)
-    return Response(content=my_map._repr_html_(), media_type="text/html")
+def show_map(
+    lat: float = DEFAULT_MAP_LOCATION[0],
+    lng: float = DEFAULT_MAP_LOCATION[1],
+    zoom: int = DEFAULT_MAP_ZOOM,
+):
+    html = _map_html(round(lat, 5), round(lng, 5), min(max(zoom, 0), 22))
+    return Response(content=html, media_type="text/html")
+
+
+@app.get("/startup")
+def startup_report():
+    """Cold-start timings (ms since main was first imported), warm-up step
+    timings and which lazily imported dependencies are loaded."""
+    return {
+        **STARTUP,
+        "loaded_modules": {name: name in sys.modules for name in LAZY_MODULES},
+    }
+
+
+def _parse_split_options(data):
+    """Validate split options from a request body or feature properties.
+
+    Returns (mode, n_clusters, options) where options holds the keyword
+    arguments for split_polygon_by_mode.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    mode = (data.get("mode") or "kmeans").lower()
+    sampling = (data.get("sampling") or "random").lower()
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError("Invalid sampling method")
+    try:
+        n_clusters = int(data.get("n_clusters", 2))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid n_clusters")
+    if not 1 <= n_clusters <= MAX_N_CLUSTERS:
+        raise ValueError(f"Invalid n_clusters; expected 1 to {MAX_N_CLUSTERS}")
+    try:
+        area_tolerance = float(data.get("area_tolerance", 0.05))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid area_tolerance")
+    # Also rejects NaN, which every comparison fails
+    if not 0.0 < area_tolerance < 1.0:
+        raise ValueError("Invalid area_tolerance; expected a fraction between 0 and 1")
+    try:
+        # Metres, since splits run in a local UTM projection
+        simplify_tolerance = float(data.get("simplify_tolerance") or 0.0)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid simplify_tolerance")
+    if not 0.0 <= simplify_tolerance < float("inf"):
+        raise ValueError("Invalid simplify_tolerance")
+    seed = data.get("seed")
+    # None is left for _run_split, so unseeded k-means splits skip the cache
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        raise ValueError("Invalid seed; expected a non-negative integer")
+    constraints = data.get("constraints") or None
+    if constraints is not None and (
+        not isinstance(constraints, str) or not get_constraint_store().exists(constraints)
+    ):
+        raise ValueError("Unknown constraint layer")
+    options = {
+        "sampling": sampling,
+        "area_tolerance": area_tolerance,
+        "seed": seed,
+        "simplify_tolerance": simplify_tolerance,
+        "constraints": constraints,
+    }
+    return mode, n_clusters, options
+
+
+def _parse_ring(coords):
+    try:
+        if not coords or len(coords) < 3:
+            raise ValueError
+        # Convert to (x, y) tuples
+        return [(float(c[0]), float(c[1])) for c in coords]
+    except (IndexError, KeyError, TypeError, ValueError):
+        raise ValueError("Invalid coordinates")
+
+
+async def _run_split(executor, poly_coords, mode, n_clusters, options, block=None):
+    """Split in the worker pool, going through the split result cache.
+
+    block, a prepare_block result for poly_coords, skips re-preparing the ring.
+    Without a seed in options, one is drawn and stored in options["seed"] (so the
+    response can report it); such k-means splits are never looked up or cached,
+    since their fresh seed would make a key no later request repeats.
+    """
+    cache = get_split_cache()
+    key = split_cache_key(poly_coords, mode, n_clusters, **options)
+    if options["seed"] is None:
+        options["seed"] = secrets.randbits(32)
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return from_cacheable(cached)
+    if block is not None:
+        result = await executor.run(split_block, block, mode, n_clusters, options)
+    else:
+        result = await executor.run(split_to_latlng, poly_coords, mode, n_clusters, options)
+    if key is not None:
+        cache.put(key, to_cacheable(result))
+    return result
+
+
+async def _split_response(request, poly_coords, mode, n_clusters, options, block=None):
+    """Run a split and encode it for the request's Accept header.
+
+    Splits of a prepared block run where the block lives (see get_handle_executor).
+    """
+    media_type = negotiate(request.headers.get("accept"))
+    executor = get_handle_executor() if block is not None else get_split_executor()
+    try:
+        result = await _run_split(executor, poly_coords, mode, n_clusters, options, block)
+    except SplitPoolSaturated:
+        return JSONResponse(
+            {"error": "Server busy, retry shortly"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    except asyncio.TimeoutError:
+        return JSONResponse({"error": "Split timed out"}, status_code=504)
+    with stage("encode"):
+        body, media_type, headers = encode(result, media_type, options["seed"])
+    if isinstance(body, dict):
+        return JSONResponse(body, media_type=media_type, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
 
 # API endpoint for splitting polygon
 @app.post("/split-polygon")
 async def split_polygon(request: Request):
+    """Split one ring; the Accept header picks the encoding (see split_formats)."""
     data = await request.json()
-    coords = data.get("coords")
-    n_clusters = data.get("n_clusters", 2)
-    mode = (data.get("mode") or "kmeans").lower()
-    if not coords or len(coords) < 3:
-        return JSONResponse({"error": "Invalid coordinates"}, status_code=400)
-    # Convert to (x, y) tuples
-    poly_coords = [(float(x), float(y)) for x, y in coords]
-
-    if mode == "vertical":
-        polys = vertical_split_polygon(poly_coords, n_parts=int(n_clusters))
-    elif mode == "horizontal":
-        polys = horizontal_split_polygon(poly_coords, n_parts=int(n_clusters))
-    elif mode == "radial":
-        polys = radial_split_polygon(poly_coords, n_parts=int(n_clusters), area_tolerance=0.05)
-    else:
-        polys = kmeans_split_polygon(poly_coords, n_clusters=n_clusters)
-    # Return as list of lists of [lat, lng]
-    result = []
-    for poly in polys:
-        # folium/leaflet expects [lat, lng], shapely uses (x, y)
-        coords = [[y, x] for x, y in poly.exterior.coords]
-        result.append(coords)
-    return {"polygons": result}
+    try:
+        mode, n_clusters, options = _parse_split_options(data)
+        poly_coords = _parse_ring(data.get("coords"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return await _split_response(request, poly_coords, mode, n_clusters, options)
+
+
+@app.post("/prepared-polygons", status_code=201)
+async def create_prepared_polygon(request: Request):
+    """Prepare a ring once for repeated splits and return a short-lived handle.
+
+    Takes "coords" plus optional "sampling", "seed" and "constraints"; later
+    splits by handle default to the same seed, so their k-means samples are
+    reused too.
+    """
+    data = await request.json()
+    try:
+        _, _, options = _parse_split_options(data)
+        poly_coords = _parse_ring(data.get("coords"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if options["seed"] is None:
+        # Splits by handle default to this seed, so its samples can be reused
+        options["seed"] = secrets.randbits(32)
+    try:
+        block = await get_handle_executor().run(
+            prepare_block, poly_coords, options["constraints"], True,
+            options["seed"], options["sampling"],
+        )
+    except SplitPoolSaturated:
+        return JSONResponse(
+            {"error": "Server busy, retry shortly"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    except asyncio.TimeoutError:
+        return JSONResponse({"error": "Preparation timed out"}, status_code=504)
+    store = get_handle_store()
+    handle = store.put(
+        poly_coords, block, options["seed"], options["sampling"], options["constraints"]
+    )
+    body = {
+        "id": handle.id,
+        "seed": handle.seed,
+        "sampling": handle.sampling,
+        "expires_in": store.ttl,
+        "split_url": f"/prepared-polygons/{handle.id}/split",
+    }
+    body.update({k: block[k] for k in SUMMARY_FIELDS if k in block})
+    return JSONResponse(body, status_code=201)
+
+
+@app.post("/prepared-polygons/{handle_id}/split")
+async def split_prepared_polygon(handle_id: str, request: Request):
+    """Split a prepared ring; takes the /split-polygon options except "coords"."""
+    handle = get_handle_store().get(handle_id)
+    if handle is None:
+        return JSONResponse({"error": "Unknown or expired handle"}, status_code=404)
+    data = await request.json()
+    if not isinstance(data, dict):
+        return JSONResponse({"error": "Expected a JSON object"}, status_code=400)
+    try:
+        mode, n_clusters, options = _parse_split_options({
+            "seed": handle.seed,
+            "sampling": handle.sampling,
+            **data,
+            "constraints": handle.constraints,
+        })
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return await _split_response(
+        request, handle.ring, mode, n_clusters, options, handle.block
+    )
+
+
+@app.delete("/prepared-polygons/{handle_id}", status_code=204)
+def delete_prepared_polygon(handle_id: str):
+    if not get_handle_store().delete(handle_id):
+        return JSONResponse({"error": "Unknown or expired handle"}, status_code=404)
+    return Response(status_code=204)
+
+
+@app.post("/split-polygons/batch")
+async def split_polygons_batch(request: Request):
+    """Split every Polygon feature of a GeoJSON FeatureCollection in the split pool.
+
+    Each feature's properties may carry "mode", "n_clusters", "sampling",
+    "area_tolerance", "seed", "simplify_tolerance" and "constraints" (falling
+    back to the same keys on the collection). Results are streamed as NDJSON, one line per feature
+    in completion order; a failing feature yields an {"index", "id", "error"}
+    line instead of failing the batch. A batch keeps at most one split per worker
+    in flight so it cannot fill the shared queue.
+    """
+    data = await request.json()
+    features = data.get("features") if isinstance(data, dict) else None
+    if not isinstance(features, list) or data.get("type") != "FeatureCollection":
+        return JSONResponse({"error": "Expected a GeoJSON FeatureCollection"}, status_code=400)
+
+    defaults = {k: data[k] for k in SPLIT_OPTION_KEYS if k in data}
+    executor = get_split_executor()
+    slots = asyncio.Semaphore(executor.max_workers)
+
+    async def run_feature(index, feature):
+        feature_id = feature.get("id") if isinstance(feature, dict) else None
+        line = {"index": index, "id": feature_id}
+        try:
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") != "Polygon":
+                raise ValueError("Only Polygon geometries are supported")
+            poly_coords = _parse_ring((geometry.get("coordinates") or [None])[0])
+            mode, n_clusters, options = _parse_split_options(
+                {**defaults, **(feature.get("properties") or {})}
+            )
+            async with slots:
+                result = await _run_split(executor, poly_coords, mode, n_clusters, options)
+            line["polygons"] = polygons_json(result)
+            if "holes" in result:
+                line["holes"] = holes_json(result)
+            line["areas_ha"] = result["areas_ha"]
+            if "part_of" in result:
+                line["part_of"] = result["part_of"]
+            line["seed"] = options["seed"]
+            line.update({k: result[k] for k in SUMMARY_FIELDS if k in result})
+        except SplitPoolSaturated:
+            line["error"] = "Server busy, retry shortly"
+        except asyncio.TimeoutError:
+            line["error"] = "Split timed out"
+        except BrokenProcessPool:
+            line["error"] = "Worker process failed"
+        except Exception as e:
+            line["error"] = str(e) or type(e).__name__
+        return line
+
+    async def stream():
+        tasks = [asyncio.ensure_future(run_feature(i, f)) for i, f in enumerate(features)]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield json.dumps(await done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/constraint-layers", status_code=201)
+async def create_constraint_layer(request: Request):
+    """Store a GeoJSON exclusion layer and return its id for split requests.
+
+    Only Polygon and MultiPolygon features are kept; identical uploads get the
+    same id.
+    """
+    body = await request.body()
+    try:
+        geoms, skipped = await asyncio.to_thread(parse_geojson, body)
+        layer = await asyncio.to_thread(get_constraint_store().save, geoms)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse({**layer.summary(), "skipped_features": skipped}, status_code=201)
+
+
+@app.get("/constraint-layers/{layer_id}")
+def get_constraint_layer(layer_id: str):
+    layer = get_constraint_store().get(layer_id)
+    if layer is None:
+        return JSONResponse({"error": "Unknown constraint layer"}, status_code=404)
+    return layer.summary()
+
+
+@app.delete("/constraint-layers/{layer_id}", status_code=204)
+def delete_constraint_layer(layer_id: str):
+    if not get_constraint_store().delete(layer_id):
+        return JSONResponse({"error": "Unknown constraint layer"}, status_code=404)
+    return Response(status_code=204)
+
+
+@app.get("/split-cache/stats")
+def split_cache_stats():
+    return get_split_cache().stats()
+
+
+@app.get("/prepared-polygons/stats")
+def prepared_polygon_stats():
+    return get_handle_store().stats()
+
+
+@app.get("/metrics")
+def metrics():
+    """Stage and request histograms plus split pool and cache gauges, in the
+    Prometheus text format. Figures are per server process."""
+    executor = get_split_executor()
+    cache = get_split_cache().stats()
+    lines = [
+        *gauge("cutblock_split_in_flight", "Splits running or waiting for a worker.", executor.in_flight),
+        *gauge("cutblock_split_capacity", "Splits allowed in flight before 503s.", executor.capacity),
+        *gauge(
+            "cutblock_handle_split_in_flight", "Prepared-polygon splits running or waiting.",
+            get_handle_executor().in_flight,
+        ),
+        *gauge(
+            "cutblock_split_cache_hits_total", "Split cache hits (memory and disk).",
+            cache["hits"] + cache["disk_hits"], "counter",
+        ),
+        *gauge("cutblock_split_cache_misses_total", "Split cache misses.", cache["misses"], "counter"),
+        *gauge("cutblock_split_cache_bytes", "Bytes held by the in-memory split cache.", cache["bytes"]),
+        *gauge("cutblock_prepared_polygons", "Live prepared-polygon handles.", get_handle_store().stats()["handles"]),
+    ]
+    return Response(render(lines), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/profiles")
+def profiles():
+    """Profile dumps of slow requests, newest first (see record_request_metrics)."""
+    return {"profiles": list_profiles()}
 
 
+@app.get("/profiles/{name}")
+def get_profile(name: str):
+    """A dump in folded-stack format, for speedscope or flamegraph.pl."""
+    path = profile_path(name)
+    if path is None:
+        return JSONResponse({"error": "Unknown profile"}, status_code=404)
+    return FileResponse(path, media_type="text/plain")
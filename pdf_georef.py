@@ -0,0 +1,345 @@
+"""Single-pass georeferencing extraction for PDF map sheets.
+
+Each backend opens the file once: GDAL for the projection, geotransform and GCPs
+its PDF driver derives, PyMuPDF for the ISO 32000 viewports (/VP) and their
+/Measure dictionaries on every page. The result is one JSON-serializable dict,
+with per-stage timings so slow sheets can be diagnosed.
+"""
+import re
+import time
+
+import numpy as np
+
+_TOKEN = re.compile(
+	rb"<<|>>|\[|\]|/[^\s/\[\]<>(){}%]*|\(|<[0-9A-Fa-f\s]*>"
+	rb"|[-+]?(?:\d+\.?\d*|\.\d+)|true|false|null|R"
+)
+_ESCAPE = re.compile(rb"\\([0-7]{1,3}|\r\n|[\s\S])|\r\n?")
+_ESCAPES = {
+	b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f",
+	# Backslash at the end of a line continues the string on the next one
+	b"\r\n": b"", b"\r": b"", b"\n": b"",
+}
+
+
+class _Ref:
+	"""Indirect reference ("12 0 R"), resolved only when a value is needed."""
+
+	def __init__(self, num):
+		self.num = num
+
+
+def _literal_end(data, start):
+	"""Index just past the literal string opening at data[start] ("(").
+
+	Balanced parentheses may appear unescaped inside a literal string, so they
+	are counted rather than ending the string at the first ")".
+	"""
+	depth = 0
+	i = start
+	while i < len(data):
+		c = data[i]
+		if c == 0x5C:  # backslash
+			i += 2
+			continue
+		if c == 0x28:
+			depth += 1
+		elif c == 0x29:
+			depth -= 1
+			if depth == 0:
+				return i + 1
+		i += 1
+	return len(data)
+
+
+def _tokenize(data):
+	tokens = []
+	pos = 0
+	while True:
+		m = _TOKEN.search(data, pos)
+		if m is None:
+			return tokens
+		if m.group() == b"(":
+			pos = _literal_end(data, m.start())
+			tokens.append(data[m.start():pos])
+		else:
+			pos = m.end()
+			tokens.append(m.group())
+
+
+def _unescape(m):
+	if m.group(1) is None:
+		# An unescaped end of line inside a string reads as a single newline
+		return b"\n"
+	esc = m.group(1)
+	if esc[0] in b"01234567":
+		return bytes([int(esc, 8) & 0xFF])
+	# Other escaped characters, including "(", ")" and backslash, stand for themselves
+	return _ESCAPES.get(esc, esc)
+
+
+def _decode_string(token):
+	if token.startswith(b"("):
+		body = token[1:-1] if token.endswith(b")") else token[1:]
+		raw = _ESCAPE.sub(_unescape, body)
+	else:
+		raw = bytes.fromhex(re.sub(rb"\s", b"", token[1:-1]).decode())
+	if raw.startswith(b"\xfe\xff"):
+		return raw[2:].decode("utf-16-be", "replace")
+	return raw.decode("latin-1")
+
+
+def parse_pdf_object(text):
+	"""Parse PDF object source (as from Document.xref_object) into Python values.
+
+	Dicts and arrays become dict/list, names and strings str, numbers float/int
+	and indirect references _Ref.
+	"""
+	value, _ = _parse_value(_tokenize(text.encode("latin-1", "replace") if isinstance(text, str) else text), 0)
+	return value
+
+
+def _parse_value(tokens, i):
+	tok = tokens[i]
+	if tok == b"<<":
+		out = {}
+		i += 1
+		while tokens[i] != b">>":
+			key = tokens[i][1:].decode("latin-1")
+			out[key], i = _parse_value(tokens, i + 1)
+		return out, i + 1
+	if tok == b"[":
+		out = []
+		i += 1
+		while tokens[i] != b"]":
+			item, i = _parse_value(tokens, i)
+			out.append(item)
+		return out, i + 1
+	if tok.startswith(b"/"):
+		return tok[1:].decode("latin-1"), i + 1
+	if tok.startswith((b"(", b"<")):
+		return _decode_string(tok), i + 1
+	if tok in (b"true", b"false"):
+		return tok == b"true", i + 1
+	if tok == b"null":
+		return None, i + 1
+	# Number, or the start of an "n g R" reference
+	if i + 2 < len(tokens) and tokens[i + 2] == b"R":
+		return _Ref(int(tok)), i + 3
+	number = float(tok)
+	return (int(number) if number.is_integer() and b"." not in tok else number), i + 1
+
+
+def _resolve(doc, value):
+	if isinstance(value, _Ref):
+		return parse_pdf_object(doc.xref_object(value.num, compressed=True))
+	return value
+
+
+def _page_key(doc, page, key):
+	kind, text = doc.xref_get_key(page.xref, key)
+	if kind == "null":
+		return None
+	return _resolve(doc, parse_pdf_object(text))
+
+
+def _gdal_georef():
+	return {
+		"available": False,
+		"has_georef": False,
+		"projection_wkt": None,
+		"geotransform": None,
+		"gcp_count": 0,
+		"gcps": [],
+		"gcp_projection_wkt": None,
+		"raster_size": None,
+		"bounds_wgs84": None,
+		"error": None,
+	}
+
+
+def _extract_gdal(pdf_path):
+	"""Georeferencing as GDAL's PDF driver sees it (page 1)."""
+	meta = _gdal_georef()
+	try:
+		from osgeo import gdal, osr
+	except ImportError as e:
+		meta["error"] = str(e)
+		return meta
+	meta["available"] = True
+	try:
+		ds = gdal.Open(pdf_path)
+		if ds is None:
+			meta["error"] = "GDAL could not open PDF"
+			return meta
+		width, height = int(ds.RasterXSize), int(ds.RasterYSize)
+		meta["raster_size"] = (width, height)
+		meta["projection_wkt"] = ds.GetProjection() or None
+		meta["geotransform"] = ds.GetGeoTransform(can_return_null=True)
+		gcps = ds.GetGCPs() or []
+		meta["gcp_count"] = len(gcps)
+		meta["gcps"] = [[g.GCPPixel, g.GCPLine, g.GCPX, g.GCPY] for g in gcps]
+		meta["gcp_projection_wkt"] = ds.GetGCPProjection() or None
+		meta["has_georef"] = bool(meta["projection_wkt"] or meta["geotransform"] or gcps)
+
+		gt, proj = meta["geotransform"], meta["projection_wkt"]
+		if gt and proj:
+			# All four corners, so rotated/sheared geotransforms get a true envelope
+			corners = [
+				(gt[0] + px * gt[1] + ln * gt[2], gt[3] + px * gt[4] + ln * gt[5])
+				for px, ln in ((0, 0), (width, 0), (0, height), (width, height))
+			]
+		elif gcps and meta["gcp_projection_wkt"]:
+			proj = meta["gcp_projection_wkt"]
+			corners = [(g.GCPX, g.GCPY) for g in gcps]
+		else:
+			return meta
+		src = osr.SpatialReference()
+		src.ImportFromWkt(proj)
+		tgt = osr.SpatialReference()
+		tgt.ImportFromEPSG(4326)
+		for srs in (src, tgt):
+			srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+		transform = osr.CoordinateTransformation(src, tgt)
+		lnglat = np.array([transform.TransformPoint(x, y)[:2] for x, y in corners])
+		meta["bounds_wgs84"] = _envelope(lnglat)
+	except Exception as e:
+		meta["error"] = str(e)
+	return meta
+
+
+def _envelope(lnglat):
+	"""[sw_lat, sw_lng, ne_lat, ne_lng] around (n, 2) lng/lat points."""
+	lnglat = np.asarray(lnglat, dtype=float)
+	return [
+		float(lnglat[:, 1].min()), float(lnglat[:, 0].min()),
+		float(lnglat[:, 1].max()), float(lnglat[:, 0].max()),
+	]
+
+
+def _pairs(values):
+	values = [float(v) for v in values or []]
+	return [values[i:i + 2] for i in range(0, len(values) - 1, 2)]
+
+
+def _viewport_georef(doc, viewport):
+	"""Structured /Measure data for one viewport, or None if it is not geospatial."""
+	measure = _resolve(doc, viewport.get("Measure"))
+	if not isinstance(measure, dict) or measure.get("Subtype") != "GEO":
+		return None
+	bbox = [float(v) for v in _resolve(doc, viewport.get("BBox")) or []]
+	gpts = _pairs(_resolve(doc, measure.get("GPTS")))
+	lpts = _pairs(_resolve(doc, measure.get("LPTS")))
+	if len(gpts) < 2:
+		return None
+	gcs = _resolve(doc, measure.get("GCS"))
+	gcs = gcs if isinstance(gcs, dict) else {}
+	info = {
+		"name": viewport.get("Name"),
+		"bbox": bbox,
+		"gpts": gpts,
+		"lpts": lpts,
+		"gcs": {"type": gcs.get("Type"), "epsg": gcs.get("EPSG"), "wkt": gcs.get("WKT")},
+		"bounds_wgs84": _envelope([[lng, lat] for lat, lng in gpts]),
+		"affine": None,
+	}
+	if len(bbox) == 4 and len(lpts) == len(gpts) >= 3:
+		# LPTS are fractions of the BBox as written (its y may run top-down)
+		x0, y0, x1, y1 = bbox
+		page_xy = np.array([[x0 + u * (x1 - x0), y0 + v * (y1 - y0), 1.0] for u, v in lpts])
+		lnglat = np.array([[lng, lat] for lat, lng in gpts])
+		coef, _, rank, _ = np.linalg.lstsq(page_xy, lnglat, rcond=None)
+		if rank == 3:
+			info["affine"] = coef.T.ravel().tolist()
+	return info
+
+
+def _page_georef(doc, page):
+	viewports = _page_key(doc, page, "VP") or []
+	if isinstance(viewports, dict):
+		viewports = [viewports]
+	# Some writers hang a /Measure directly on the page
+	measure = _page_key(doc, page, "Measure")
+	if measure is not None:
+		viewports = list(viewports) + [{"Measure": measure, "BBox": list(page.mediabox)}]
+
+	found = []
+	for vp in viewports:
+		info = _viewport_georef(doc, _resolve(doc, vp) or {})
+		if info is not None:
+			found.append(info)
+
+	mb = page.mediabox
+	bounds = None
+	if found:
+		# The largest georeferenced viewport stands in for the whole page
+		main = max(found, key=lambda v: abs((v["bbox"][2] - v["bbox"][0]) * (v["bbox"][3] - v["bbox"][1])) if len(v["bbox"]) == 4 else 0)
+		if main["affine"]:
+			a = np.array(main["affine"]).reshape(2, 3)
+			corners = np.array([[x, y, 1.0] for x in (mb.x0, mb.x1) for y in (mb.y0, mb.y1)])
+			bounds = _envelope(corners @ a.T)
+		else:
+			bounds = main["bounds_wgs84"]
+	return {
+		"page": page.number,
+		"size": [page.rect.width, page.rect.height],
+		"rotation": page.rotation,
+		"viewports": found,
+		"bounds_wgs84": bounds,
+		"error": None,
+	}
+
+
+def _page_georef_or_error(doc, page):
+	"""_page_georef, or an entry without viewports recording why it failed, so one
+	malformed page does not cost the rest of a map book its georeferencing."""
+	try:
+		return _page_georef(doc, page)
+	except Exception as e:
+		return {
+			"page": page.number,
+			"size": [page.rect.width, page.rect.height],
+			"rotation": page.rotation,
+			"viewports": [],
+			"bounds_wgs84": None,
+			"error": str(e) or type(e).__name__,
+		}
+
+
+def extract_georef(pdf_path):
+	"""Everything we can learn about a PDF's georeferencing, in one pass per backend.
+
+	bounds_wgs84 ([sw_lat, sw_lng, ne_lat, ne_lng] for page 1) prefers GDAL and
+	falls back to the page's viewports, extrapolated to the full page.
+	"""
+	timings = {}
+	start = time.perf_counter()
+	gdal_meta = _extract_gdal(pdf_path)
+	timings["gdal"] = (time.perf_counter() - start) * 1000
+
+	t = time.perf_counter()
+	pages = []
+	pymupdf_error = None
+	try:
+		import fitz  # PyMuPDF
+
+		with fitz.open(pdf_path) as doc:
+			timings["pymupdf_open"] = (time.perf_counter() - t) * 1000
+			t = time.perf_counter()
+			for page in doc:
+				pages.append(_page_georef_or_error(doc, page))
+			timings["viewports"] = (time.perf_counter() - t) * 1000
+	except Exception as e:
+		pymupdf_error = str(e)
+
+	bounds = gdal_meta["bounds_wgs84"] or (pages[0]["bounds_wgs84"] if pages else None)
+	timings["total"] = (time.perf_counter() - start) * 1000
+	return {
+		"has_georef": bool(bounds) or gdal_meta["has_georef"] or any(p["viewports"] for p in pages),
+		"bounds_wgs84": bounds,
+		"page_count": len(pages),
+		"pages": pages,
+		"gdal": gdal_meta,
+		"pymupdf_error": pymupdf_error,
+		"timings_ms": {k: round(v, 3) for k, v in timings.items()},
+	}
@@ -0,0 +1,182 @@
+"""Background job queue for PDF rasterization and georeferencing.
+
+Jobs run in a small bounded thread pool (Poppler/PyMuPDF do the heavy lifting
+outside the GIL) and report their stage and progress so clients can poll a status
+endpoint or follow server-sent events. Configured from the environment:
+
+- CUTBLOCK_PDF_WORKERS: concurrent rasterization jobs and page renders (default 2)
+- CUTBLOCK_PDF_MAX_JOBS: finished jobs kept for status lookups (default 500)
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+TERMINAL_STATES = ("done", "error")
+
+# Shown to clients for failures that are not a PdfJobError; details go to the log
+INTERNAL_ERROR = "Internal error while processing the PDF"
+
+logger = logging.getLogger(__name__)
+
+
+class PdfJobError(Exception):
+	"""Expected job failure whose message is safe to show to the client.
+
+	result optionally carries partial output (e.g. a rendered image) for the client.
+	"""
+
+	def __init__(self, message, result=None):
+		super().__init__(message)
+		self.result = result
+
+
+class PdfJob:
+	def __init__(self, filename):
+		self.id = uuid.uuid4().hex
+		self.filename = filename
+		self.status = "queued"
+		self.stage = None
+		self.progress = 0.0
+		self.result = None
+		self.error = None
+		self.exception = None
+		self.created = time.time()
+		self.updated = self.created
+		self.version = 0
+		self.future = None
+
+	def update(self, stage=None, progress=None, status=None):
+		"""Record progress from the worker; bumps version so event streams notice."""
+		if stage is not None:
+			self.stage = stage
+		if progress is not None:
+			self.progress = float(progress)
+		if status is not None:
+			self.status = status
+		self.updated = time.time()
+		self.version += 1
+
+	@property
+	def finished(self):
+		return self.status in TERMINAL_STATES
+
+	def to_dict(self):
+		return {
+			"job_id": self.id,
+			"filename": self.filename,
+			"status": self.status,
+			"stage": self.stage,
+			"progress": round(self.progress, 3),
+			"result": self.result,
+			"error": self.error,
+			"created": self.created,
+			"updated": self.updated,
+		}
+
+
+class PdfJobQueue:
+	"""Bounded worker pool plus an LRU registry of jobs for status lookups."""
+
+	def __init__(self, max_workers=2, max_jobs=500):
+		self.max_workers = max(1, int(max_workers))
+		self.max_jobs = max(1, int(max_jobs))
+		self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pdf")
+		self._jobs = OrderedDict()
+		self._lock = threading.Lock()
+
+	def submit(self, filename, fn, *args):
+		"""Queue fn(job, *args); its return value becomes job.result."""
+		job = PdfJob(filename)
+		with self._lock:
+			self._jobs[job.id] = job
+			self._evict()
+		# Run in a copy of the caller's context, so a waiting request's perf_metrics
+		# recording sees the job's stages
+		job.future = self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args)
+		return job
+
+	async def run(self, fn, *args):
+		"""Await fn(*args) on the worker pool without registering a job.
+
+		For on-demand work such as page renders, which should share the pool's
+		concurrency limit but need no status tracking.
+		"""
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(self._executor, contextvars.copy_context().run, fn, *args)
+
+	def _run(self, job, fn, args):
+		job.update(status="running")
+		try:
+			job.result = fn(job, *args)
+		except PdfJobError as e:
+			job.exception = e
+			job.error = str(e)
+			job.result = e.result
+			job.update(status="error")
+		except Exception as e:
+			logger.exception("PDF job %s (%s) failed", job.id, job.filename)
+			job.exception = e
+			job.error = INTERNAL_ERROR
+			job.update(status="error")
+		else:
+			job.update(status="done", progress=1.0)
+		return job
+
+	def _evict(self):
+		# Drop the oldest finished jobs once over the limit; running jobs stay
+		while len(self._jobs) > self.max_jobs:
+			oldest = next((k for k, j in self._jobs.items() if j.finished), None)
+			if oldest is None:
+				break
+			del self._jobs[oldest]
+
+	def get(self, job_id):
+		with self._lock:
+			return self._jobs.get(job_id)
+
+	async def wait(self, job):
+		"""Await job completion without blocking the event loop."""
+		await asyncio.wrap_future(job.future)
+		return job
+
+	async def events(self, job, poll_interval=0.2):
+		"""Yield job snapshots whenever it changes, ending after a terminal state."""
+		seen = -1
+		while True:
+			version = job.version
+			if version != seen:
+				seen = version
+				yield job.to_dict()
+				if job.finished:
+					return
+			await asyncio.sleep(poll_interval)
+
+	def shutdown(self):
+		self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_job_queue = None
+
+
+def get_job_queue():
+	"""Shared PDF job queue configured from the environment."""
+	global _job_queue
+	if _job_queue is None:
+		_job_queue = PdfJobQueue(
+			max_workers=int(os.environ.get("CUTBLOCK_PDF_WORKERS") or 2),
+			max_jobs=int(os.environ.get("CUTBLOCK_PDF_MAX_JOBS") or 500),
+		)
+	return _job_queue
+
+
+def shutdown_job_queue():
+	global _job_queue
+	queue, _job_queue = _job_queue, None
+	if queue is not None:
+		queue.shutdown()
@@ -1,135 +1,188 @@
-def extract_gdal_metadata(pdf_path):
-	"""Try to extract GeoPDF-style georeferencing via GDAL.
-
-	Returns a dict with:
-	- available: bool (was GDAL usable)
-	- has_georef: bool
-	- projection_wkt: str|None
-	- geotransform: tuple|None
-	- gcp_count: int
-	- raster_size: (width,height)|None
-	- bounds_wgs84: [sw_lat, sw_lng, ne_lat, ne_lng]|None
-	"""
-	meta = {
-		"available": False,
-		"has_georef": False,
-		"projection_wkt": None,
-		"geotransform": None,
-		"gcp_count": 0,
-		"raster_size": None,
-		"bounds_wgs84": None,
-		"error": None,
-	}
-	try:
-		from osgeo import gdal, osr
-		meta["available"] = True
-		ds = gdal.Open(pdf_path)
-		if ds is None:
-			meta["error"] = "GDAL could not open PDF"
-			return meta
-
-		width = getattr(ds, "RasterXSize", None)
-		height = getattr(ds, "RasterYSize", None)
-		if width is not None and height is not None:
-			meta["raster_size"] = (int(width), int(height))
-
-		proj = ds.GetProjection() or None
-		meta["projection_wkt"] = proj
-
-		gcps = ds.GetGCPs() or []
-		meta["gcp_count"] = len(gcps)
-
-		gt = ds.GetGeoTransform(can_return_null=True)
-		meta["geotransform"] = gt
-
-		if proj or gt or meta["gcp_count"]:
-			meta["has_georef"] = True
-
-		# Prefer geotransform bounds if present
-		if gt and width and height:
-			minx = gt[0]
-			maxy = gt[3]
-			maxx = minx + width * gt[1]
-			miny = maxy + height * gt[5]
-
-			if proj:
-				srs = osr.SpatialReference()
-				srs.ImportFromWkt(proj)
-				tgt = osr.SpatialReference()
-				tgt.ImportFromEPSG(4326)
-				transform = osr.CoordinateTransformation(srs, tgt)
-				sw_lonlat = transform.TransformPoint(minx, miny)
-				ne_lonlat = transform.TransformPoint(maxx, maxy)
-				meta["bounds_wgs84"] = [sw_lonlat[1], sw_lonlat[0], ne_lonlat[1], ne_lonlat[0]]
-		return meta
-	except Exception as e:
-		meta["error"] = str(e)
-		return meta
 from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import JSONResponse
-import shutil
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+import asyncio
+import json
+import logging
 import os
-from pdf2image import convert_from_bytes
-import fitz  # PyMuPDF
+from pdf_georef import extract_georef
+from pdf_jobs import PdfJobError, get_job_queue
+from pdf_store import UploadTooLarge, get_pdf_store, max_upload_bytes
+from pdf_tiles import register_tileset, tile_path
+from pdf_warp import WarpError, warp_pdf, warp_srs
+from perf_metrics import observe, observe_seconds, stage, timed
 
 app = FastAPI()
 
-UPLOAD_DIR = "static/pdf_uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-def extract_geospatial_bounds(pdf_path):
-	# Try GDAL first
-	gdal_meta = extract_gdal_metadata(pdf_path)
-	if gdal_meta.get("bounds_wgs84"):
-		return gdal_meta["bounds_wgs84"]
-	# Fallback to PyMuPDF method
-	doc = fitz.open(pdf_path)
-	page = doc[0]
-	xref = page.xref
-	pdf_dict = doc.xref_object(xref, compressed=False)
-	import re
-	measure_match = re.search(r'/Measure\s+(\d+)', pdf_dict)
-	if measure_match:
-		measure_xref = int(measure_match.group(1))
-		measure_dict = doc.xref_object(measure_xref, compressed=False)
-		gpts_match = re.search(r'/GPTS\s*\[(.*?)\]', measure_dict)
-		if gpts_match:
-			gpts = [float(x) for x in gpts_match.group(1).split()]
-			return [gpts[1], gpts[0], gpts[3], gpts[2]]
-	return None
-
-
-def extract_pymupdf_measure_metadata(pdf_path):
-	"""Best-effort check for PDF /Measure /GPTS metadata via PyMuPDF."""
-	meta = {
-		"available": True,
-		"has_measure": False,
-		"gpts": None,
-		"error": None,
-	}
+logger = logging.getLogger(__name__)
+
+# Overlay raster resolution (pdf2image's default)
+RASTER_DPI = 200
+
+# extract_georef timings recorded as their own stages
+GEOREF_STAGES = {"gdal": "pdf_gdal", "pymupdf_open": "pdf_pymupdf_open", "viewports": "pdf_viewports"}
+
+# Tile and page URLs embed a content hash, so browsers may cache them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+NO_GEOREF_ERROR = (
+	"No geospatial info found in PDF. "
+	"This feature requires a GeoPDF with embedded geospatial metadata (e.g. /Measure and /GPTS tags). "
+	"If your PDF is not georeferenced, you must provide coordinates manually."
+)
+
+def _parse_manual_bounds(sw_coord, ne_coord):
+	"""[sw_lat, sw_lng, ne_lat, ne_lng] from "lat,lng" strings, or None if not given."""
+	if not (sw_coord and ne_coord):
+		return None
+	try:
+		sw = [float(x) for x in sw_coord.split(",")]
+		ne = [float(x) for x in ne_coord.split(",")]
+		if len(sw) == 2 and len(ne) == 2:
+			return [sw[0], sw[1], ne[0], ne[1]]
+		raise ValueError
+	except Exception:
+		raise PdfJobError("Invalid manual coordinates. Use format: lat,lng for both SW and NE.")
+
+
+def _page_png_name(page):
+	return f"page-{page}.{RASTER_DPI}dpi.png"
+
+
+def _render_page_png(pdf, page=1):
+	"""Path of the stored PNG of a page (1-based), rendered on first use."""
+	def render(tmp_path):
+		from pdf2image import convert_from_path
+
+		# Poppler reads the stored file and writes the PNG itself; no bytes pass through Python
+		out_dir, stem = os.path.split(tmp_path)
+		with stage("pdf_rasterize"):
+			paths = convert_from_path(
+				pdf.path, dpi=RASTER_DPI, first_page=page, last_page=page, fmt="png",
+				output_folder=out_dir, output_file=stem, single_file=True, paths_only=True,
+			)
+		os.replace(paths[0], tmp_path)
+		observe("pdf_rasterize", "bytes", os.path.getsize(tmp_path))
+
+	return get_pdf_store().ensure_file(pdf.hash, _page_png_name(page), render)
+
+
+def _georef(pdf):
+	"""extract_georef result for a stored PDF, cached per file; fresh extractions are timed."""
+	def extract():
+		with stage("pdf_georef"):
+			georef = extract_georef(pdf.path)
+		for key, name in GEOREF_STAGES.items():
+			if key in georef["timings_ms"]:
+				observe_seconds(name, georef["timings_ms"][key] / 1000.0)
+		observe("pdf_georef", "pages", georef["page_count"])
+		return georef
+
+	return get_pdf_store().cached(pdf.hash, "georef", extract)
+
+
+def _warp(pdf, srs):
+	with stage("pdf_warp"):
+		return warp_pdf(pdf.path, pdf.hash, srs)
+
+
+def _page_overlays(pdf, georef, first):
+	"""Per-page overlay info for a map book; nothing is rendered until requested.
+
+	first is page 1's entry as returned at the top level (image_url, bounds, tiles),
+	so a warped or manually placed first page is listed consistently.
+	"""
+	pages = []
+	for info in georef["pages"]:
+		page = info["page"] + 1
+		if page == 1:
+			pages.append({"page": page, **first})
+			continue
+		bounds = info["bounds_wgs84"]
+		tiles = None
+		if bounds:
+			tiles = register_tileset(
+				pdf.path, bounds, page_number=info["page"], content_hash=pdf.hash, page_size=info["size"]
+			)
+		pages.append({
+			"page": page,
+			"bounds": bounds,
+			"image_url": f"/pdf-pages/{pdf.hash}/{page}.png",
+			"tiles": tiles,
+		})
+	return pages
+
+
+async def _store_upload(file):
+	"""Stored PDF for an upload, or a 413 response if it is over the size limit."""
+	try:
+		with stage("pdf_upload"):
+			pdf = await get_pdf_store().save_upload(file, max_bytes=max_upload_bytes())
+		observe("pdf_upload", "bytes", os.path.getsize(pdf.path))
+		return pdf, None
+	except UploadTooLarge as e:
+		return None, JSONResponse({"error": str(e)}, status_code=413)
+
+
+@timed("pdf_overlay")
+def rasterize_pdf_overlay(job, pdf, sw_coord=None, ne_coord=None):
+	"""Job body: render page 1 of a stored PDF to PNG and work out its WGS84 bounds.
+
+	Georeferencing for every page is extracted up front; other pages of a map
+	book are listed under "pages" and rendered only when requested. Results are
+	cached per file, so a known sheet returns without touching GDAL or PyMuPDF.
+	"""
+	store = get_pdf_store()
+	job.update(stage="georeferencing", progress=0.1)
+	georef = _georef(pdf)
+
+	job.update(stage="warping", progress=0.2)
+	# Sheets GDAL can georeference are reprojected north-up so rotation/shear line up
+	srs = warp_srs()
 	try:
-		doc = fitz.open(pdf_path)
-		page = doc[0]
-		xref = page.xref
-		pdf_dict = doc.xref_object(xref, compressed=False)
-		import re
-		measure_match = re.search(r"/Measure\s+(\d+)", pdf_dict)
-		if not measure_match:
-			return meta
-		measure_xref = int(measure_match.group(1))
-		measure_dict = doc.xref_object(measure_xref, compressed=False)
-		gpts_match = re.search(r"/GPTS\s*\[(.*?)\]", measure_dict)
-		if not gpts_match:
-			return meta
-		gpts = [float(x) for x in gpts_match.group(1).split()]
-		if len(gpts) >= 4:
-			meta["has_measure"] = True
-			meta["gpts"] = gpts[:4]
-		return meta
-	except Exception as e:
-		meta["available"] = False
-		meta["error"] = str(e)
-		return meta
+		warped = store.cached(pdf.hash, f"warp:{srs}", lambda: _warp(pdf, srs))
+	except WarpError:
+		# Not cached, so a later upload of the same file tries again
+		logger.warning("Warping PDF %s failed; using the page overlay", pdf.hash, exc_info=True)
+		warped = None
+	if warped is not None:
+		job.update(stage="tiling", progress=0.9)
+		first = {
+			"image_url": "/" + warped["image_path"].replace(os.sep, "/"),
+			"bounds": warped["bounds"],
+			"tiles": register_tileset(pdf.path, warped["bounds"], content_hash=pdf.hash, warped=warped),
+		}
+		return {
+			**first,
+			"warped": warped["srs"],
+			"page_count": georef["page_count"],
+			"pages": _page_overlays(pdf, georef, first),
+		}
+
+	job.update(stage="rasterizing", progress=0.3)
+	image_url = store.url_for(pdf.hash, os.path.basename(_render_page_png(pdf)))
+
+	bounds = georef["bounds_wgs84"]
+	if not bounds:
+		# Try to use manual coordinates if provided
+		bounds = _parse_manual_bounds(sw_coord, ne_coord)
+		if not bounds:
+			# The client can still place the rendered page by hand
+			raise PdfJobError(NO_GEOREF_ERROR, result={"image_url": image_url})
+
+	job.update(stage="tiling", progress=0.9)
+	page_size = georef["pages"][0]["size"] if georef["pages"] else None
+	first = {
+		"image_url": image_url,
+		"bounds": bounds,
+		"tiles": register_tileset(pdf.path, bounds, content_hash=pdf.hash, page_size=page_size),
+	}
+	return {
+		**first,
+		"warped": None,
+		"page_count": georef["page_count"],
+		"pages": _page_overlays(pdf, georef, first),
+	}
+
 
 @app.post("/upload-pdf-map")
 async def upload_pdf_map(
@@ -137,66 +190,122 @@ async def upload_pdf_map(
 	sw_coord: str = Form(None),
 	ne_coord: str = Form(None)
 ):
-	# Save PDF
-	pdf_path = os.path.join(UPLOAD_DIR, file.filename)
-	with open(pdf_path, "wb") as buffer:
-		shutil.copyfileobj(file.file, buffer)
-
-	# Convert first page of PDF to PNG
-	images = convert_from_bytes(open(pdf_path, "rb").read())
-	img_path = pdf_path + ".png"
-	images[0].save(img_path, "PNG")
-
-	# Try to extract geospatial bounds
-	bounds = extract_geospatial_bounds(pdf_path)
-	if not bounds:
-		# Try to use manual coordinates if provided
-		if sw_coord and ne_coord:
-			try:
-				sw = [float(x) for x in sw_coord.split(",")]
-				ne = [float(x) for x in ne_coord.split(",")]
-				if len(sw) == 2 and len(ne) == 2:
-					bounds = [sw[0], sw[1], ne[0], ne[1]]
-				else:
-					raise ValueError
-			except Exception:
-				return JSONResponse({"error": "Invalid manual coordinates. Use format: lat,lng for both SW and NE."}, status_code=400)
-		else:
-			return JSONResponse({
-				"error": (
-					"No geospatial info found in PDF. "
-					"This feature requires a GeoPDF with embedded geospatial metadata (e.g. /Measure and /GPTS tags). "
-					"If your PDF is not georeferenced, you must provide coordinates manually."
-				)
-			}, status_code=400)
-
-	# Debug print for bounds
-	print("PDF overlay bounds:", bounds)
+	"""Upload and rasterize a PDF, waiting for the result (see /pdf-jobs for async)."""
+	pdf, error = await _store_upload(file)
+	if error:
+		return error
+	queue = get_job_queue()
+	job = queue.submit(file.filename, rasterize_pdf_overlay, pdf, sw_coord, ne_coord)
+	await queue.wait(job)
+	if job.status == "error":
+		# Only PdfJobError is the client's fault; anything else was logged by the queue
+		status_code = 400 if isinstance(job.exception, PdfJobError) else 500
+		return JSONResponse({**(job.result or {}), "error": job.error, "job_id": job.id}, status_code=status_code)
 	# Return image URL and bounds
-	return JSONResponse({
-		"image_url": f"/static/pdf_uploads/{os.path.basename(img_path)}",
-		"bounds": bounds
-	})
+	return JSONResponse({**job.result, "job_id": job.id})
+
+
+@app.post("/pdf-jobs", status_code=202)
+async def create_pdf_job(
+	file: UploadFile = File(...),
+	sw_coord: str = Form(None),
+	ne_coord: str = Form(None)
+):
+	"""Queue rasterization of an uploaded PDF and return its job id immediately."""
+	pdf, error = await _store_upload(file)
+	if error:
+		return error
+	job = get_job_queue().submit(file.filename, rasterize_pdf_overlay, pdf, sw_coord, ne_coord)
+	return JSONResponse(
+		{**job.to_dict(), "status_url": f"/pdf-jobs/{job.id}", "events_url": f"/pdf-jobs/{job.id}/events"},
+		status_code=202,
+	)
+
+
+@app.get("/pdf-jobs/{job_id}")
+def get_pdf_job(job_id: str):
+	job = get_job_queue().get(job_id)
+	if job is None:
+		return JSONResponse({"error": "Unknown job"}, status_code=404)
+	return job.to_dict()
+
+
+@app.get("/pdf-jobs/{job_id}/events")
+async def pdf_job_events(job_id: str):
+	"""Server-sent events with the job state on every change, until it finishes."""
+	queue = get_job_queue()
+	job = queue.get(job_id)
+	if job is None:
+		return JSONResponse({"error": "Unknown job"}, status_code=404)
+
+	async def stream():
+		async for snapshot in queue.events(job):
+			yield f"event: {snapshot['status']}\ndata: {json.dumps(snapshot)}\n\n"
+
+	return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/pdf-tiles/{tileset_id}/{z}/{x}/{y}.png")
+def get_pdf_tile(tileset_id: str, z: int, x: int, y: int):
+	"""XYZ tile of an uploaded PDF, rendered on first request and then served from disk."""
+	if not tileset_id.isalnum():
+		return Response(status_code=404)
+	path = tile_path(tileset_id, z, x, y)
+	if path is None:
+		return Response(status_code=404)
+	return FileResponse(path, media_type="image/png", headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL})
+
+
+def _page_png_if_exists(pdf, page):
+	"""Rendered PNG of a page, or None if the PDF has no such page."""
+	georef = _georef(pdf)
+	if not 1 <= page <= georef["page_count"]:
+		return None
+	return _render_page_png(pdf, page)
+
+
+@app.get("/pdf-pages/{content_hash}/{page}.png")
+async def get_pdf_page(content_hash: str, page: int):
+	"""Overlay PNG of one page (1-based) of a stored PDF, rendered on first request.
+
+	Renders run on the PDF job pool, so they count against CUTBLOCK_PDF_WORKERS.
+	"""
+	store = get_pdf_store()
+	pdf = store.get(content_hash)
+	if pdf is None:
+		return Response(status_code=404)
+	path = store.path_for(pdf.hash, _page_png_name(page))
+	if not os.path.exists(path):
+		path = await get_job_queue().run(_page_png_if_exists, pdf, page)
+		if path is None:
+			return Response(status_code=404)
+	return FileResponse(path, media_type="image/png", headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL})
 
 
 @app.post("/inspect-pdf-map")
 async def inspect_pdf_map(file: UploadFile = File(...)):
 	"""Inspect an uploaded PDF and report whether it contains geospatial metadata."""
-	# Save PDF (keep original so GDAL/PyMuPDF can read it)
-	pdf_path = os.path.join(UPLOAD_DIR, file.filename)
-	with open(pdf_path, "wb") as buffer:
-		shutil.copyfileobj(file.file, buffer)
-
-	gdal_meta = extract_gdal_metadata(pdf_path)
-	measure_meta = extract_pymupdf_measure_metadata(pdf_path)
-	bounds = extract_geospatial_bounds(pdf_path)
+	pdf, error = await _store_upload(file)
+	if error:
+		return error
 
-	has_georef = bool(bounds) or bool(gdal_meta.get("has_georef")) or bool(measure_meta.get("has_measure"))
+	# GDAL/PyMuPDF block; keep them off the event loop
+	georef = await asyncio.to_thread(_georef, pdf)
+	first_vp = next(iter(georef["pages"][0]["viewports"]), None) if georef["pages"] else None
 
 	return JSONResponse({
 		"filename": file.filename,
-		"has_geospatial_metadata": has_georef,
-		"bounds_wgs84": bounds,
-		"gdal": gdal_meta,
-		"pdf_measure": measure_meta,
+		"content_hash": pdf.hash,
+		"has_geospatial_metadata": georef["has_georef"],
+		"bounds_wgs84": georef["bounds_wgs84"],
+		"gdal": georef["gdal"],
+		"pdf_measure": {
+			"available": georef["pymupdf_error"] is None,
+			"has_measure": first_vp is not None,
+			"gpts": [v for pt in first_vp["gpts"] for v in pt] if first_vp else None,
+			"error": georef["pymupdf_error"],
+		},
+		"page_count": georef["page_count"],
+		"pages": georef["pages"],
+		"timings_ms": georef["timings_ms"],
 	})
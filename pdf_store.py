@@ -0,0 +1,193 @@
+"""Content-addressed store for uploaded PDFs and everything derived from them.
+
+Uploads are hashed (SHA-256) while they stream to disk and kept once per content
+as STORE_DIR/<hash>/source.pdf, so same-named uploads never overwrite each other
+and re-uploads cost nothing. Extracted metadata is memoised per file in
+STORE_DIR/<hash>/meta.json and rendered rasters are stored next to it, so a known
+sheet is never opened with GDAL or PyMuPDF again.
+
+Uploads are copied through one reused buffer in a worker thread and are capped
+at CUTBLOCK_PDF_MAX_UPLOAD_MB megabytes (default 100, 0 = unlimited).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+STORE_DIR = "static/pdf_store"
+SOURCE_NAME = "source.pdf"
+META_NAME = "meta.json"
+CHUNK_SIZE = 1 << 20
+
+
+class UploadTooLarge(Exception):
+	"""Raised when an upload exceeds the configured size limit."""
+
+
+def max_upload_bytes():
+	"""Upload size limit in bytes, or None if unlimited."""
+	mb = float(os.environ.get("CUTBLOCK_PDF_MAX_UPLOAD_MB") or 100)
+	return int(mb * 1024 * 1024) if mb > 0 else None
+
+
+class StoredPdf:
+	def __init__(self, content_hash, path, filename, is_new):
+		self.hash = content_hash
+		self.path = path
+		self.filename = filename
+		self.is_new = is_new
+
+
+class PdfStore:
+	def __init__(self, root=STORE_DIR):
+		self.root = root
+		self._meta = {}
+		self._meta_lock = threading.Lock()
+		self._locks = {}
+		self._lock = threading.Lock()
+		os.makedirs(root, exist_ok=True)
+
+	@contextmanager
+	def _locked(self, content_hash, name):
+		"""Hold the lock for one artifact of a file, so different pages or metadata
+		keys of the same file are produced concurrently.
+
+		The entry is dropped on release. Callers re-check for the artifact once they
+		hold the lock, so one arriving later with a fresh lock finds it already made.
+		"""
+		key = (content_hash, name)
+		with self._lock:
+			lock = self._locks.setdefault(key, threading.Lock())
+		with lock:
+			try:
+				yield
+			finally:
+				with self._lock:
+					if self._locks.get(key) is lock:
+						del self._locks[key]
+
+	def path_for(self, content_hash, name):
+		return os.path.join(self.root, content_hash, name)
+
+	def get(self, content_hash):
+		"""A previously stored PDF, or None."""
+		if not re.fullmatch(r"[0-9a-f]{64}", content_hash or ""):
+			return None
+		path = self.path_for(content_hash, SOURCE_NAME)
+		if not os.path.exists(path):
+			return None
+		return StoredPdf(content_hash, path, None, is_new=False)
+
+	def url_for(self, content_hash, name):
+		"""URL of a stored file (STORE_DIR sits under the /static mount)."""
+		return "/" + self.path_for(content_hash, name).replace(os.sep, "/")
+
+	async def save_upload(self, upload, max_bytes=None):
+		"""Stream an UploadFile into the store, hashing as it goes.
+
+		Raises UploadTooLarge once more than max_bytes have been read.
+		"""
+		size = getattr(upload, "size", None)
+		if max_bytes and size is not None and size > max_bytes:
+			raise UploadTooLarge(f"Upload is larger than {max_bytes / (1024 * 1024):g} MB")
+		return await asyncio.to_thread(self._ingest, upload.file, upload.filename, max_bytes)
+
+	def _ingest(self, src, filename, max_bytes=None):
+		fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".upload")
+		h = hashlib.sha256()
+		buf = bytearray(CHUNK_SIZE)
+		view = memoryview(buf)
+		total = 0
+		try:
+			with os.fdopen(fd, "wb") as out:
+				while True:
+					n = src.readinto(buf)
+					if not n:
+						break
+					total += n
+					if max_bytes and total > max_bytes:
+						raise UploadTooLarge(f"Upload is larger than {max_bytes / (1024 * 1024):g} MB")
+					h.update(view[:n])
+					out.write(view[:n])
+			return self._commit(tmp, h.hexdigest(), filename)
+		except BaseException:
+			if os.path.exists(tmp):
+				os.unlink(tmp)
+			raise
+
+	def _commit(self, tmp, content_hash, filename):
+		path = self.path_for(content_hash, SOURCE_NAME)
+		with self._locked(content_hash, SOURCE_NAME):
+			if os.path.exists(path):
+				os.unlink(tmp)
+				return StoredPdf(content_hash, path, filename, is_new=False)
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			os.replace(tmp, path)
+		return StoredPdf(content_hash, path, filename, is_new=True)
+
+	def _load_meta(self, content_hash):
+		"""Metadata dict for a file; call with _meta_lock held."""
+		meta = self._meta.get(content_hash)
+		if meta is None:
+			try:
+				with open(self.path_for(content_hash, META_NAME)) as f:
+					meta = json.load(f)
+			except (OSError, ValueError):
+				meta = {}
+			self._meta[content_hash] = meta
+		return meta
+
+	def cached(self, content_hash, key, compute):
+		"""Memoised compute() for this file; the result must be JSON-serializable.
+
+		Concurrent calls for the same file and key wait for the first one instead
+		of recomputing; other keys are computed alongside.
+		"""
+		with self._meta_lock:
+			meta = self._load_meta(content_hash)
+			if key in meta:
+				return meta[key]
+		with self._locked(content_hash, "meta:" + key):
+			with self._meta_lock:
+				if key in meta:
+					return meta[key]
+			# Round-trip so callers see the same types as on a later cache hit
+			value = json.loads(json.dumps(compute()))
+			with self._meta_lock:
+				meta[key] = value
+				self._write_meta(content_hash, meta)
+			return value
+
+	def ensure_file(self, content_hash, name, produce):
+		"""Path of a derived file, calling produce(tmp_path) to create it on first use."""
+		path = self.path_for(content_hash, name)
+		if os.path.exists(path):
+			return path
+		with self._locked(content_hash, name):
+			if not os.path.exists(path):
+				# Per thread: after a failed produce() a waiter and a new caller may both retry
+				tmp = f"{path}.{threading.get_ident()}.tmp"
+				produce(tmp)
+				os.replace(tmp, path)
+		return path
+
+	def _write_meta(self, content_hash, meta):
+		path = self.path_for(content_hash, META_NAME)
+		fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+		with os.fdopen(fd, "w") as f:
+			json.dump(meta, f)
+		os.replace(tmp, path)
+
+
+_pdf_store = None
+
+
+def get_pdf_store():
+	global _pdf_store
+	if _pdf_store is None:
+		_pdf_store = PdfStore()
+	return _pdf_store
@@ -0,0 +1,203 @@
+"""Lazily rendered XYZ (Web Mercator) tile pyramids for georeferenced PDF pages.
+
+A tileset ties a PDF page, or its warped GeoTIFF (see pdf_warp), to its WGS84
+bounds. Tiles are rendered on first
+request by clipping just the matching page region with PyMuPDF, then kept on disk
+under TILE_DIR/<tileset id>/<z>/<x>/<y>.png, so a sheet is never rasterized whole
+at full resolution. Tileset ids hash the PDF content, page and bounds, which
+makes every tile URL immutable.
+"""
+import hashlib
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+
+
+TILE_DIR = "static/pdf_tiles"
+TILE_SIZE = 256
+# Resolution of the deepest zoom level, in page dots per inch
+MAX_TILE_DPI = 400
+MAX_ZOOM = 22
+
+_manifests = {}
+_manifest_lock = threading.Lock()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+	h = hashlib.sha256()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(chunk_size), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+def _mercator_y(lat):
+	lat = max(min(float(lat), 85.0511287798), -85.0511287798)
+	return math.log(math.tan(math.pi / 4.0 + math.radians(lat) / 2.0))
+
+
+def tile_lnglat_bounds(z, x, y):
+	"""(west, south, east, north) of XYZ tile z/x/y in degrees."""
+	n = 2.0 ** z
+	west = x / n * 360.0 - 180.0
+	east = (x + 1) / n * 360.0 - 180.0
+	north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+	south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+	return west, south, east, north
+
+
+def zoom_range(native_px, bounds):
+	"""(min_zoom, max_zoom): whole sheet in about a tile, down to native_px across."""
+	sw_lat, sw_lng, ne_lat, ne_lng = bounds
+	span = max(abs(ne_lng - sw_lng), 1e-9)
+	min_zoom = max(int(math.floor(math.log2(360.0 / span))) - 1, 0)
+	max_zoom = int(math.ceil(math.log2(native_px * 360.0 / (TILE_SIZE * span))))
+	max_zoom = min(max(max_zoom, min_zoom), MAX_ZOOM)
+	return min(min_zoom, max_zoom), max_zoom
+
+
+def _tileset_dir(tileset_id):
+	return os.path.join(TILE_DIR, tileset_id)
+
+
+def register_tileset(pdf_path, bounds, page_number=0, content_hash=None, warped=None, page_size=None):
+	"""Create (or reuse) the tileset for a PDF page and return its public manifest.
+
+	warped is a pdf_warp.warp_pdf result; its raster is tiled instead of the page.
+	page_size ([width, height] in points) saves opening the PDF when known.
+	"""
+	content_hash = content_hash or file_sha256(pdf_path)
+	bounds = [float(b) for b in bounds]
+	srs = warped["srs"] if warped else None
+	key = json.dumps([content_hash, int(page_number), [round(b, 9) for b in bounds], srs])
+	tileset_id = hashlib.sha256(key.encode()).hexdigest()[:32]
+	existing = load_tileset(tileset_id)
+	if existing is not None:
+		return public_manifest(existing)
+
+	manifest = {
+		"id": tileset_id,
+		"pdf_path": os.path.abspath(pdf_path),
+		"page": int(page_number),
+		"bounds": bounds,
+		"url": f"/pdf-tiles/{tileset_id}/{{z}}/{{x}}/{{y}}.png",
+	}
+	if warped:
+		manifest["raster_path"] = os.path.abspath(warped["raster_path"])
+		manifest["srs"] = srs
+		native_px = warped["width"]
+	else:
+		if page_size is None:
+			import fitz  # PyMuPDF
+
+			with fitz.open(pdf_path) as doc:
+				page_rect = doc[int(page_number)].rect
+			page_size = [page_rect.width, page_rect.height]
+		manifest["page_size"] = [float(v) for v in page_size]
+		native_px = manifest["page_size"][0] / 72.0 * MAX_TILE_DPI
+	manifest["min_zoom"], manifest["max_zoom"] = zoom_range(native_px, bounds)
+	os.makedirs(_tileset_dir(tileset_id), exist_ok=True)
+	_atomic_write(
+		os.path.join(_tileset_dir(tileset_id), "tileset.json"),
+		json.dumps(manifest).encode(),
+	)
+	with _manifest_lock:
+		_manifests[tileset_id] = manifest
+	return public_manifest(manifest)
+
+
+def public_manifest(manifest):
+	"""What clients need to build a tile layer (no server paths)."""
+	return {k: manifest[k] for k in ("id", "url", "bounds", "min_zoom", "max_zoom", "page")}
+
+
+def load_tileset(tileset_id):
+	with _manifest_lock:
+		manifest = _manifests.get(tileset_id)
+	if manifest is not None:
+		return manifest
+	try:
+		with open(os.path.join(_tileset_dir(tileset_id), "tileset.json")) as f:
+			manifest = json.load(f)
+	except (OSError, ValueError):
+		return None
+	with _manifest_lock:
+		_manifests[tileset_id] = manifest
+	return manifest
+
+
+def render_tile(manifest, z, x, y):
+	"""PNG bytes for tile z/x/y of a tileset, or None if it misses the page."""
+	import fitz  # PyMuPDF
+	from PIL import Image
+
+	if manifest.get("raster_path"):
+		return _render_raster_tile(manifest, z, x, y)
+	sw_lat, sw_lng, ne_lat, ne_lng = manifest["bounds"]
+	page_w, page_h = manifest["page_size"]
+	west, south, east, north = tile_lnglat_bounds(z, x, y)
+
+	# Leaflet stretches overlays linearly in projected (Mercator) space; match it
+	top, bottom = _mercator_y(ne_lat), _mercator_y(sw_lat)
+	fx0 = (west - sw_lng) / (ne_lng - sw_lng)
+	fx1 = (east - sw_lng) / (ne_lng - sw_lng)
+	fy0 = (top - _mercator_y(north)) / (top - bottom)
+	fy1 = (top - _mercator_y(south)) / (top - bottom)
+	region = fitz.Rect(fx0 * page_w, fy0 * page_h, fx1 * page_w, fy1 * page_h)
+
+	with fitz.open(manifest["pdf_path"]) as doc:
+		page = doc[manifest["page"]]
+		clip = region & page.rect
+		if clip.is_empty or clip.width <= 0 or clip.height <= 0:
+			return None
+		sx = TILE_SIZE / region.width
+		sy = TILE_SIZE / region.height
+		pix = page.get_pixmap(matrix=fitz.Matrix(sx, sy), clip=clip, alpha=False)
+		piece = Image.open(io.BytesIO(pix.tobytes("png")))
+
+	tile = Image.new("RGBA", (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
+	offset = (round((clip.x0 - region.x0) * sx), round((clip.y0 - region.y0) * sy))
+	tile.paste(piece.convert("RGBA"), offset)
+	out = io.BytesIO()
+	tile.save(out, "PNG", optimize=True)
+	return out.getvalue()
+
+
+def _render_raster_tile(manifest, z, x, y):
+	from PIL import Image
+	from pdf_warp import read_tile
+
+	pixels = read_tile(manifest["raster_path"], manifest["srs"], z, x, y)
+	if pixels is None:
+		return None
+	out = io.BytesIO()
+	Image.fromarray(pixels, "RGBA").save(out, "PNG", optimize=True)
+	return out.getvalue()
+
+
+def tile_path(tileset_id, z, x, y):
+	"""Path of the rendered tile on disk (rendering it on first use), or None."""
+	manifest = load_tileset(tileset_id)
+	if manifest is None or not manifest["min_zoom"] <= z <= manifest["max_zoom"]:
+		return None
+	if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+		return None
+	path = os.path.join(_tileset_dir(tileset_id), str(z), str(x), f"{y}.png")
+	if os.path.exists(path):
+		return path
+	png = render_tile(manifest, z, x, y)
+	if png is None:
+		return None
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	_atomic_write(path, png)
+	return path
+
+
+def _atomic_write(path, data):
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+	with os.fdopen(fd, "wb") as f:
+		f.write(data)
+	os.replace(tmp, path)
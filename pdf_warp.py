@@ -0,0 +1,239 @@
+"""Warp georeferenced PDFs into north-up Web Mercator (or WGS84) rasters with GDAL.
+
+A GeoPDF whose georeferencing is rotated, sheared or in a projected CRS does not
+line up when its page is stretched over a lat/lng rectangle. This reprojects the
+page once through gdalwarp, which processes the image in chunks bounded by
+WARP_MEMORY_MB, into a tiled GeoTIFF with overviews. Overlay images and map tiles
+are then produced from windowed reads of that file. Results are cached per
+file content hash under WARP_DIR. Configured from the environment:
+
+- CUTBLOCK_PDF_WARP_SRS: "EPSG:3857" (default), "EPSG:4326" or "off"
+- CUTBLOCK_PDF_WARP_MEMORY_MB: gdalwarp working memory (default 64)
+"""
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from pdf_tiles import TILE_SIZE, file_sha256, tile_lnglat_bounds
+
+WARP_DIR = "static/pdf_warped"
+WARP_SRS_CHOICES = ("EPSG:3857", "EPSG:4326")
+# Pixel size of the GDAL render, matching the pdf2image overlay
+WARP_DPI = 200
+OVERVIEW_LEVELS = [2, 4, 8, 16, 32, 64]
+# Half the Web Mercator world width in metres
+_MERC_HALF = 20037508.342789244
+
+_hash_locks = {}
+_hash_locks_lock = threading.Lock()
+
+
+class WarpError(Exception):
+	"""GDAL failed part-way through warping a file it could georeference.
+
+	Unlike a None result this is not a property of the file, so it should not be cached.
+	"""
+
+
+def warp_srs():
+	"""Configured target CRS, or None when warping is disabled."""
+	value = (os.environ.get("CUTBLOCK_PDF_WARP_SRS") or "EPSG:3857").upper()
+	if value == "OFF":
+		return None
+	if value not in WARP_SRS_CHOICES:
+		raise ValueError(f"Unsupported CUTBLOCK_PDF_WARP_SRS: {value!r}")
+	return value
+
+
+@contextmanager
+def _locked(key):
+	"""Hold the lock for one warp output; the entry is dropped on release (see PdfStore._locked)."""
+	with _hash_locks_lock:
+		lock = _hash_locks.setdefault(key, threading.Lock())
+	with lock:
+		try:
+			yield
+		finally:
+			with _hash_locks_lock:
+				if _hash_locks.get(key) is lock:
+					del _hash_locks[key]
+
+
+def _remove_quietly(path):
+	try:
+		os.remove(path)
+	except FileNotFoundError:
+		pass
+
+
+def _needs_warp(ds):
+	"""True if GDAL found georeferencing we can reproject from."""
+	if ds.GetGCPCount() and ds.GetGCPProjection():
+		return True
+	gt = ds.GetGeoTransform(can_return_null=True)
+	return bool(gt and ds.GetProjection())
+
+
+def _bounds_wgs84(ds, srs):
+	"""[sw_lat, sw_lng, ne_lat, ne_lng] of a north-up raster in srs."""
+	gt = ds.GetGeoTransform()
+	minx, maxy = gt[0], gt[3]
+	maxx = minx + ds.RasterXSize * gt[1]
+	miny = maxy + ds.RasterYSize * gt[5]
+	if srs == "EPSG:4326":
+		return [miny, minx, maxy, maxx]
+	sw_lng, sw_lat = _mercator_to_lnglat(minx, miny)
+	ne_lng, ne_lat = _mercator_to_lnglat(maxx, maxy)
+	return [sw_lat, sw_lng, ne_lat, ne_lng]
+
+
+def _mercator_to_lnglat(x, y):
+	lng = x / _MERC_HALF * 180.0
+	lat = math.degrees(2 * math.atan(math.exp(y / _MERC_HALF * math.pi)) - math.pi / 2)
+	return lng, lat
+
+
+def _lnglat_to_mercator(lng, lat):
+	lat = max(min(lat, 85.0511287798), -85.0511287798)
+	x = lng / 180.0 * _MERC_HALF
+	y = math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) / math.pi * _MERC_HALF
+	return x, y
+
+
+def warp_pdf(pdf_path, content_hash=None, srs=None):
+	"""Warp page 1 of a GeoPDF, or return None if GDAL cannot open or georeference it.
+
+	Returns {"raster_path", "image_path", "bounds", "srs", "width"}; repeated calls for the
+	same file content reuse the cached output. Raises WarpError if GDAL fails while
+	warping a file it did georeference.
+	"""
+	srs = srs or warp_srs()
+	if srs is None:
+		return None
+	try:
+		from osgeo import gdal
+	except ImportError:
+		return None
+
+	content_hash = content_hash or file_sha256(pdf_path)
+	stem = os.path.join(WARP_DIR, f"{content_hash}.{srs.split(':')[1]}")
+	raster_path, image_path = stem + ".tif", stem + ".png"
+
+	# GDAL raises RuntimeError or returns None depending on its process-wide error
+	# mode, which is left as the host configured it; both are handled
+	with _locked(stem):
+		if not os.path.exists(image_path):
+			try:
+				src = gdal.OpenEx(pdf_path, open_options=[f"DPI={WARP_DPI}"])
+			except RuntimeError:
+				src = None
+			if src is None or not _needs_warp(src):
+				return None
+			os.makedirs(WARP_DIR, exist_ok=True)
+			# Per thread, like PdfStore.ensure_file: an evicted lock may let two callers in
+			tmp_tif = f"{raster_path}.{threading.get_ident()}.tmp"
+			tmp_png = f"{image_path}.{threading.get_ident()}.tmp"
+			try:
+				if not _warp_to_geotiff(gdal, src, tmp_tif, srs):
+					raise WarpError(f"gdalwarp failed for {pdf_path}")
+				os.replace(tmp_tif, raster_path)
+				# Translate streams block by block, so the PNG is never held in memory whole
+				if gdal.Translate(tmp_png, raster_path, format="PNG") is None:
+					raise WarpError(f"PNG export failed for {pdf_path}")
+				os.replace(tmp_png, image_path)
+			except RuntimeError as e:
+				raise WarpError(str(e)) from e
+			finally:
+				_remove_quietly(tmp_tif)
+				_remove_quietly(tmp_png)
+				_remove_quietly(tmp_png + ".aux.xml")
+		try:
+			ds = gdal.Open(raster_path)
+		except RuntimeError as e:
+			raise WarpError(str(e)) from e
+		if ds is None:
+			raise WarpError(f"Cannot open warped raster {raster_path}")
+		bounds = _bounds_wgs84(ds, srs)
+	return {
+		"raster_path": raster_path,
+		"image_path": image_path,
+		"bounds": bounds,
+		"srs": srs,
+		"width": ds.RasterXSize,
+	}
+
+
+def _warp_to_geotiff(gdal, src, tmp_path, srs):
+	"""Warp src into a tiled GeoTIFF with overviews at tmp_path; False if GDAL returns None."""
+	memory_mb = float(os.environ.get("CUTBLOCK_PDF_WARP_MEMORY_MB") or 64)
+	options = gdal.WarpOptions(
+		format="GTiff",
+		dstSRS=srs,
+		dstAlpha=True,
+		resampleAlg="bilinear",
+		warpMemoryLimit=memory_mb * 1024 * 1024,
+		multithread=True,
+		tps=src.GetGCPCount() >= 10 and not src.GetGeoTransform(can_return_null=True),
+		creationOptions=["TILED=YES", "BLOCKXSIZE=256", "BLOCKYSIZE=256", "COMPRESS=DEFLATE"],
+	)
+	out = gdal.Warp(tmp_path, src, options=options)
+	if out is None:
+		return False
+	# Overviews keep low-zoom tile reads from touching the full-resolution blocks
+	out.BuildOverviews("AVERAGE", OVERVIEW_LEVELS)
+	out = None
+	return True
+
+
+def read_tile(raster_path, srs, z, x, y):
+	"""RGBA (TILE_SIZE, TILE_SIZE, 4) array for XYZ tile z/x/y, or None if it misses the raster.
+
+	Only the raster window under the tile is read, resampled by GDAL straight to
+	the tile's pixel size (using overviews when zoomed out).
+	"""
+	from osgeo import gdal
+
+	ds = gdal.Open(raster_path)
+	gt = ds.GetGeoTransform()
+	west, south, east, north = tile_lnglat_bounds(z, x, y)
+	if srs == "EPSG:3857":
+		west, south = _lnglat_to_mercator(west, south)
+		east, north = _lnglat_to_mercator(east, north)
+
+	# Tile extent in fractional raster pixels
+	px0 = (west - gt[0]) / gt[1]
+	px1 = (east - gt[0]) / gt[1]
+	py0 = (north - gt[3]) / gt[5]
+	py1 = (south - gt[3]) / gt[5]
+	cx0, cy0 = max(int(math.floor(px0)), 0), max(int(math.floor(py0)), 0)
+	cx1 = min(int(math.ceil(px1)), ds.RasterXSize)
+	cy1 = min(int(math.ceil(py1)), ds.RasterYSize)
+	if cx1 <= cx0 or cy1 <= cy0:
+		return None
+
+	sx = TILE_SIZE / (px1 - px0)
+	sy = TILE_SIZE / (py1 - py0)
+	ox = max(int(round((cx0 - px0) * sx)), 0)
+	oy = max(int(round((cy0 - py0) * sy)), 0)
+	bw = max(min(int(round((cx1 - cx0) * sx)), TILE_SIZE - ox), 1)
+	bh = max(min(int(round((cy1 - cy0) * sy)), TILE_SIZE - oy), 1)
+	window = ds.ReadAsArray(
+		cx0, cy0, cx1 - cx0, cy1 - cy0,
+		buf_xsize=bw, buf_ysize=bh,
+		resample_alg=gdal.GRIORA_Bilinear,
+	)
+	tile = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+	bands = window if window.ndim == 3 else window[np.newaxis]
+	rgba = np.moveaxis(bands, 0, -1)
+	if rgba.shape[2] == 2:
+		# Grey + alpha
+		rgba = np.concatenate([rgba[..., :1].repeat(3, axis=2), rgba[..., 1:]], axis=2)
+	elif rgba.shape[2] == 1:
+		rgba = np.concatenate([rgba.repeat(3, axis=2), np.full_like(rgba, 255)], axis=2)
+	elif rgba.shape[2] == 3:
+		rgba = np.concatenate([rgba, np.full_like(rgba[..., :1], 255)], axis=2)
+	tile[oy:oy + bh, ox:ox + bw] = rgba[..., :4]
+	return tile
@@ -0,0 +1,396 @@
+"""Per-stage timings and sizes, exported as Prometheus histograms.
+
+Code marks a stage with `with stage("voronoi"):` (or @timed("voronoi")) and
+records sizes with observe("sample", "iterations", rounds). Observations go to
+the process-wide histograms, unless a Recording is active in the current
+context: then they are kept with it, so one request's stages can be reported in
+a Server-Timing header, and a split worker can ship its stages back to the
+server process (see run_recorded and merge) instead of losing them in a
+child process. Threads started inside a recorded call keep recording into it
+when their target is wrapped with propagate().
+
+A Recording can also sample the stacks of the threads that did its work into
+folded-stack counts ("frame;frame;frame count" lines, readable by speedscope
+and flamegraph.pl) for dumping when a request turns out slow. Configured from
+the environment:
+
+- CUTBLOCK_SERVER_TIMING: "1" adds a Server-Timing header to every response,
+  not only to requests sending "X-Server-Timing: 1"
+- CUTBLOCK_PROFILE_DIR: directory for profile dumps; requests may only ask for
+  profiling (with "X-Profile: 1" or "X-Profile: <ms>") when it is set
+- CUTBLOCK_PROFILE_SLOW_MS: default duration from which a profiled request is
+  dumped (default 1000)
+- CUTBLOCK_PROFILE_INTERVAL_MS: stack sampling interval (default 5)
+"""
+import bisect
+import contextvars
+import functools
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Seconds, from sub-millisecond clips to long PDF warps
+TIME_BUCKETS = (
+	0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+# Counts (iterations, vertices, samples, bytes): powers of four up to ~1e9
+SIZE_BUCKETS = tuple(4.0 ** i for i in range(16))
+# Leaf frames of a thread that is waiting rather than working
+IDLE_FRAMES = (("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"))
+
+
+class Histogram:
+	"""Thread-safe Prometheus histogram with a fixed label set."""
+
+	def __init__(self, name, help_text, label_names, buckets):
+		self.name = name
+		self.help = help_text
+		self.label_names = tuple(label_names)
+		self.buckets = tuple(sorted(buckets))
+		self._series = {}
+		self._lock = threading.Lock()
+
+	def observe(self, labels, value):
+		"""Add value for a tuple of label values (in label_names order)."""
+		i = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			series = self._series.get(labels)
+			if series is None:
+				series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+			series[0][i] += 1
+			series[1] += value
+			series[2] += 1
+
+	def render(self):
+		lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+		with self._lock:
+			series = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items())
+		for labels, (counts, total, count) in series:
+			base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+			sep = "," if base else ""
+			cumulative = 0
+			for bound, n in zip((*self.buckets, "+Inf"), counts):
+				cumulative += n
+				le = bound if bound == "+Inf" else f"{bound:g}"
+				lines.append(f'{self.name}_bucket{{{base}{sep}le="{le}"}} {cumulative}')
+			lines.append(f"{self.name}_sum{{{base}}} {total!r}")
+			lines.append(f"{self.name}_count{{{base}}} {count}")
+		return lines
+
+
+def _escape(value):
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+STAGE_SECONDS = Histogram(
+	"cutblock_stage_seconds", "Time spent in each processing stage.", ("stage",), TIME_BUCKETS
+)
+STAGE_SIZE = Histogram(
+	"cutblock_stage_size",
+	"Sizes handled by each processing stage (iterations, vertices, samples, bytes).",
+	("stage", "quantity"),
+	SIZE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+	"cutblock_request_seconds",
+	"HTTP request duration, until the last byte of the response.",
+	("method", "route", "status"),
+	TIME_BUCKETS,
+)
+HISTOGRAMS = (STAGE_SECONDS, STAGE_SIZE, REQUEST_SECONDS)
+
+
+def _publish(event):
+	stage_name, quantity, value = event
+	if quantity is None:
+		STAGE_SECONDS.observe((stage_name,), value)
+	else:
+		STAGE_SIZE.observe((stage_name, quantity), value)
+
+
+class StackSampler:
+	"""Counts the folded stacks of a set of threads, sampled every interval seconds."""
+
+	def __init__(self, interval, thread_ids):
+		self.interval = interval
+		self.thread_ids = thread_ids
+		self.stacks = Counter()
+		self.samples = 0
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+	def start(self):
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._stop.set()
+		self._thread.join()
+		return self.stacks
+
+	def _run(self):
+		prefix = f"{os.getpid()}/"
+		names = {}
+		while not self._stop.wait(self.interval):
+			frames = sys._current_frames()
+			self.samples += 1
+			for tid in list(self.thread_ids):
+				frame = frames.get(tid)
+				if frame is None:
+					continue
+				code = frame.f_code
+				if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+					continue
+				stack = []
+				while frame is not None:
+					code = frame.f_code
+					stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+					frame = frame.f_back
+				if tid not in names:
+					thread = next((t for t in threading.enumerate() if t.ident == tid), None)
+					names[tid] = prefix + (thread.name if thread is not None else str(tid))
+				stack.append(names[tid])
+				self.stacks[";".join(reversed(stack))] += 1
+
+
+class Recording:
+	"""Observations of one request or worker call, held back from the histograms.
+
+	finish() publishes them; anything observed afterwards (e.g. while a streamed
+	response is still being produced) goes straight to the histograms.
+	"""
+
+	def __init__(self, profile_interval=None):
+		self.events = []
+		self.closed = False
+		self.threads = {threading.get_ident()}
+		self.profile_interval = profile_interval
+		self.stacks = Counter()
+		self._lock = threading.Lock()
+		self._sampler = StackSampler(profile_interval, self.threads).start() if profile_interval else None
+
+	def add(self, event):
+		with self._lock:
+			if not self.closed:
+				self.events.append(event)
+				return
+		_publish(event)
+
+	def finish(self):
+		"""Stop sampling and publish every observation; returns the sampled stacks."""
+		if self._sampler is not None:
+			self.stacks.update(self._sampler.stop())
+			self._sampler = None
+		with self._lock:
+			if self.closed:
+				return self.stacks
+			self.closed = True
+			events = self.events
+		for event in events:
+			_publish(event)
+		return self.stacks
+
+	def export(self):
+		"""Picklable observations and stacks, for merge() in another process."""
+		if self._sampler is not None:
+			self.stacks.update(self._sampler.stop())
+			self._sampler = None
+		with self._lock:
+			self.closed = True
+			return {"events": list(self.events), "stacks": dict(self.stacks)}
+
+	def server_timing(self, total_seconds=None):
+		"""Server-Timing header value: each stage's summed duration, in the order stages first finished."""
+		totals = {}
+		with self._lock:
+			for stage_name, quantity, value in self.events:
+				if quantity is None:
+					seconds, count = totals.get(stage_name, (0.0, 0))
+					totals[stage_name] = (seconds + value, count + 1)
+		metrics = []
+		for stage_name, (seconds, count) in totals.items():
+			desc = f';desc="{count} calls"' if count > 1 else ""
+			metrics.append(f"{_token(stage_name)};dur={seconds * 1000:.2f}{desc}")
+		if total_seconds is not None:
+			metrics.append(f"total;dur={total_seconds * 1000:.2f}")
+		return ", ".join(metrics)
+
+
+def _token(name):
+	return re.sub(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]", "_", name)
+
+
+_current = contextvars.ContextVar("perf_recording", default=None)
+
+
+def current_recording():
+	return _current.get()
+
+
+def _record(event):
+	recording = _current.get()
+	if recording is None:
+		_publish(event)
+	else:
+		recording.add(event)
+
+
+def observe_seconds(stage_name, seconds):
+	"""Record a stage duration measured elsewhere (e.g. pdf_georef's timings)."""
+	_record((stage_name, None, float(seconds)))
+
+
+def observe(stage_name, quantity, value):
+	"""Record a size handled by a stage: iterations, vertices, samples, bytes..."""
+	_record((stage_name, quantity, float(value)))
+
+
+@contextmanager
+def stage(stage_name):
+	"""Time the block as stage_name (also when it raises)."""
+	recording = _current.get()
+	if recording is not None and recording.profile_interval:
+		recording.threads.add(threading.get_ident())
+	t = time.perf_counter()
+	try:
+		yield
+	finally:
+		_record((stage_name, None, time.perf_counter() - t))
+
+
+def timed(stage_name):
+	"""Decorator timing every call of a function as stage_name."""
+	def decorate(fn):
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			with stage(stage_name):
+				return fn(*args, **kwargs)
+		return wrapper
+	return decorate
+
+
+def propagate(fn):
+	"""fn bound to the caller's Recording, for running on another thread."""
+	recording = _current.get()
+	if recording is None:
+		return fn
+
+	def run(*args, **kwargs):
+		token = _current.set(recording)
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			_current.reset(token)
+	return run
+
+
+def start_recording(profile_interval=None):
+	"""Make a new Recording current in this context; returns (recording, token)."""
+	recording = Recording(profile_interval)
+	return recording, _current.set(recording)
+
+
+def stop_recording(token):
+	_current.reset(token)
+
+
+def run_recorded(fn, args, profile_interval=None):
+	"""Worker entrypoint: (fn(*args), exported Recording) with fn timed as its own stage."""
+	recording, token = start_recording(profile_interval)
+	try:
+		with stage(fn.__name__):
+			result = fn(*args)
+	finally:
+		stop_recording(token)
+	return result, recording.export()
+
+
+def merge(exported):
+	"""Record another process's or thread's exported observations here."""
+	recording = _current.get()
+	for event in exported["events"]:
+		_record(tuple(event))
+	if recording is not None and exported["stacks"]:
+		recording.stacks.update(exported["stacks"])
+
+
+def render(extra_lines=()):
+	"""Every histogram plus extra_lines in the Prometheus text exposition format."""
+	lines = []
+	for histogram in HISTOGRAMS:
+		lines.extend(histogram.render())
+	lines.extend(extra_lines)
+	return "\n".join(lines) + "\n"
+
+
+def gauge(name, help_text, value, metric_type="gauge"):
+	"""Exposition lines for a single unlabelled gauge or counter."""
+	return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value!r}"]
+
+
+def server_timing_forced():
+	return os.environ.get("CUTBLOCK_SERVER_TIMING", "") == "1"
+
+
+def profile_dir():
+	return os.environ.get("CUTBLOCK_PROFILE_DIR") or None
+
+
+def profile_interval():
+	return float(os.environ.get("CUTBLOCK_PROFILE_INTERVAL_MS") or 5) / 1000.0
+
+
+def profile_threshold(header):
+	"""Seconds from which a request asking for a profile with header is dumped, or None.
+
+	header is "1" (use CUTBLOCK_PROFILE_SLOW_MS) or a threshold in milliseconds.
+	"""
+	if not header or profile_dir() is None:
+		return None
+	header = header.strip()
+	if header == "1":
+		return float(os.environ.get("CUTBLOCK_PROFILE_SLOW_MS") or 1000) / 1000.0
+	try:
+		return max(float(header), 0.0) / 1000.0
+	except ValueError:
+		return None
+
+
+def profile_name(label):
+	"""Unique file name for a profile dump described by label."""
+	stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+	slug = re.sub(r"[^A-Za-z0-9_-]+", "_", label).strip("_")[:80]
+	return f"{stamp}-{slug}-{os.urandom(3).hex()}.folded"
+
+
+def write_profile(stacks, name):
+	"""Write folded stacks to CUTBLOCK_PROFILE_DIR under name (see profile_name)."""
+	root = profile_dir()
+	os.makedirs(root, exist_ok=True)
+	fd, tmp = tempfile.mkstemp(dir=root, suffix=".tmp")
+	with os.fdopen(fd, "w") as f:
+		for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+			f.write(f"{stack} {count}\n")
+	os.replace(tmp, os.path.join(root, name))
+
+
+def profile_path(name):
+	"""Path of a dumped profile, or None."""
+	root = profile_dir()
+	if root is None or not re.fullmatch(r"[A-Za-z0-9_-]+\.folded", name or ""):
+		return None
+	path = os.path.join(root, name)
+	return path if os.path.exists(path) else None
+
+
+def list_profiles(limit=100):
+	root = profile_dir()
+	if root is None or not os.path.isdir(root):
+		return []
+	names = sorted((n for n in os.listdir(root) if n.endswith(".folded")), reverse=True)
+	return [{"name": n, "bytes": os.path.getsize(os.path.join(root, n))} for n in names[:limit]]
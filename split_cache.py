@@ -0,0 +1,172 @@
+"""Content-addressed cache for polygon split results.
+
+Results are keyed on a canonical hash of the input ring plus every option that
+changes the output, held in a size-capped in-memory LRU and optionally written
+to an on-disk tier that survives restarts. Configured from the environment:
+
+- CUTBLOCK_SPLIT_CACHE_MB: in-memory budget in megabytes (default 64, 0 disables)
+- CUTBLOCK_SPLIT_CACHE_DIR: directory for the on-disk tier (default: none)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Splitters whose output does not depend on a random seed
+DETERMINISTIC_MODES = ("vertical", "horizontal", "radial", "recursive")
+# Bumped when cached results change shape or meaning, so old disk entries are ignored
+KEY_VERSION = 5
+
+
+def canonical_ring(polygon_coords, decimals=10):
+	"""Ring as an (n, 2) array independent of closing point, start vertex and winding."""
+	ring = np.round(np.asarray(polygon_coords, dtype=float)[:, :2], decimals) + 0.0
+	if ring.shape[0] > 1 and np.array_equal(ring[0], ring[-1]):
+		ring = ring[:-1]
+	# Counter-clockwise (positive shoelace area)
+	x, y = ring[:, 0], ring[:, 1]
+	if np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y) < 0:
+		ring = ring[::-1]
+	start = np.lexsort((ring[:, 1], ring[:, 0]))[0]
+	return np.roll(ring, -start, axis=0)
+
+
+def split_cache_key(
+	polygon_coords, mode, n_parts, area_tolerance=0.05, seed=None, sampling="random", simplify_tolerance=0.0,
+	constraints=None,
+):
+	"""Hex digest identifying a split request, or None if its result is not reproducible.
+
+	K-means splits are reproducible only for an explicit seed.
+	"""
+	if mode in DETERMINISTIC_MODES:
+		# These engines ignore the seed and sampling method
+		seed, sampling = None, None
+	elif seed is None:
+		return None
+	h = hashlib.sha256(canonical_ring(polygon_coords).tobytes())
+	params = [
+		KEY_VERSION, mode, int(n_parts), round(float(area_tolerance), 12), seed, sampling,
+		round(float(simplify_tolerance), 9), constraints,
+	]
+	h.update(json.dumps(params).encode())
+	return h.hexdigest()
+
+
+class SplitCache:
+	"""Thread-safe LRU of JSON-encoded results, capped by total encoded size."""
+
+	def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None):
+		self.max_bytes = int(max_bytes)
+		self.disk_dir = disk_dir
+		self._entries = OrderedDict()
+		self._bytes = 0
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+		self.evictions = 0
+		if disk_dir:
+			os.makedirs(disk_dir, exist_ok=True)
+
+	def _disk_path(self, key):
+		return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+	def get(self, key):
+		"""Cached value for key, or None."""
+		with self._lock:
+			blob = self._entries.get(key)
+			if blob is not None:
+				self._entries.move_to_end(key)
+				self.hits += 1
+				return json.loads(blob)
+		blob = self._read_disk(key)
+		with self._lock:
+			if blob is None:
+				self.misses += 1
+				return None
+			self.disk_hits += 1
+			self._store(key, blob)
+		return json.loads(blob)
+
+	def put(self, key, value):
+		blob = json.dumps(value, separators=(",", ":")).encode()
+		with self._lock:
+			self._store(key, blob)
+		self._write_disk(key, blob)
+
+	def _store(self, key, blob):
+		if len(blob) > self.max_bytes:
+			return
+		old = self._entries.pop(key, None)
+		if old is not None:
+			self._bytes -= len(old)
+		self._entries[key] = blob
+		self._bytes += len(blob)
+		while self._bytes > self.max_bytes:
+			_, evicted = self._entries.popitem(last=False)
+			self._bytes -= len(evicted)
+			self.evictions += 1
+
+	def _read_disk(self, key):
+		if not self.disk_dir:
+			return None
+		try:
+			with open(self._disk_path(key), "rb") as f:
+				return f.read()
+		except OSError:
+			return None
+
+	def _write_disk(self, key, blob):
+		if not self.disk_dir:
+			return
+		path = self._disk_path(key)
+		try:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			# Write-then-rename so readers never see a partial file
+			fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+			with os.fdopen(fd, "wb") as f:
+				f.write(blob)
+			os.replace(tmp, path)
+		except OSError:
+			pass
+
+	def stats(self):
+		with self._lock:
+			lookups = self.hits + self.disk_hits + self.misses
+			return {
+				"entries": len(self._entries),
+				"bytes": self._bytes,
+				"max_bytes": self.max_bytes,
+				"hits": self.hits,
+				"disk_hits": self.disk_hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+				"disk_dir": self.disk_dir,
+			}
+
+	def clear(self):
+		"""Drop the in-memory tier (the disk tier is left in place)."""
+		with self._lock:
+			self._entries.clear()
+			self._bytes = 0
+
+
+_split_cache = None
+
+
+def get_split_cache():
+	"""Shared split cache configured from the environment."""
+	global _split_cache
+	if _split_cache is None:
+		mb = float(os.environ.get("CUTBLOCK_SPLIT_CACHE_MB") or 64)
+		_split_cache = SplitCache(
+			max_bytes=int(mb * 1024 * 1024),
+			disk_dir=os.environ.get("CUTBLOCK_SPLIT_CACHE_DIR") or None,
+		)
+	return _split_cache
@@ -0,0 +1,232 @@
+"""Wire formats for split results, chosen by the request's Accept header.
+
+Split workers return parts as one (n, 2) coordinate array plus ring offsets, so
+every encoding below is built from NumPy arrays with no per-vertex Python
+objects:
+
+- application/json (default): {"polygons": [[[lat, lng], ...], ...], "areas_ha", "seed"}
+  plus "holes": [{"part", "ring"}, ...] when parts have holes
+- application/vnd.cutblock.rings-f64 / -f32: little-endian binary (see encode_rings)
+- application/wkb: one WKB MultiPolygon in lng/lat order
+- application/vnd.cutblock.polyline+json: {"polylines": [...], "areas_ha", "seed"}
+  using the Google encoded polyline algorithm (lat/lng, 1e-5 precision), plus
+  "holes": [{"part", "polyline"}, ...] when parts have holes
+
+Parts only have holes when exclusions inside them were removed (see
+constraint_layers); without holes every format is unchanged. Likewise a part
+only has several polygons when it spans a gap in the net area: each polygon is
+then listed (with its own area) and "part_of" gives the part index of each one.
+
+Binary formats carry the seed in an X-Split-Seed header, and constraint-layer
+splits their "excluded_features" and "net_area_ha" in X-Excluded-Features and
+X-Net-Area-Ha, and "part_of" as a comma-separated X-Part-Of.
+"""
+import base64
+import struct
+
+import numpy as np
+import shapely
+
+JSON = "application/json"
+RINGS_F64 = "application/vnd.cutblock.rings-f64"
+RINGS_F32 = "application/vnd.cutblock.rings-f32"
+WKB = "application/wkb"
+POLYLINE = "application/vnd.cutblock.polyline+json"
+MEDIA_TYPES = (JSON, RINGS_F64, RINGS_F32, WKB, POLYLINE)
+# Constraint-layer summary fields, sent as headers with binary formats
+SUMMARY_FIELDS = {"excluded_features": "X-Excluded-Features", "net_area_ha": "X-Net-Area-Ha"}
+
+
+def negotiate(accept):
+	"""Best supported media type for an Accept header (JSON when nothing matches)."""
+	best, best_q = JSON, 0.0
+	for part in (accept or "").split(","):
+		fields = [f.strip() for f in part.split(";")]
+		media = fields[0].lower()
+		q = 1.0
+		for param in fields[1:]:
+			if param.startswith("q="):
+				try:
+					q = float(param[2:])
+				except ValueError:
+					q = 0.0
+		if media in MEDIA_TYPES and q > best_q:
+			best, best_q = media, q
+	return best
+
+
+def _pack(rings):
+	coords, index = shapely.get_coordinates(rings, return_index=True)
+	counts = np.bincount(index, minlength=len(rings))
+	offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+	return {"coords": np.ascontiguousarray(coords[:, ::-1]), "offsets": offsets}
+
+
+def pack_rings(polys):
+	"""Exterior rings of lng/lat polygons as {"coords": (n, 2) [lat, lng], "offsets"}.
+
+	Interior rings, if any, go under "holes" in the same layout plus "parts", the
+	index of the polygon each hole belongs to.
+	"""
+	polys = np.asarray(polys, dtype=object)
+	packed = _pack(shapely.get_exterior_ring(polys))
+	n_holes = shapely.get_num_interior_rings(polys)
+	if n_holes.sum() > 0:
+		parts = np.repeat(np.arange(len(polys)), n_holes)
+		index = np.arange(len(parts)) - np.repeat(np.cumsum(n_holes) - n_holes, n_holes)
+		packed["holes"] = _pack(shapely.get_interior_ring(polys[parts], index))
+		packed["holes"]["parts"] = parts.astype(np.int64)
+	return packed
+
+
+def _rings_cacheable(rings):
+	return {
+		"coords": base64.b64encode(np.ascontiguousarray(rings["coords"], dtype="<f8").tobytes()).decode(),
+		"offsets": rings["offsets"].tolist(),
+	}
+
+
+def _rings_from_cacheable(value):
+	return {
+		"coords": np.frombuffer(base64.b64decode(value["coords"]), dtype="<f8").reshape(-1, 2),
+		"offsets": np.asarray(value["offsets"], dtype=np.int64),
+	}
+
+
+def to_cacheable(result):
+	"""JSON-safe form of a packed result for the split cache."""
+	value = {**result, **_rings_cacheable(result)}
+	if "holes" in result:
+		value["holes"] = {**_rings_cacheable(result["holes"]), "parts": result["holes"]["parts"].tolist()}
+	return value
+
+
+def from_cacheable(value):
+	result = {**value, **_rings_from_cacheable(value)}
+	if "holes" in value:
+		result["holes"] = {
+			**_rings_from_cacheable(value["holes"]),
+			"parts": np.asarray(value["holes"]["parts"], dtype=np.int64),
+		}
+	return result
+
+
+def _ring_lists(rings):
+	coords, offsets = rings["coords"], rings["offsets"]
+	return [coords[a:b].tolist() for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def polygons_json(result):
+	"""[[[lat, lng], ...], ...] lists for the JSON format."""
+	return _ring_lists(result)
+
+
+def holes_json(result):
+	"""[{"part", "ring": [[lat, lng], ...]}, ...] for the JSON format (empty without holes)."""
+	holes = result.get("holes")
+	if holes is None:
+		return []
+	return [{"part": int(p), "ring": ring} for p, ring in zip(holes["parts"], _ring_lists(holes))]
+
+
+def encode_rings(result, dtype="<f8"):
+	"""Binary rings: uint32 part count, uint32 coordinate count, uint32 offsets
+	(parts + 1), float64 areas in hectares (parts), then [lat, lng] pairs as dtype.
+
+	Results with holes append a trailer: uint32 hole count, uint32 hole coordinate
+	count, uint32 offsets (holes + 1), uint32 part index per hole, then the hole
+	[lat, lng] pairs as dtype.
+	"""
+	offsets = result["offsets"]
+	n_parts = len(offsets) - 1
+	chunks = [
+		struct.pack("<II", n_parts, int(offsets[-1])),
+		offsets.astype("<u4").tobytes(),
+		np.asarray(result["areas_ha"], dtype="<f8").tobytes(),
+		np.ascontiguousarray(result["coords"], dtype=dtype).tobytes(),
+	]
+	holes = result.get("holes")
+	if holes is not None:
+		chunks += [
+			struct.pack("<II", len(holes["parts"]), int(holes["offsets"][-1])),
+			holes["offsets"].astype("<u4").tobytes(),
+			holes["parts"].astype("<u4").tobytes(),
+			np.ascontiguousarray(holes["coords"], dtype=dtype).tobytes(),
+		]
+	return b"".join(chunks)
+
+
+def _linearrings(rings):
+	coords, offsets = rings["coords"], rings["offsets"]
+	index = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+	return shapely.linearrings(coords[:, ::-1], indices=index)
+
+
+def encode_wkb(result):
+	shells = _linearrings(result)
+	holes = result.get("holes")
+	if holes is None:
+		return shapely.to_wkb(shapely.multipolygons(shapely.polygons(shells)))
+	# Each polygon's shell followed by its holes, grouped by part index
+	rings = np.concatenate([shells, _linearrings(holes)])
+	parts = np.concatenate([np.arange(len(shells)), holes["parts"]])
+	order = np.argsort(parts, kind="stable")
+	polys = shapely.polygons(rings[order], indices=parts[order])
+	return shapely.to_wkb(shapely.multipolygons(polys))
+
+
+def encode_polylines(result, precision=5):
+	"""Google encoded polyline string per ring of packed rings, vectorized over all vertices."""
+	coords, offsets = result["coords"], result["offsets"]
+	if len(coords) == 0:
+		return []
+	scaled = np.round(coords * 10 ** precision).astype(np.int64)
+	deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+	# Each ring restarts from (0, 0)
+	starts = offsets[:-1][np.diff(offsets) > 0]
+	deltas[starts] = scaled[starts]
+	values = deltas.ravel()
+	zigzag = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+	shifts = np.arange(0, 65, 5, dtype=np.uint64)
+	chunks = (zigzag[:, None] >> shifts) & np.uint64(31)
+	n_chunks = np.maximum((zigzag[:, None] >> shifts).astype(bool).sum(axis=1), 1)
+	used = np.arange(len(shifts)) < n_chunks[:, None]
+	more = np.arange(len(shifts)) < (n_chunks - 1)[:, None]
+	chars = (chunks | (more.astype(np.uint64) << np.uint64(5))) + np.uint64(63)
+	text = chars[used].astype(np.uint8).tobytes().decode("ascii")
+
+	# Character offsets of each ring: two values per vertex
+	value_ends = np.cumsum(n_chunks)
+	char_offsets = np.concatenate([[0], value_ends])[offsets * 2]
+	return [text[a:b] for a, b in zip(char_offsets[:-1], char_offsets[1:])]
+
+
+def encode(result, media_type, seed):
+	"""(body, media_type, headers) for a packed split result; body is a dict for JSON types."""
+	headers = {"X-Split-Seed": str(seed), "Vary": "Accept"}
+	summary = {k: result[k] for k in SUMMARY_FIELDS if k in result}
+	if media_type in (RINGS_F64, RINGS_F32, WKB):
+		headers.update({SUMMARY_FIELDS[k]: str(v) for k, v in summary.items()})
+		if "part_of" in result:
+			headers["X-Part-Of"] = ",".join(map(str, result["part_of"]))
+	if "part_of" in result:
+		summary["part_of"] = result["part_of"]
+	if media_type == RINGS_F64:
+		return encode_rings(result, "<f8"), media_type, headers
+	if media_type == RINGS_F32:
+		return encode_rings(result, "<f4"), media_type, headers
+	if media_type == WKB:
+		return encode_wkb(result), media_type, headers
+	if media_type == POLYLINE:
+		body = {"polylines": encode_polylines(result), "areas_ha": result["areas_ha"], "seed": seed, **summary}
+		if "holes" in result:
+			body["holes"] = [
+				{"part": int(p), "polyline": line}
+				for p, line in zip(result["holes"]["parts"], encode_polylines(result["holes"]))
+			]
+		return body, media_type, headers
+	body = {"polygons": polygons_json(result), "areas_ha": result["areas_ha"], "seed": seed, **summary}
+	if "holes" in result:
+		body["holes"] = holes_json(result)
+	return body, JSON, headers
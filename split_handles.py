@@ -0,0 +1,97 @@
+"""Short-lived prepared blocks for interactive re-splitting.
+
+POST /prepared-polygons projects, repairs and prepares a ring once (see
+split_workers.prepare_block) and keeps the result under a random id; splits by
+that id at any part count or mode reuse its samples and area profiles.
+Handles expire after a period without use and the least recently used ones are
+dropped beyond a size limit. Configured from the environment:
+
+- CUTBLOCK_SPLIT_HANDLE_TTL: seconds a handle lives after its last use (default 600)
+- CUTBLOCK_SPLIT_HANDLE_MAX: handles kept at once (default 128)
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class SplitHandle:
+	def __init__(self, handle_id, ring, block, seed, sampling, constraints):
+		self.id = handle_id
+		self.ring = ring
+		self.block = block
+		self.seed = seed
+		self.sampling = sampling
+		self.constraints = constraints
+		self.last_used = time.monotonic()
+
+
+class HandleStore:
+	"""Thread-safe LRU of SplitHandles with a sliding time-to-live."""
+
+	def __init__(self, ttl=600.0, max_handles=128):
+		self.ttl = float(ttl)
+		self.max_handles = max(1, int(max_handles))
+		self._handles = OrderedDict()
+		self._lock = threading.Lock()
+		self.expired = 0
+		self.evictions = 0
+
+	def put(self, ring, block, seed, sampling, constraints=None):
+		handle = SplitHandle(secrets.token_hex(16), ring, block, seed, sampling, constraints)
+		with self._lock:
+			self._expire()
+			self._handles[handle.id] = handle
+			while len(self._handles) > self.max_handles:
+				self._handles.popitem(last=False)
+				self.evictions += 1
+		return handle
+
+	def get(self, handle_id):
+		"""The live handle for handle_id (renewing its time-to-live), or None."""
+		with self._lock:
+			self._expire()
+			handle = self._handles.get(handle_id)
+			if handle is not None:
+				handle.last_used = time.monotonic()
+				self._handles.move_to_end(handle_id)
+			return handle
+
+	def delete(self, handle_id):
+		with self._lock:
+			return self._handles.pop(handle_id, None) is not None
+
+	def _expire(self):
+		# Oldest first, so stop at the first handle still in date
+		cutoff = time.monotonic() - self.ttl
+		while self._handles:
+			handle = next(iter(self._handles.values()))
+			if handle.last_used > cutoff:
+				break
+			self._handles.popitem(last=False)
+			self.expired += 1
+
+	def stats(self):
+		with self._lock:
+			self._expire()
+			return {
+				"handles": len(self._handles),
+				"max_handles": self.max_handles,
+				"ttl": self.ttl,
+				"expired": self.expired,
+				"evictions": self.evictions,
+			}
+
+
+_handle_store = None
+
+
+def get_handle_store():
+	global _handle_store
+	if _handle_store is None:
+		_handle_store = HandleStore(
+			ttl=float(os.environ.get("CUTBLOCK_SPLIT_HANDLE_TTL") or 600),
+			max_handles=int(os.environ.get("CUTBLOCK_SPLIT_HANDLE_MAX") or 128),
+		)
+	return _handle_store
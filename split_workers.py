@@ -0,0 +1,275 @@
+"""Bounded worker pool that keeps CPU-bound polygon splits off the event loop.
+
+Configured from the environment:
+
+- CUTBLOCK_SPLIT_BACKEND: "process" (default) or "thread"
+- CUTBLOCK_SPLIT_WORKERS: max concurrent splits (default: number of cores)
+- CUTBLOCK_SPLIT_MAX_QUEUE: splits allowed to wait for a worker before new ones
+  are rejected (default: 4 per worker)
+- CUTBLOCK_SPLIT_TIMEOUT: seconds a request waits for its split (default 60, 0 = none)
+- CUTBLOCK_KMEANS_RESTART_WORKERS: threads per k-means split used to evaluate
+  equal-area restarts concurrently (default 1, i.e. serial)
+- CUTBLOCK_RECURSIVE_WORKERS: threads per recursive split used to bisect the
+  independent pieces of each level concurrently (default 1, i.e. serial)
+- CUTBLOCK_SPLIT_HANDLE_WORKERS: threads that prepare and split prepared-polygon
+  handles under the process backend (default: CUTBLOCK_SPLIT_WORKERS)
+
+sklearn is only imported by the first k-means split; SplitExecutor.warm_up
+loads it ahead of time. SplitExecutor.run records each call's stages in the
+worker and merges them into this process's perf_metrics histograms (and the
+calling request's Server-Timing and profile, if it asked for them).
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import shapely
+from shapely.geometry import Polygon
+
+from constraint_layers import get_constraint_store
+from geo_projection import area_hectares, geometries_to_local, polygons_to_lnglat, ring_to_local
+from geom_manipulation import PreparedPolygon, split_polygon_by_mode
+from perf_metrics import current_recording, merge, observe, observe_seconds, run_recorded, stage
+from split_formats import pack_rings
+
+BACKENDS = ("process", "thread")
+
+
+class SplitPoolSaturated(Exception):
+	"""Raised when every worker is busy and the wait queue is full."""
+
+
+def _env_int(name, default):
+	value = os.environ.get(name)
+	return int(value) if value not in (None, "") else default
+
+
+def _env_float(name, default):
+	value = os.environ.get(name)
+	return float(value) if value not in (None, "") else default
+
+
+class SplitExecutor:
+	"""Thread or process pool with a queue-depth limit and per-call timeout.
+
+	At most max_workers splits run at once and at most max_queue more wait for a
+	worker; submitting beyond that raises SplitPoolSaturated so the caller can shed
+	load instead of letting latency grow without bound. Work that outlives its
+	timeout keeps its slot until it actually finishes.
+	"""
+
+	def __init__(self, backend="process", max_workers=None, max_queue=None, timeout=None):
+		if backend not in BACKENDS:
+			raise ValueError(f"Unknown split backend: {backend!r}")
+		self.backend = backend
+		self.max_workers = max(1, int(max_workers or os.cpu_count() or 1))
+		self.max_queue = max(0, int(self.max_workers * 4 if max_queue is None else max_queue))
+		self.timeout = timeout if timeout and timeout > 0 else None
+		self._executor = None
+		self._in_flight = 0
+		self._lock = threading.Lock()
+
+	@property
+	def in_flight(self):
+		return self._in_flight
+
+	@property
+	def capacity(self):
+		return self.max_workers + self.max_queue
+
+	def _get_executor(self):
+		if self._executor is None:
+			if self.backend == "process":
+				self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+			else:
+				self._executor = ThreadPoolExecutor(
+					max_workers=self.max_workers, thread_name_prefix="split"
+				)
+		return self._executor
+
+	def _release(self, _future):
+		with self._lock:
+			self._in_flight -= 1
+
+	def submit(self, fn, *args):
+		"""Submit fn(*args) and return a concurrent.futures.Future."""
+		with self._lock:
+			if self._in_flight >= self.capacity:
+				raise SplitPoolSaturated(
+					f"{self._in_flight} splits in flight (limit {self.capacity})"
+				)
+			self._in_flight += 1
+		try:
+			future = self._get_executor().submit(fn, *args)
+		except BaseException:
+			self._release(None)
+			raise
+		future.add_done_callback(self._release)
+		return future
+
+	async def run(self, fn, *args, timeout=None):
+		"""Await fn(*args) in the pool; raises asyncio.TimeoutError after the timeout.
+
+		The whole call, queueing and pickling included, is recorded as the
+		"split_pool" stage.
+		"""
+		recording = current_recording()
+		profile_interval = recording.profile_interval if recording is not None else None
+		t = time.perf_counter()
+		future = self.submit(run_recorded, fn, args, profile_interval)
+		try:
+			result, recorded = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+		except BrokenProcessPool:
+			self.reset()
+			raise
+		except asyncio.TimeoutError:
+			# Only drops work that has not started; running splits finish in the background
+			future.cancel()
+			raise
+		observe_seconds("split_pool", time.perf_counter() - t)
+		merge(recorded)
+		return result
+
+	async def warm_up(self):
+		"""Start every worker and load the splitters' lazy dependencies in it.
+
+		Workers import them themselves: importing in this process from another
+		thread while the pool forks can leave a child stuck on the import lock.
+		"""
+		await asyncio.gather(*(self.run(warm_worker) for _ in range(self.max_workers)))
+
+	def reset(self):
+		"""Drop a broken pool (e.g. a worker was killed) so the next call starts fresh."""
+		executor, self._executor = self._executor, None
+		if executor is not None:
+			executor.shutdown(wait=False, cancel_futures=True)
+
+	def shutdown(self):
+		self.reset()
+
+
+_split_executor = None
+_handle_executor = None
+
+
+def get_split_executor():
+	"""Shared executor for split requests, configured from the environment."""
+	global _split_executor
+	if _split_executor is None:
+		_split_executor = SplitExecutor(
+			backend=os.environ.get("CUTBLOCK_SPLIT_BACKEND", "process").lower(),
+			max_workers=_env_int("CUTBLOCK_SPLIT_WORKERS", None),
+			max_queue=_env_int("CUTBLOCK_SPLIT_MAX_QUEUE", None),
+			timeout=_env_float("CUTBLOCK_SPLIT_TIMEOUT", 60.0),
+		)
+	return _split_executor
+
+
+def get_handle_executor():
+	"""Executor for preparing and splitting prepared-polygon handles.
+
+	Handles live in this process. Under the process backend their splits run on
+	threads here instead, since each call to a worker would pickle the block's
+	samples, profiles and rotated geometries; under the thread backend this is
+	the shared split executor.
+	"""
+	global _handle_executor
+	split_executor = get_split_executor()
+	if split_executor.backend == "thread":
+		return split_executor
+	if _handle_executor is None:
+		workers = _env_int("CUTBLOCK_SPLIT_HANDLE_WORKERS", split_executor.max_workers)
+		_handle_executor = SplitExecutor(
+			backend="thread",
+			max_workers=workers,
+			max_queue=_env_int("CUTBLOCK_SPLIT_MAX_QUEUE", None),
+			timeout=split_executor.timeout,
+		)
+	return _handle_executor
+
+
+def shutdown_pools():
+	global _split_executor, _handle_executor
+	executors = (_split_executor, _handle_executor)
+	_split_executor = _handle_executor = None
+	for executor in executors:
+		if executor is not None:
+			executor.shutdown()
+
+
+def warm_worker():
+	"""Import what the first k-means split would; returns the worker's pid."""
+	import sklearn.cluster  # noqa: F401
+
+	return os.getpid()
+
+
+def prepare_block(polygon_coords, constraints=None, precompute=False, seed=None, sampling="random"):
+	"""Project one [lng, lat] ring to metres and remove any constraint-layer features.
+
+	Returns a picklable dict: "prepared" (a PreparedPolygon in the ring's UTM
+	zone), "epsg" and, for a constraint layer, "excluded_features" and
+	"net_area_ha". precompute=True also fills the PreparedPolygon's caches for
+	seed and sampling, so later splits of the block skip that work.
+	"""
+	local_ring, epsg = ring_to_local(polygon_coords)
+	block = {"epsg": epsg}
+	geom = local_ring
+	if constraints:
+		layer = get_constraint_store().get(constraints)
+		if layer is None:
+			raise ValueError(f"Unknown constraint layer: {constraints}")
+		with stage("constraints"):
+			hits = layer.intersecting(Polygon(polygon_coords).buffer(0))
+			geom = Polygon(local_ring).buffer(0)
+			if len(hits):
+				geom = geom.difference(shapely.union_all(geometries_to_local(hits, epsg)))
+		observe("constraints", "features", len(hits))
+		block["excluded_features"] = len(hits)
+		block["net_area_ha"] = round(sum(area_hectares(polygons_to_lnglat([geom], epsg))), 4)
+	block["prepared"] = PreparedPolygon(geom)
+	if precompute:
+		with stage("precompute"):
+			block["prepared"].precompute(seed=seed, sampling=sampling)
+	return block
+
+
+def split_block(block, mode, n_parts, options=None):
+	"""Split a prepare_block result; see split_to_latlng for the result layout."""
+	options = {k: v for k, v in (options or {}).items() if k != "constraints"}
+	polys = split_polygon_by_mode(
+		block["prepared"], mode, n_parts,
+		restart_workers=_env_int("CUTBLOCK_KMEANS_RESTART_WORKERS", 1),
+		recursive_workers=_env_int("CUTBLOCK_RECURSIVE_WORKERS", 1),
+		**options
+	)
+	polys = polygons_to_lnglat(polys, block["epsg"])
+	# Parts spanning a gap in net area are MultiPolygons; send one entry per polygon
+	flat, part_of = shapely.get_parts(polys, return_index=True)
+	result = pack_rings(flat)
+	result["areas_ha"] = [round(a, 4) for a in area_hectares(flat)]
+	if len(flat) > len(polys):
+		result["part_of"] = part_of.tolist()
+	for key in ("excluded_features", "net_area_ha"):
+		if key in block:
+			result[key] = block[key]
+	return result
+
+
+def split_to_latlng(polygon_coords, mode, n_parts, options=None):
+	"""Worker entrypoint: split one [lng, lat] ring in metres and return picklable results.
+
+	The ring is split in its local UTM zone so equal-area targets are true areas.
+	Returns split_formats.pack_rings output ([lat, lng] coordinate array and ring
+	offsets) plus "areas_ha", the geodesic polygon areas, and "part_of" (the part
+	index of each polygon) when a part has several polygons.
+	options are passed to split_polygon_by_mode (sampling, area_tolerance, seed),
+	except "constraints": the id of a constraint layer whose features are removed
+	from the block first, so parts share out the net harvestable area. Results
+	then also carry "excluded_features" and "net_area_ha".
+	"""
+	block = prepare_block(polygon_coords, (options or {}).get("constraints"))
+	return split_block(block, mode, n_parts, options)
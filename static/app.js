@@ -433,7 +433,7 @@
           if (state.pdfOverlay) state.map.removeLayer(state.pdfOverlay);
 
           var imgPath = fileInput.files[0].name + ".png";
-          var imageUrl = "/static/pdf_uploads/" + imgPath;
+          var imageUrl = data.image_url || "/static/pdf_uploads/" + imgPath;
 
           // Option 1: SW/NE bounds
           if (swParsed && neParsed) {
@@ -0,0 +1,34 @@
+"""Sweep-line axis splits must cover the block like the bisection reference engine."""
+import pytest
+import shapely
+from shapely.geometry import Polygon
+
+from benchmarks.fixtures import make_fixture
+from geom_manipulation import horizontal_split_polygon, vertical_split_polygon
+
+
+@pytest.mark.parametrize("fixture", ["concave", "holes"])
+@pytest.mark.parametrize("split", [vertical_split_polygon, horizontal_split_polygon])
+@pytest.mark.parametrize("n_parts", [5, 13])
+def test_sweep_parts_cover_input(fixture, split, n_parts):
+	poly = make_fixture(fixture, 1000).buffer(0)
+	sweep = split(poly, n_parts, engine="sweep")
+	bisection = split(poly, n_parts, engine="bisection")
+
+	assert len(sweep) == n_parts
+	assert all(p.geom_type == "Polygon" for p in sweep)
+	covered = shapely.union_all(sweep).area
+	assert covered == pytest.approx(poly.area, rel=1e-6)
+	assert sum(p.area for p in sweep) == pytest.approx(covered, rel=1e-6)
+	assert covered >= shapely.union_all(bisection).area * (1 - 1e-6)
+
+
+def test_near_flat_edges_do_not_skew_cuts():
+	# Clipping leaves the bottom edge a few 1e-14 off horizontal
+	poly = Polygon([
+		(2.8e-14, 2.1e-14), (2.8e-14, 100.0), (172.4255813953, 99.99999999999999), (127.7744186046, 1.4e-14),
+	])
+	for split in (vertical_split_polygon, horizontal_split_polygon):
+		for n_parts in (2, 3):
+			parts = split(poly, n_parts)
+			assert [p.area for p in parts] == pytest.approx([poly.area / n_parts] * n_parts, rel=1e-9)
@@ -0,0 +1,77 @@
+"""A k-means split is fully determined by its seed; unseeded splits skip the cache."""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.fixtures import make_fixture
+from geom_manipulation import equal_area_kmeans_split_polygon, kmeans_split_polygon
+from perf_metrics import start_recording, stop_recording
+from split_cache import get_split_cache
+from split_workers import split_to_latlng
+
+
+def _wkb(parts):
+	return [p.wkb for p in parts]
+
+
+@pytest.mark.parametrize("sampling", ["random", "sobol"])
+def test_same_seed_same_parts(sampling):
+	poly = make_fixture("concave", 200)
+	first = kmeans_split_polygon(poly, 5, sampling=sampling, seed=1234)
+	again = kmeans_split_polygon(poly, 5, sampling=sampling, seed=1234)
+	assert len(first) == 5
+	assert _wkb(first) == _wkb(again)
+
+
+def test_parallel_restarts_match_serial():
+	poly = make_fixture("holes", 300)
+	serial = equal_area_kmeans_split_polygon(poly, 6, seed=7, area_tolerance=0.0)
+	parallel = equal_area_kmeans_split_polygon(poly, 6, seed=7, area_tolerance=0.0, restart_workers=3)
+	assert _wkb(serial) == _wkb(parallel)
+
+
+@pytest.mark.parametrize("area_tolerance", [0.0, 0.5])
+def test_restarts_recorded(area_tolerance):
+	recording, token = start_recording()
+	try:
+		equal_area_kmeans_split_polygon(make_fixture("holes", 300), 6, seed=7, area_tolerance=area_tolerance)
+	finally:
+		stop_recording(token)
+	restart_times = [e for e in recording.events if e[:2] == ("kmeans_restart", None)]
+	sizes = {quantity: value for name, quantity, value in recording.events if name == "kmeans"}
+	assert len(restart_times) == sizes["restarts"]
+	if area_tolerance:
+		assert sizes["winner"] == 1 and "missed" not in sizes
+	else:
+		assert sizes["missed"] == 1 and "winner" not in sizes
+
+
+def test_worker_output_reproducible():
+	ring = [list(c) for c in make_fixture("real", 100).exterior.coords]
+	options = {"seed": 99, "sampling": "random", "area_tolerance": 0.05}
+	first = split_to_latlng(ring, "kmeans", 4, options)
+	again = split_to_latlng(ring, "kmeans", 4, options)
+	assert np.array_equal(first["coords"], again["coords"])
+	assert first["areas_ha"] == again["areas_ha"]
+
+
+def test_unseeded_kmeans_splits_are_not_cached(monkeypatch):
+	monkeypatch.setenv("CUTBLOCK_SPLIT_BACKEND", "thread")
+	cache = get_split_cache()
+	cache.clear()
+	ring = [list(c) for c in make_fixture("convex", 40).exterior.coords]
+	client = TestClient(main.app)
+
+	unseeded = []
+	for _ in range(2):
+		response = client.post("/split-polygon", json={"coords": ring, "mode": "kmeans", "n_clusters": 3})
+		assert response.status_code == 200
+		unseeded.append(response.json())
+	assert cache.stats()["entries"] == 0
+
+	# The reported seed regenerates the layout, which is then cached
+	body = {"coords": ring, "mode": "kmeans", "n_clusters": 3, "seed": unseeded[0]["seed"]}
+	assert client.post("/split-polygon", json=body).json() == unseeded[0]
+	assert cache.stats()["entries"] == 1
+	assert client.post("/split-polygon", json=body).json() == unseeded[0]
@@ -0,0 +1,55 @@
+"""Splitting net geometry: blocks with exclusion holes or cut into several pieces."""
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import box
+
+from benchmarks.fixtures import make_fixture
+from geom_manipulation import SPLIT_MODES, PreparedPolygon, split_polygon_by_mode
+from split_formats import encode
+from split_workers import split_block
+
+# Two pieces at 2:1 with a tiny one between them, in metres
+PIECES = shapely.union_all([box(0, 0, 200, 100), box(205, 0, 210, 4), box(215, 0, 315, 100)])
+
+
+@pytest.mark.parametrize("mode", SPLIT_MODES)
+@pytest.mark.parametrize("n_parts", [3, 7, 12])
+def test_parts_cover_holed_block(mode, n_parts):
+	poly = make_fixture("holes", 1000).buffer(0)
+	parts = split_polygon_by_mode(poly, mode, n_parts, seed=1)
+
+	assert len(parts) == n_parts
+	assert all(p.geom_type == "Polygon" for p in parts)
+	assert sum(p.area for p in parts) == pytest.approx(poly.area, rel=1e-6)
+	assert shapely.union_all(parts).area == pytest.approx(poly.area, rel=1e-6)
+
+
+@pytest.mark.parametrize("mode", SPLIT_MODES)
+@pytest.mark.parametrize("n_parts", [2, 4, 7])
+def test_pieces_share_net_area_target(mode, n_parts):
+	parts = split_polygon_by_mode(PIECES, mode, n_parts, seed=0)
+	target = PIECES.area / n_parts
+
+	assert len(parts) == n_parts
+	assert sum(p.area for p in parts) == pytest.approx(PIECES.area, rel=1e-9)
+	assert shapely.union_all(parts).area == pytest.approx(PIECES.area, rel=1e-9)
+	# k-means balances sampled points, so it is only near-equal
+	tolerance = 0.05 if mode == "kmeans" else 1e-6
+	assert max(abs(p.area - target) for p in parts) / target < tolerance
+
+
+def test_multi_piece_parts_are_listed_per_polygon():
+	block = {"epsg": 32611, "prepared": PreparedPolygon(shapely.affinity.translate(PIECES, 500000, 5650000))}
+	result = split_block(block, "vertical", 4)
+	part_of = np.asarray(result["part_of"])
+
+	assert len(result["offsets"]) - 1 == len(part_of) == len(result["areas_ha"])
+	assert sorted(set(part_of.tolist())) == [0, 1, 2, 3]
+	part_areas = np.bincount(part_of, weights=result["areas_ha"])
+	assert np.allclose(part_areas, part_areas.mean(), rtol=1e-3)
+
+	body, _, _ = encode(result, "application/json", 1)
+	assert body["part_of"] == result["part_of"]
+	_, _, headers = encode(result, "application/wkb", 1)
+	assert headers["X-Part-Of"] == ",".join(map(str, result["part_of"]))
@@ -0,0 +1,39 @@
+"""PDF object parsing and per-page georeferencing extraction."""
+import pytest
+
+import pdf_georef
+from pdf_georef import parse_pdf_object
+
+
+def test_literal_strings_keep_balanced_parentheses():
+	wkt = 'PROJCS["UTM 11N",GEOGCS["NAD83",DATUM(a(b))]]'
+	parsed = parse_pdf_object(f"<</Type /PROJCS /WKT ({wkt}) /EPSG 26911>>")
+	assert parsed == {"Type": "PROJCS", "WKT": wkt, "EPSG": 26911}
+
+
+def test_literal_string_escapes():
+	parsed = parse_pdf_object(rb"[(a\(b\)c\\) (\101\102\7x) (\n\r\t\b\f) (one\
+line) (\q)]")
+	assert parsed == ["a(b)c\\", "AB\x07x", "\n\r\t\b\f", "oneline", "q"]
+
+
+def test_page_error_keeps_other_pages(tmp_path, monkeypatch):
+	fitz = pytest.importorskip("fitz")
+	path = tmp_path / "book.pdf"
+	with fitz.open() as doc:
+		for _ in range(3):
+			doc.new_page()
+		doc.save(path)
+
+	real = pdf_georef._page_georef
+
+	def failing(doc, page):
+		if page.number == 1:
+			raise ValueError("bad viewport")
+		return real(doc, page)
+
+	monkeypatch.setattr(pdf_georef, "_page_georef", failing)
+	georef = pdf_georef.extract_georef(str(path))
+	assert georef["pymupdf_error"] is None
+	assert [p["page"] for p in georef["pages"]] == [0, 1, 2]
+	assert [p["error"] for p in georef["pages"]] == [None, "bad viewport", None]
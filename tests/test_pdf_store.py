@@ -0,0 +1,52 @@
+"""Per-artifact locking in the PDF store."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf_store import PdfStore
+
+HASH = "ab" * 32
+
+
+def _store(tmp_path):
+	store = PdfStore(root=str(tmp_path))
+	(tmp_path / HASH).mkdir()
+	return store
+
+
+def test_pages_of_one_file_render_concurrently(tmp_path):
+	store = _store(tmp_path)
+	# Each render waits for the other; under a per-file lock this would time out
+	barrier = threading.Barrier(2, timeout=5)
+
+	def render(tmp):
+		barrier.wait()
+		with open(tmp, "w") as f:
+			f.write("png")
+
+	with ThreadPoolExecutor(2) as pool:
+		paths = list(pool.map(lambda name: store.ensure_file(HASH, name, render), ["page-1.png", "page-2.png"]))
+	assert all((tmp_path / HASH / name).exists() for name in ("page-1.png", "page-2.png"))
+	assert len(set(paths)) == 2
+	assert store._locks == {}
+
+
+def test_same_key_computed_once(tmp_path):
+	store = _store(tmp_path)
+	calls = []
+
+	def compute():
+		calls.append(1)
+		threading.Event().wait(0.1)
+		return {"bounds": (1, 2)}
+
+	with ThreadPoolExecutor(4) as pool:
+		results = list(pool.map(lambda _: store.cached(HASH, "georef", compute), range(4)))
+	assert calls == [1]
+	assert results == [{"bounds": [1, 2]}] * 4
+	assert store._locks == {}
+
+	# Another key on the same file is stored alongside, and both survive a reload
+	store.cached(HASH, "warp:EPSG:3857", lambda: None)
+	reloaded = PdfStore(root=str(tmp_path))
+	assert reloaded.cached(HASH, "georef", lambda: "recomputed") == {"bounds": [1, 2]}
+	assert reloaded.cached(HASH, "warp:EPSG:3857", lambda: "recomputed") is None
@@ -0,0 +1,36 @@
+"""Prepared-polygon handles split in the server process, matching /split-polygon."""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.fixtures import make_fixture
+from split_cache import get_split_cache
+from split_workers import get_handle_executor, get_split_executor, shutdown_pools
+
+
+@pytest.fixture
+def process_backend(monkeypatch):
+	monkeypatch.setenv("CUTBLOCK_SPLIT_BACKEND", "process")
+	monkeypatch.setenv("CUTBLOCK_SPLIT_WORKERS", "1")
+	shutdown_pools()
+	yield
+	shutdown_pools()
+
+
+def test_handle_splits_run_on_local_threads(process_backend):
+	assert get_split_executor().backend == "process"
+	assert get_handle_executor().backend == "thread"
+
+
+@pytest.mark.parametrize("mode", ["vertical", "radial", "recursive", "kmeans"])
+def test_handle_split_matches_plain_split(process_backend, mode):
+	ring = [list(c) for c in make_fixture("concave", 300).exterior.coords]
+	client = TestClient(main.app)
+	handle = client.post("/prepared-polygons", json={"coords": ring, "seed": 5}).json()
+
+	get_split_cache().clear()
+	by_handle = client.post(handle["split_url"], json={"mode": mode, "n_clusters": 4})
+	get_split_cache().clear()
+	plain = client.post("/split-polygon", json={"coords": ring, "mode": mode, "n_clusters": 4, "seed": 5})
+	assert by_handle.status_code == plain.status_code == 200
+	assert by_handle.json() == plain.json()
@@ -0,0 +1,37 @@
+"""Radial splits: the analytic engine agrees with the bisection reference engine,
+and parts cover the block even where slices fall apart."""
+import pytest
+import shapely
+from shapely.geometry import Polygon
+
+from benchmarks.fixtures import make_fixture
+from geom_manipulation import radial_split_polygon
+
+
+@pytest.mark.parametrize("fixture", ["convex", "concave", "holes"])
+@pytest.mark.parametrize("n_parts", [2, 5, 9])
+def test_analytic_matches_bisection(fixture, n_parts):
+	poly = make_fixture(fixture, 400).buffer(0)
+	analytic = radial_split_polygon(poly, n_parts, engine="analytic")
+	# Zero tolerance runs the bisection to convergence instead of stopping early
+	reference = radial_split_polygon(poly, n_parts, area_tolerance=0.0, engine="bisection")
+
+	assert len(analytic) == len(reference) == n_parts
+	target = poly.area / n_parts
+	for a, b in zip(analytic, reference):
+		assert abs(a.area - b.area) / target < 1e-6
+
+
+# Not star-shaped from any center, so some slices always fall into several pieces
+U_BLOCK = Polygon([(0, 0), (10, 0), (10, 10), (7, 10), (7, 3), (3, 3), (3, 10), (0, 10)])
+
+
+@pytest.mark.parametrize("engine", ["analytic", "bisection"])
+@pytest.mark.parametrize("n_parts", [2, 3, 5, 8, 13])
+def test_parts_cover_non_star_shaped_block(engine, n_parts):
+	parts = radial_split_polygon(U_BLOCK, n_parts, engine=engine)
+
+	assert len(parts) == n_parts
+	assert all(p.geom_type == "Polygon" for p in parts)
+	assert sum(p.area for p in parts) == pytest.approx(U_BLOCK.area, rel=1e-9)
+	assert shapely.union_all(parts).area == pytest.approx(U_BLOCK.area, rel=1e-9)
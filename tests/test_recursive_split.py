@@ -0,0 +1,36 @@
+"""Recursive bisection yields n near-equal parts that tile the block, on any thread count."""
+import pytest
+import shapely
+
+from benchmarks.fixtures import make_fixture
+from geom_manipulation import recursive_split_polygon
+
+
+@pytest.mark.parametrize("fixture", ["convex", "concave", "rough", "holes", "real"])
+@pytest.mark.parametrize("n_parts", [2, 5, 13])
+def test_recursive_parts_balanced_and_cover_input(fixture, n_parts):
+	poly = make_fixture(fixture, 500).buffer(0)
+	parts = recursive_split_polygon(poly, n_parts)
+
+	assert len(parts) == n_parts
+	assert all(p.geom_type == "Polygon" and not p.is_empty for p in parts)
+	target = poly.area / n_parts
+	# Folding clip fragments into neighbours moves a sliver at most
+	assert max(abs(p.area - target) / target for p in parts) < 1e-3
+	covered = shapely.union_all(parts).area
+	assert covered == pytest.approx(poly.area, rel=1e-9)
+	assert sum(p.area for p in parts) == pytest.approx(covered, rel=1e-9)
+
+
+@pytest.mark.parametrize("n_parts", [0, 1])
+def test_recursive_single_part_is_input(n_parts):
+	poly = make_fixture("concave", 100)
+	parts = recursive_split_polygon(poly, n_parts)
+	assert len(parts) == 1 and parts[0].equals(poly)
+
+
+def test_recursive_workers_match_serial():
+	poly = make_fixture("holes", 500)
+	serial = recursive_split_polygon(poly, 11)
+	threaded = recursive_split_polygon(poly, 11, workers=4)
+	assert [p.wkb for p in serial] == [p.wkb for p in threaded]
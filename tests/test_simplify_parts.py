@@ -0,0 +1,41 @@
+"""Simplified split parts must still form a gap- and overlap-free coverage of the block."""
+import numpy as np
+import pytest
+import shapely
+from shapely import affinity
+
+from benchmarks.fixtures import make_fixture
+from geom_manipulation import SPLIT_MODES, simplify_parts, split_polygon_by_mode
+
+# Metres, as in a real request (splits run in a local UTM projection)
+TOLERANCE = 5.0
+
+
+def _metric(fixture):
+	# Roughly degrees to metres at the fixtures' latitude
+	return affinity.scale(make_fixture(fixture, 400), 70000, 111000, origin=(0, 0))
+
+
+@pytest.mark.parametrize("fixture", ["concave", "rough", "holes", "real"])
+@pytest.mark.parametrize("mode", SPLIT_MODES)
+def test_simplified_parts_stay_a_coverage(fixture, mode):
+	poly = _metric(fixture)
+	parts = split_polygon_by_mode(poly, mode, 5, seed=1)
+	simplified = simplify_parts(parts, TOLERANCE)
+
+	assert len(simplified) == len(parts)
+	assert shapely.coverage_is_valid(np.asarray(simplified, dtype=object))
+	covered = shapely.union_all(simplified)
+	# No overlaps: the parts add up to their union
+	assert sum(p.area for p in simplified) == pytest.approx(covered.area, rel=1e-9)
+	# No gaps: the union is one block with only the input's holes
+	assert covered.geom_type == "Polygon"
+	assert len(covered.interiors) == len(poly.interiors)
+	assert covered.area == pytest.approx(poly.area, rel=1e-3)
+
+
+def test_simplify_drops_vertices():
+	poly = _metric("rough")
+	parts = split_polygon_by_mode(poly, "vertical", 4)
+	simplified = simplify_parts(parts, TOLERANCE)
+	assert shapely.get_num_coordinates(simplified).sum() < shapely.get_num_coordinates(parts).sum()
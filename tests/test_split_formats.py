@@ -0,0 +1,121 @@
+"""Every wire format decodes back to the JSON format's coordinates, holes included."""
+import struct
+
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Polygon
+
+from split_formats import JSON, POLYLINE, RINGS_F32, RINGS_F64, WKB, encode, pack_rings
+
+# lng/lat parts around the default map location; the second has two holes
+PARTS = [
+	Polygon([(-118.2000, 50.9900), (-118.1950, 50.9900), (-118.1950, 50.9950), (-118.2000, 50.9950)]),
+	Polygon(
+		[(-118.1950, 50.9900), (-118.1850, 50.9900), (-118.1850, 50.9980), (-118.1950, 50.9950)],
+		[
+			[(-118.1930, 50.9910), (-118.1910, 50.9910), (-118.1910, 50.9925)],
+			[(-118.1880, 50.9940), (-118.1860, 50.9940), (-118.1860, 50.9960), (-118.1880, 50.9960)],
+		],
+	),
+	Polygon([(-118.18512345, 50.98765432), (-118.1800001, 50.9876), (-118.1811, 50.9911)]),
+]
+
+
+def _result():
+	result = pack_rings(PARTS)
+	result["areas_ha"] = [12.5, 30.25, 4.0]
+	return result
+
+
+def _json_rings():
+	body, media_type, _ = encode(_result(), JSON, 7)
+	assert media_type == JSON
+	holes = [(h["part"], h["ring"]) for h in body["holes"]]
+	return body["polygons"], holes, body["areas_ha"]
+
+
+def _decode_polyline(text, precision=5):
+	values, value, shift = [], 0, 0
+	for char in text.encode("ascii"):
+		chunk = char - 63
+		value |= (chunk & 31) << shift
+		shift += 5
+		if chunk < 32:
+			values.append(~(value >> 1) if value & 1 else value >> 1)
+			value, shift = 0, 0
+	return (np.cumsum(np.reshape(values, (-1, 2)), axis=0) / 10 ** precision).tolist()
+
+
+def _decode_rings(data, dtype):
+	size = np.dtype(dtype).itemsize
+
+	def rings(pos, with_parts):
+		n, n_coords = struct.unpack_from("<II", data, pos)
+		pos += 8
+		offsets = np.frombuffer(data, "<u4", n + 1, pos)
+		pos += 4 * (n + 1)
+		extra = np.frombuffer(data, "<u4" if with_parts else "<f8", n, pos)
+		pos += extra.itemsize * n
+		coords = np.frombuffer(data, dtype, 2 * n_coords, pos).reshape(-1, 2)
+		pos += size * 2 * n_coords
+		return [coords[a:b].tolist() for a, b in zip(offsets[:-1], offsets[1:])], extra.tolist(), pos
+
+	polygons, areas, pos = rings(0, False)
+	holes = []
+	if pos < len(data):
+		hole_rings, parts, pos = rings(pos, True)
+		holes = list(zip(parts, hole_rings))
+	assert pos == len(data)
+	return polygons, holes, areas
+
+
+def test_pack_rings_keeps_holes():
+	polygons, holes, _ = _json_rings()
+	assert len(polygons) == len(PARTS)
+	assert [part for part, _ in holes] == [1, 1]
+	for (_, ring), interior in zip(holes, PARTS[1].interiors):
+		assert [(lng, lat) for lat, lng in ring] == list(interior.coords)
+
+
+def test_polyline_round_trip():
+	polygons, holes, areas = _json_rings()
+	body, _, _ = encode(_result(), POLYLINE, 7)
+	assert body["areas_ha"] == areas
+	assert len(body["polylines"]) == len(polygons)
+	for line, ring in zip(body["polylines"], polygons):
+		np.testing.assert_allclose(_decode_polyline(line), np.round(ring, 5), rtol=0, atol=1e-9)
+	assert [h["part"] for h in body["holes"]] == [part for part, _ in holes]
+	for hole, (_, ring) in zip(body["holes"], holes):
+		np.testing.assert_allclose(_decode_polyline(hole["polyline"]), np.round(ring, 5), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("media_type, dtype, abs_tol", [(RINGS_F64, "<f8", 0.0), (RINGS_F32, "<f4", 1e-5)])
+def test_binary_rings_round_trip(media_type, dtype, abs_tol):
+	polygons, holes, areas = _json_rings()
+	data, returned_type, headers = encode(_result(), media_type, 7)
+	assert returned_type == media_type and headers["X-Split-Seed"] == "7"
+	decoded_polygons, decoded_holes, decoded_areas = _decode_rings(data, dtype)
+	assert decoded_areas == areas
+	assert len(decoded_polygons) == len(polygons)
+	for decoded, ring in zip(decoded_polygons, polygons):
+		np.testing.assert_allclose(decoded, ring, rtol=0, atol=abs_tol)
+	assert [part for part, _ in decoded_holes] == [part for part, _ in holes]
+	for (_, decoded), (_, ring) in zip(decoded_holes, holes):
+		np.testing.assert_allclose(decoded, ring, rtol=0, atol=abs_tol)
+
+
+def test_wkb_round_trip():
+	polygons, holes, _ = _json_rings()
+	data, _, _ = encode(_result(), WKB, 7)
+	multi = shapely.from_wkb(data)
+	assert multi.geom_type == "MultiPolygon"
+	decoded = list(multi.geoms)
+	assert len(decoded) == len(polygons)
+	for poly, ring in zip(decoded, polygons):
+		# WKB is lng/lat, JSON lat/lng
+		assert [[lat, lng] for lng, lat in poly.exterior.coords] == ring
+	decoded_holes = [(i, [[lat, lng] for lng, lat in r.coords]) for i, p in enumerate(decoded) for r in p.interiors]
+	assert decoded_holes == holes
+	for poly, part in zip(decoded, PARTS):
+		assert poly.equals(part)
@@ -0,0 +1,53 @@
+"""Split option validation shared by /split-polygon, batch and prepared handles."""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import MAX_N_CLUSTERS, _parse_ring, _parse_split_options
+
+RING = [[-118.20, 50.99], [-118.19, 50.99], [-118.19, 51.00], [-118.20, 51.00]]
+
+
+@pytest.mark.parametrize("n_clusters", [0, -3, MAX_N_CLUSTERS + 1, 10 ** 9, "many"])
+def test_rejects_out_of_range_n_clusters(n_clusters):
+	with pytest.raises(ValueError):
+		_parse_split_options({"mode": "kmeans", "n_clusters": n_clusters})
+
+
+@pytest.mark.parametrize("data", [[], "kmeans", 3, None])
+def test_rejects_non_object_body(data):
+	with pytest.raises(ValueError):
+		_parse_split_options(data)
+
+
+@pytest.mark.parametrize("area_tolerance", [0, -0.1, 1, 2.5, float("nan"), "nan", "loose"])
+def test_rejects_out_of_range_area_tolerance(area_tolerance):
+	with pytest.raises(ValueError):
+		_parse_split_options({"n_clusters": 2, "area_tolerance": area_tolerance})
+
+
+@pytest.mark.parametrize("coords", [
+	None, 5, [[0, 0], [1, 0]], [[0], [1, 0], [1, 1]], [[0, 0], [1, "x"], [1, 1]],
+	[[0, 0], None, [1, 1]], [{"x": 0}, {"x": 1}, {"x": 2}],
+])
+def test_rejects_malformed_ring(coords):
+	with pytest.raises(ValueError, match="Invalid coordinates"):
+		_parse_ring(coords)
+
+
+def test_accepts_bounds():
+	assert _parse_split_options({"n_clusters": 1})[1] == 1
+	assert _parse_split_options({"n_clusters": MAX_N_CLUSTERS})[1] == MAX_N_CLUSTERS
+
+
+@pytest.mark.parametrize("body", [
+	[],
+	{"coords": RING, "mode": "kmeans", "n_clusters": 0},
+	{"coords": RING, "area_tolerance": -1},
+	{"coords": [[0], [1, 0], [1, 1]]},
+])
+def test_split_endpoint_returns_400(body):
+	client = TestClient(main.app)
+	response = client.post("/split-polygon", json=body)
+	assert response.status_code == 400
+	assert "error" in response.json()